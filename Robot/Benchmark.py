@@ -0,0 +1,939 @@
+# Mesure les performances des parties critiques du programme du robot avec le matériel simulé (voir Hardware.py)
+# Utilisation : python Benchmark.py [--output resultats.json] [--quick] [--only motor,map,sampling,odometry,scan,log,precision,encode,socket,camera,scheduler,control]
+import os
+os.environ["ROBOT_HARDWARE"] = "sim"
+
+import argparse
+import io
+import json
+import platform
+import socket
+import struct
+import subprocess
+import tempfile
+import threading
+import time
+import traceback
+import types
+from math import pi
+from threading import Thread, Event
+
+import numpy as np
+
+import Hardware
+from Robot import Robot
+from MetalMap import MetalMap
+from SocketServer import SocketServer
+from Simulation import SimulatedCamera, SimulatedMCP3008
+from CameraStreamer import CameraStreamer
+from SendScheduler import SendScheduler
+from Sampler import Sampler
+from OdometryLog import OdometryLog
+from ScanPlanner import ScanPlanner
+from SampleLog import SampleLog
+from SampleStore import SampleStore
+from MapPyramid import MapPyramid
+from MapInterpolator import MapInterpolator
+from TargetDetector import TargetDetector
+from Stats import Stats
+from Command import Command
+from FrameReader import FrameReader
+
+
+class Benchmark:
+    """Mesure les performances du robot avec le matériel simulé et renvoie les résultats sous forme de dictionnaire (sérialisable en JSON)"""
+
+    PORT = 51499 # Port utilisé pour les mesures de SocketServer (différent de celui du robot)
+
+    class FakeMain:
+        """Remplace Main pour MetalMap (qui envoie les messages avec main.sender.send()) : garde les messages dans self.sent"""
+
+        def __init__(self):
+            self.sender = self
+            self.sent = []
+
+        def send(self, header, content, callback=None):
+            self.sent.append((header, content))
+            return True
+
+
+    def __init__(self, quick: bool = False):
+        self.quick = quick # Mesures plus courtes (moins précises)
+
+
+    def motor(self):
+        """
+        Robot.move() : vitesse réellement atteinte (pas/s) et retard des fronts par rapport à l'heure prévue
+        """
+        robot = Robot(lambda: None, lambda: False)
+        results = []
+        for speed in ([50, 200] if self.quick else [25, 50, 100, 200, 400]):
+            robot.reset()
+            GPIOEdges = Hardware.GPIO.edges
+            GPIOEdges.clear()
+            distance = 100 if self.quick else 400
+            start = time.perf_counter()
+            robot.move(*robot.forward(speed, distance, True))
+            duration = time.perf_counter() - start
+            steps = [edge[0] for edge in GPIOEdges if edge[1] == robot.M1STEP and edge[2] == Hardware.GPIO.HIGH]
+            target = robot.forward(speed, distance)[2]
+            # Vitesse atteinte au milieu du mouvement (hors accélération et décélération)
+            middle = steps[len(steps) // 3:2 * len(steps) // 3]
+            achieved = (len(middle) - 1) / (middle[-1] - middle[0]) if len(middle) > 1 else 0
+            results.append({
+                "speed": speed,
+                "targetStepRate": target,
+                "achievedStepRate": achieved,
+                "duration": duration,
+                "timing": robot.lastMoveTiming,
+            })
+        return results
+
+
+    def __metalMap(self):
+        robot = Robot(None, lambda: False)
+        metalMap = MetalMap(self.FakeMain(), robot, None) # Sans journal sur le disque (voir log())
+        metalMap.sendDeltas = True # Mesure l'envoi des modifications ("Dlt")
+        return robot, metalMap
+
+
+    def __fill(self, metalMap, count, size):
+        """
+        Ajoute [count] mesures aléatoires dans un carré de [size] cm de côté (directement dans les tableaux, sans passer par le Sampler)
+        """
+        x, y, values = np.random.rand(count) * size, np.random.rand(count) * size, np.random.rand(count)
+        metalMap.samples.extend(x, y, values, np.zeros(count))
+        base = metalMap.pyramid.BASE_CELL_SIZE
+        bx, by = np.floor(x / base).astype(np.int64), np.floor(y / base).astype(np.int64)
+        metalMap.pyramid.baseSums.addMany(bx, by, values)
+        metalMap.pyramid.baseCounts.addMany(bx, by, np.ones(count))
+        metalMap.pyramid.version += 1
+
+
+    def __sample(self, robot, metalMap, count, size):
+        """
+        Simule [count] mesures du Sampler de [metalMap], chacune à une position aléatoire du robot dans un carré de [size] cm de côté
+        """
+        sampler = metalMap.sampler
+        capacity = len(sampler.times)
+        for x, y in np.random.rand(count, 2) * size:
+            robot.position[0], robot.position[1] = x, y
+            robot.recordPose()
+            i = sampler.written % capacity
+            sampler.times[i] = time.perf_counter()
+            sampler.values[i] = np.random.randint(0, 856)
+            sampler.written += 1
+
+
+    def map(self):
+        """
+        MetalMap.integrate() et sendMap() : nombre de lots de mesures (ceux d'une période MetalMap.INTEGRATE_PERIOD) ajoutés et envoyés par seconde
+        en fonction de la taille de la carte déjà remplie
+        """
+        results = []
+        batches = 200 if self.quick else 1000
+        batchSize = int(Sampler.RATE * MetalMap.INTEGRATE_PERIOD)
+        for size in ([100, 1000] if self.quick else [100, 300, 1000, 3000]):
+            robot, metalMap = self.__metalMap()
+            metalMap.cellSize = 1
+            self.__fill(metalMap, 10000, size)
+            metalMap.sendMap(True)
+            duration = 0
+            for i in range(batches):
+                self.__sample(robot, metalMap, batchSize, size)
+                start = time.perf_counter()
+                metalMap.integrate()
+                metalMap.sendMap()
+                duration += time.perf_counter() - start
+            results.append({
+                "mapSize": size,
+                "batchSize": batchSize,
+                "batchesPerSecond": batches / duration,
+                "samplesPerSecond": batches * batchSize / duration,
+                "memoryBytes": metalMap.pyramid.baseSums.nbytes() + metalMap.pyramid.baseCounts.nbytes(),
+            })
+        return results
+
+
+    def sampling(self):
+        """
+        Sampler :
+        -Pour chaque suréchantillonnage et filtre (avec des rafales lues en une fois ou lecture par lecture) :
+        mesures et lectures par seconde, temps CPU du thread de mesure et bruit des mesures loin de tout métal
+        -Fréquence réelle des mesures et retard des fronts des moteurs pendant l'enregistrement de la carte
+        """
+        duration = 0.5 if self.quick else 2
+        acquisition = []
+        for oversampling, filter, burst in [(1, "mean", False), (8, "mean", False), (8, "mean", True), (8, "median", True), (8, "iir", True), (32, "mean", True)]:
+            mcp3008 = SimulatedMCP3008(lambda: (1000, 1000), seed=0)
+            if not burst:
+                mcp3008 = types.SimpleNamespace(read_adc=mcp3008.read_adc) # Sans read_burst() : une lecture à la fois
+            sampler = Sampler(mcp3008, oversampling=oversampling, filter=filter)
+            sampler.start()
+            time.sleep(0.05)
+            clock = time.pthread_getcpuclockid(sampler.threadId) # Temps CPU du thread, plus précis que /proc
+            cpuStart, first, reads = time.clock_gettime(clock), sampler.written, sampler.reads
+            start = time.perf_counter()
+            time.sleep(duration)
+            elapsed = time.perf_counter() - start
+            cpu = time.clock_gettime(clock) - cpuStart
+            samples, reads = sampler.written - first, sampler.reads - reads
+            sampler.stop()
+            times, values, end, lost = sampler.read(first)
+            acquisition.append({
+                "oversampling": oversampling,
+                "filter": filter,
+                "burst": burst,
+                "samplesPerSecond": samples / elapsed,
+                "readsPerSecond": reads / elapsed,
+                "threadCpu": cpu / elapsed,
+                "noise": float(np.std(values)),
+            })
+
+        robot, metalMap = self.__metalMap()
+        metalMap.start()
+        first = metalMap.sampler.written
+        start = time.perf_counter()
+        robot.move(*robot.forward(100, 100 if self.quick else 400, True))
+        duration = time.perf_counter() - start
+        samples = metalMap.sampler.written - first
+        metalMap.stop()
+        return {
+            "acquisition": acquisition,
+            "recording": {
+                "configuredRate": metalMap.sampler.rate,
+                "achievedRate": samples / duration,
+                "baseline": metalMap.sampler.baseline,
+                "calibratedNoise": metalMap.sampler.noise,
+                "integratedSamples": len(metalMap.samples),
+                "lostSamples": metalMap.lostSamples,
+                "motorTiming": robot.lastMoveTiming,
+            },
+        }
+
+
+    def odometry(self):
+        """
+        OdometryLog : durée d'un ajout et d'une requête (un lot de mesures), et erreur sur la position du détecteur de métaux en ligne droite
+        (position réelle déduite des fronts du moteur 1, comparée à la position interpolée
+        et à celle qu'on avait en mettant à jour la position tous les Robot.STEPS_PER_ACTION pas, sans interpolation)
+        """
+        robot = Robot(None, lambda: False)
+        log = OdometryLog(robot.SENSOR_POSITION)
+        count = 20000 if self.quick else 100000
+        start = time.perf_counter()
+        for i in range(count):
+            log.append(i * 0.001, i, i, 0, i, i)
+        appendDuration = (time.perf_counter() - start) / count
+        # Requêtes comme celles de MetalMap.integrate() : les mesures d'une période, récentes
+        batchSize = int(Sampler.RATE * MetalMap.INTEGRATE_PERIOD)
+        ends = count * 0.001 - np.random.rand(200 if self.quick else 1000)
+        batches = ends[:, None] - np.sort(np.random.rand(len(ends), batchSize), axis=1)[:, ::-1] * MetalMap.INTEGRATE_PERIOD
+        start = time.perf_counter()
+        for times in batches:
+            log.sensorPositionAt(times)
+        queryDuration = (time.perf_counter() - start) / len(batches)
+
+        accuracy = []
+        for speed in [20, 50]:
+            robot.reset()
+            GPIOEdges = Hardware.GPIO.edges
+            GPIOEdges.clear()
+            robot.move(*robot.forward(speed, 60 if self.quick else 200, True))
+            steps = np.array([edge[0] for edge in GPIOEdges if edge[1] == robot.M1STEP and edge[2] == Hardware.GPIO.HIGH])
+            times = np.linspace(steps[0], steps[-1], 2000)
+            stepSize = robot.forward(speed)[4][1]
+            stepCounts = np.searchsorted(steps, times, side="right")
+            truth = robot.SENSOR_POSITION[1] + stepCounts * stepSize
+            x, y = robot.getSensorPositionAt(times)
+            stale = robot.SENSOR_POSITION[1] + stepCounts // robot.STEPS_PER_ACTION * robot.STEPS_PER_ACTION * stepSize
+            accuracy.append({
+                "speed": speed,
+                "interpolatedMeanError": float(np.mean(np.abs(y - truth))),
+                "interpolatedMaxError": float(np.max(np.abs(y - truth))),
+                "steppedMeanError": float(np.mean(np.abs(stale - truth))),
+                "steppedMaxError": float(np.max(np.abs(stale - truth))),
+            })
+        return {"appendDuration": appendDuration, "queryDuration": queryDuration, "accuracy": accuracy}
+
+
+    def scan(self):
+        """
+        Mode scan : durée et surface couverte par seconde avec l'ancien parcours de Main.scan() (lignes droites et virages sur place,
+        avec un arrêt et 0.2 s d'attente avant chaque segment) et avec ScanPlanner (segments enchaînés sans arrêt), et durée estimée par ScanPlanner
+        """
+        results = []
+        for sizeX, sizeY, precision, speed in ([(50, 60, 25, 2.5)] if self.quick else [(30, 40, 10, 1), (100, 100, 25, 1.5), (100, 100, 25, 2.5)]):
+            robot = Robot(None, lambda: False)
+            linearSpeed = speed * robot.WHEEL_DIAMETER * pi
+            turnSpeed = speed * 360 / (robot.DISTANCE_BETWEEN_WHEELS / robot.WHEEL_DIAMETER)
+            start = time.perf_counter()
+            count = 0
+            while count < sizeX / precision:
+                time.sleep(0.2)
+                robot.move(*robot.forward(linearSpeed, sizeY, True))
+                if count + 1 >= sizeX / precision:
+                    break
+                for move in [robot.turnRight(turnSpeed * (-1) ** count, 90, True), robot.forward(linearSpeed, precision, True), robot.turnRight(turnSpeed * (-1) ** count, 90, True)]:
+                    time.sleep(0.2)
+                    robot.move(*move)
+                count += 1
+            legacy = time.perf_counter() - start
+            legacyEnd = (robot.position[0], robot.position[1])
+
+            robot = Robot(None, lambda: False)
+            planner = ScanPlanner(robot, sizeX, sizeY, precision, speed)
+            moves = planner.moves()
+            start = time.perf_counter()
+            for i, move in enumerate(moves):
+                robot.move(*move, nextMove=moves[i + 1] if i + 1 < len(moves) else None)
+            planned = time.perf_counter() - start
+            results.append({
+                "size": [sizeX, sizeY],
+                "precision": precision,
+                "speed": speed,
+                "legacyDuration": legacy,
+                "legacyAreaPerSecond": sizeX * sizeY / legacy,
+                "legacyEnd": legacyEnd,
+                "plannedDuration": planned,
+                "estimatedDuration": planner.duration(moves),
+                "plannedAreaPerSecond": sizeX * sizeY / planned,
+                "plannedEnd": (robot.position[0], robot.position[1]),
+            })
+        return results
+
+
+    def log(self):
+        """
+        SampleLog : ajout de lots de mesures (ceux d'une période MetalMap.INTEGRATE_PERIOD, écriture périodique sur le disque comprise),
+        durée d'une écriture forcée sur le disque et durée de reconstruction de la carte (MetalMap.load()) en fonction du nombre de mesures
+        """
+        batchSize = int(Sampler.RATE * MetalMap.INTEGRATE_PERIOD)
+        batches = 2000 if self.quick else 20000
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "samples.log")
+            log = SampleLog(path)
+            values = np.random.rand(batchSize)
+            start = time.perf_counter()
+            for i in range(batches):
+                log.append(np.full(batchSize, float(i)), values, values, values, values, values)
+            appendDuration = (time.perf_counter() - start) / batches
+            start = time.perf_counter()
+            log.flush()
+            flushDuration = time.perf_counter() - start
+            log.close()
+
+            reload = []
+            for count in ([100000] if self.quick else [100000, 1000000]):
+                log = SampleLog(path)
+                log.reset((100, 100, 1, 1))
+                log.append(np.arange(count, dtype=np.float64), np.random.rand(count) * 100, np.random.rand(count) * 100, np.zeros(count), np.zeros(count), np.random.rand(count))
+                log.close()
+                start = time.perf_counter()
+                metalMap = MetalMap(self.FakeMain(), Robot(None, lambda: False), path)
+                reload.append({"samples": count, "fileBytes": os.path.getsize(path), "loaded": len(metalMap.samples), "loadDuration": time.perf_counter() - start})
+                metalMap.log.close()
+        return {
+            "recordBytes": SampleLog.RECORD.itemsize,
+            "batchSize": batchSize,
+            "appendDuration": appendDuration,
+            "samplesPerSecond": batchSize / appendDuration,
+            "flushDuration": flushDuration,
+            "reload": reload,
+        }
+
+
+    def interpolation(self):
+        """
+        MapInterpolator sur des scans synthétiques (lignes espacées de 5 cm, une mesure tous les 0.5 cm, taches de métal gaussiennes) :
+        pour chaque nombre de mesures et chaque méthode, durée du calcul de toute la carte et d'une zone de 10 x 10 cases (comme pour un "Dlt"),
+        proportion de cases vides et erreur par rapport à la vraie carte, comparées à la moyenne des mesures de chaque case (MapPyramid)
+        """
+        lane, step, cellSize = 5, 0.5, 1
+        results = []
+        for count in ([10000, 100000] if self.quick else [10000, 100000, 1000000]):
+            size = (count * lane * step) ** 0.5
+            generator = np.random.default_rng(0)
+            xs = np.repeat(np.arange(0, size, lane), int(size / step) + 1)[:count]
+            ys = np.tile(np.arange(0, size + step, step)[:int(size / step) + 1], len(xs) // (int(size / step) + 1) + 1)[:len(xs)]
+            xs, ys = xs + generator.normal(0, 0.3, len(xs)), ys + generator.normal(0, 0.3, len(xs))
+            blobs = generator.random((max(int(size ** 2 / 2500), 1), 2)) * size
+            def truth(x, y):
+                return sum(np.exp(-((x - bx) ** 2 + (y - by) ** 2) / 50) for bx, by in blobs)
+            samples = SampleStore()
+            samples.extend(xs, ys, truth(xs, ys) + generator.normal(0, 0.02, len(xs)), np.zeros(len(xs)))
+            pyramid = MapPyramid(samples)
+            start = time.perf_counter()
+            pyramid.addMany(xs, ys, samples.value, cellSize)
+            matrix, origin = pyramid.toDense(cellSize)
+            entry = {"samples": len(xs), "areaSize": size, "mean": self.__mapError(matrix, origin, cellSize, truth, time.perf_counter() - start)}
+            for method in MapInterpolator.METHODS:
+                interpolator = MapInterpolator(samples, method, radius=lane)
+                start = time.perf_counter()
+                matrix, origin = interpolator.toDense(cellSize)
+                entry[method] = self.__mapError(matrix, origin, cellSize, truth, time.perf_counter() - start)
+                center = int(size / 2 / cellSize)
+                start = time.perf_counter()
+                for i in range(20):
+                    interpolator.toDense(cellSize, (center, center, center + 9, center + 9))
+                entry[method]["windowDuration"] = (time.perf_counter() - start) / 20
+            results.append(entry)
+        return results
+
+
+    def detection(self):
+        """
+        TargetDetector sur un scan synthétique des objets de SimulatedMCP3008 (lignes espacées de 5 cm, une mesure tous les 0.3 cm,
+        bruit et dérive lente de la valeur de base) : durée par mesure (par paquets de 10 mesures, comme MetalMap.integrate()),
+        erreur de position de chaque objet, cibles en trop, et taille des messages "Tgt" comparée à celle d'une grille complète
+        """
+        lane, step, noise = 5, 0.3, 0.002
+        results = []
+        for drift in [0, 0.2]:
+            xs, ys = [], []
+            for i, x in enumerate(np.arange(-30, 60 + lane, lane)):
+                column = np.arange(0, 100, step)
+                xs.append(np.full(len(column), x))
+                ys.append(column if i % 2 == 0 else column[::-1])
+            xs, ys = np.concatenate(xs), np.concatenate(ys)
+            repeat = 1 if self.quick else 10
+            generator = np.random.default_rng(0)
+            field = sum(strength * np.exp(-((xs - tx) ** 2 + (ys - ty) ** 2) / (2 * radius * radius)) for tx, ty, strength, radius in SimulatedMCP3008.TARGETS)
+            values = np.minimum(field, 1) + generator.normal(0, noise, len(xs)) + np.linspace(0, drift, len(xs))
+            start = time.perf_counter()
+            for r in range(repeat):
+                detector = TargetDetector()
+                detector.noise = noise
+                for i in range(0, len(xs), 10):
+                    detector.add(xs[i:i + 10], ys[i:i + 10], values[i:i + 10])
+            duration = (time.perf_counter() - start) / repeat
+            errors = [min(((target.x - tx) ** 2 + (target.y - ty) ** 2) ** 0.5 for target in detector.targets) for tx, ty, strength, radius in SimulatedMCP3008.TARGETS]
+            robot, metalMap = self.__metalMap()
+            metalMap.samples.extend(xs, ys, values, np.zeros(len(xs)))
+            metalMap.pyramid.addMany(xs, ys, values, metalMap.cellSize)
+            matrix, origin = metalMap.pyramid.toDense(metalMap.cellSize)
+            results.append({
+                "samples": len(xs),
+                "drift": drift,
+                "perSample": duration / len(xs),
+                "targets": len(detector.targets),
+                "extraTargets": len(detector.targets) - len(SimulatedMCP3008.TARGETS),
+                "maxPositionError": max(errors),
+                "targetsMessageBytes": len(metalMap.encodeTargets(detector.targets)),
+                "mapMessageBytes": len(metalMap.encodeMap((0, 0), matrix, origin)),
+            })
+        return results
+
+
+    def __mapError(self, matrix, origin, cellSize: float, truth, duration: float) -> dict:
+        """
+        Proportion de cases vides (-1) dans la zone scannée et erreur quadratique moyenne des autres cases par rapport à [truth]
+        """
+        i, j = np.meshgrid(np.arange(matrix.shape[0]), np.arange(matrix.shape[1]), indexing="ij")
+        x, y = (i - origin[0]) * cellSize, (j - origin[1]) * cellSize
+        inside = (x >= 0) & (y >= 0) & (x <= x.max() - 5) & (y <= y.max() - 5) # Sans les bords de la carte
+        filled = inside & (matrix != -1)
+        return {
+            "duration": duration,
+            "emptyCells": 1 - filled.sum() / inside.sum(),
+            "rmsError": float(np.sqrt(np.mean((matrix[filled] - truth(x[filled], y[filled])) ** 2))),
+        }
+
+
+    def stats(self):
+        """
+        Coût des statistiques (Stats) : durée d'un ajout à un histogramme, à un compteur et d'un snapshot(),
+        et retard des fronts de Robot.move() avec les statistiques activées et désactivées
+        """
+        count = 100000 if self.quick else 1000000
+        stats = Stats(True)
+        histogram = stats.histogram("test")
+        values = np.random.exponential(1e-4, count).tolist()
+        start = time.perf_counter()
+        for value in values:
+            histogram.add(value)
+        histogramAdd = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for value in values:
+            stats.count("test")
+        counterAdd = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for i in range(100):
+            stats.snapshot()
+        snapshot = (time.perf_counter() - start) / 100
+
+        moves = {}
+        for enabled in [False, True]:
+            robot = Robot(lambda: None, lambda: False)
+            robot.stats = Stats(enabled)
+            start = time.perf_counter()
+            robot.move(*robot.forward(200, 100 if self.quick else 400, True))
+            moves["enabled" if enabled else "disabled"] = {"duration": time.perf_counter() - start, "timing": robot.lastMoveTiming}
+        return {"histogramAdd": histogramAdd, "counterAdd": counterAdd, "snapshot": snapshot, "move": moves}
+
+
+    def precision(self):
+        """
+        MetalMap.changePrecision() : durée en fonction du nombre de mesures (grille à recalculer et grille en cache)
+        """
+        results = []
+        for count in ([10 ** 4, 10 ** 5] if self.quick else [10 ** 4, 10 ** 5, 10 ** 6]):
+            robot, metalMap = self.__metalMap()
+            self.__fill(metalMap, count, 500)
+            result = {"samples": count}
+            for cellSize in (1, 2.5, 5):
+                self.__fill(metalMap, 1, 500) # Nouvelle mesure : les grilles en cache sont périmées
+                start = time.perf_counter()
+                metalMap.changePrecision(cellSize)
+                result["rebuild{}".format(cellSize)] = time.perf_counter() - start
+            metalMap.changePrecision(1)
+            start = time.perf_counter()
+            metalMap.changePrecision(5)
+            result["cached"] = time.perf_counter() - start
+            results.append(result)
+        return results
+
+
+    def encode(self):
+        """
+        MetalMap.sendMap() : durée de l'encodage et taille des messages pour chaque format
+        """
+        results = []
+        for size in ([100, 300] if self.quick else [100, 300, 1000]):
+            robot, metalMap = self.__metalMap()
+            self.__fill(metalMap, size * size // 2, size)
+            metalMap.cellSize = 1
+            for mapFormat in ["json"] + list(MetalMap.MAP_FORMATS):
+                metalMap.MAP_FORMAT = mapFormat
+                metalMap.main.sent = []
+                start = time.perf_counter()
+                metalMap.sendMap(True)
+                fullDuration = time.perf_counter() - start
+                self.__sample(robot, metalMap, int(Sampler.RATE * MetalMap.INTEGRATE_PERIOD), size)
+                metalMap.integrate()
+                start = time.perf_counter()
+                metalMap.sendMap()
+                deltaDuration = time.perf_counter() - start
+                header, delta = metalMap.main.sent[-1]
+                results.append({
+                    "mapSize": size,
+                    "format": mapFormat,
+                    "fullDuration": fullDuration,
+                    "fullBytes": len(metalMap.main.sent[0][1]),
+                    "deltaDuration": deltaDuration,
+                    "deltaBytes": len(delta),
+                })
+        return results
+
+
+    def socket(self):
+        """
+        SocketServer : débit de réception de rafales de petites commandes et de gros messages binaires,
+        débit d'envoi de petits messages et d'images JPEG 800x600,
+        et débit du découpage seul (FrameReader, blocs de 64 ko comme ceux lus par asyncio)
+        """
+        connected = Event()
+        server = SocketServer(lambda: None)
+        server.PORT = self.PORT
+        server.startServer(connected.set)
+        client = None
+        for i in range(50):
+            try:
+                client = socket.create_connection(("127.0.0.1", self.PORT))
+                break
+            except OSError:
+                time.sleep(0.1)
+        connected.wait(5)
+
+        results = {}
+
+        # Réception : le client envoie des commandes "forward 10" le plus vite possible
+        count = 5000 if self.quick else 50000
+        received = [0]
+        done = Event()
+        def onReceive(header, message):
+            received[0] += 1
+            if received[0] == count:
+                done.set()
+        server.startReceive(onReceive)
+        content = "forward 10".encode()
+        frame = b"sIns" + len(content).to_bytes(4, "little", signed=True) + content
+        start = time.perf_counter()
+        client.sendall(frame * count)
+        done.wait(60)
+        duration = time.perf_counter() - start
+        results["receiveCommands"] = {"messages": received[0], "messagesPerSecond": received[0] / duration}
+
+        # Réception de gros messages binaires (ex: 4 Mo)
+        payloadSize, count = 4 << 20, 10 if self.quick else 50
+        received[0] = 0
+        done.clear()
+        binaryFrame = b"bBin" + payloadSize.to_bytes(4, "little", signed=True) + bytes(payloadSize)
+        start = time.perf_counter()
+        for i in range(count):
+            client.sendall(binaryFrame)
+        done.wait(60)
+        duration = time.perf_counter() - start
+        results["receivePayloads"] = {"messages": received[0], "messageBytes": len(binaryFrame), "megabytesPerSecond": received[0] * len(binaryFrame) / duration / 1e6}
+
+        # Envoi : le client découpe les messages reçus dans un thread (un message mélangé avec un autre donnerait une taille ou un header invalide)
+        def read(header, total, finished):
+            clientReader = FrameReader(SocketServer.FRAME, SocketServer.BUFFER_SIZE, SocketServer.MAX_MESSAGE_SIZE)
+            remaining = total
+            try:
+                while remaining > 0:
+                    n = client.recv_into(clientReader.getBuffer())
+                    if n == 0:
+                        break
+                    clientReader.received(n)
+                    for contentType, name, content in clientReader.frames():
+                        if name != header:
+                            raise ValueError("Unexpected header: " + name)
+                        remaining -= 1
+            except:
+                print(traceback.format_exc())
+            finished.set()
+
+        stream = io.BytesIO()
+        SimulatedCamera().capture(stream)
+        image = stream.getvalue()
+        # (depuis plusieurs threads à la fois pour "sendImagesThreads" : les messages ne doivent pas se mélanger,
+        # avec des spectateurs qui ne lisent pas pour "sendImagesStalledViewers" : la télécommande ne doit pas être ralentie)
+        def sendAll(header, payload, count):
+            for i in range(count):
+                server.send(header, payload)
+
+        for name, header, payload, count, threads, viewerCount in [
+            ("sendCommands", "Res", "800;600", 2000 if self.quick else 20000, 1, 0),
+            ("sendImages", "Img", image, 100 if self.quick else 1000, 1, 0),
+            ("sendImagesThreads", "Img", image, 100 if self.quick else 1000, 4, 0),
+            ("sendImagesStalledViewers", "Img", image, 100 if self.quick else 1000, 1, SocketServer.MAX_CLIENTS - 1),
+        ]:
+            viewers = []
+            for i in range(viewerCount):
+                viewer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                viewer.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 12)
+                viewer.connect(("127.0.0.1", self.PORT))
+                viewers.append(viewer)
+            while len(server.clients) < 1 + viewerCount:
+                time.sleep(0.01)
+            viewerDrops = server.stats.counters.get("viewerDrops", 0)
+            size = 8 + len(payload.encode() if isinstance(payload, str) else payload)
+            finished = Event()
+            reader = Thread(target=read, args=(header, count * threads, finished))
+            reader.daemon = True
+            reader.start()
+            writes = server.stats.counters.get("writes", 0)
+            senders = [Thread(target=sendAll, args=(header, payload, count)) for i in range(threads)]
+            start = time.perf_counter()
+            for sender in senders:
+                sender.start()
+            for sender in senders:
+                sender.join()
+            finished.wait(60)
+            duration = time.perf_counter() - start
+            count *= threads
+            results[name] = {
+                "messages": count, "messageBytes": size, "messagesPerSecond": count / duration, "megabytesPerSecond": size * count / duration / 1e6,
+                "writesPerMessage": (server.stats.counters.get("writes", 0) - writes) / count,
+            }
+            if viewerCount > 0:
+                results[name]["viewerDrops"] = server.stats.counters.get("viewerDrops", 0) - viewerDrops
+            for viewer in viewers:
+                viewer.close()
+        results["sendStats"] = {name: server.stats.counters.get(name, 0) for name in ("writes", "partialWrites", "sendTimeouts")}
+
+        server.stopReceive()
+        client.close()
+        server.stopServer()
+
+        for name, data, repeat in [
+            ("framerCommands", frame * (5000 if self.quick else 50000), 1),
+            ("framerPayloads", binaryFrame, 5 if self.quick else 20),
+        ]:
+            reader = FrameReader(SocketServer.FRAME, SocketServer.BUFFER_SIZE, SocketServer.MAX_MESSAGE_SIZE)
+            data = memoryview(data)
+            frames = 0
+            start = time.perf_counter()
+            for i in range(repeat):
+                position = 0
+                while position < len(data):
+                    buffer = reader.getBuffer()
+                    n = min(len(buffer), 65536, len(data) - position)
+                    buffer[:n] = data[position:position + n]
+                    position += n
+                    reader.received(n)
+                    for contentType, header, content in reader.frames():
+                        frames += 1
+            duration = time.perf_counter() - start
+            results[name] = {"messages": frames, "messagesPerSecond": frames / duration, "megabytesPerSecond": repeat * len(data) / duration / 1e6}
+        return results
+
+
+    def camera(self):
+        """
+        CameraStreamer : images capturées, envoyées et abandonnées avec un client rapide, un client lent,
+        et un client rapide avec un spectateur qui ne lit pas (la callback de libération des images ne doit pas attendre le spectateur)
+        """
+        results = []
+        for name, readDelay, viewerCount in [("fastClient", 0, 0), ("slowClient", 0.1, 0), ("fastClientStalledViewer", 0, 1)]:
+            connected = Event()
+            server = SocketServer(lambda: None)
+            server.PORT = self.PORT
+            server.startServer(connected.set)
+            client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 16) # Petit buffer : le client lent ralentit vraiment l'envoi
+            client.connect(("127.0.0.1", self.PORT))
+            connected.wait(5)
+            server.protocol.transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 16)
+            viewers = []
+            for i in range(viewerCount):
+                viewer = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                viewer.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 12)
+                viewer.connect(("127.0.0.1", self.PORT))
+                viewers.append(viewer)
+            while len(server.clients) < 1 + viewerCount:
+                time.sleep(0.01)
+            stop = Event()
+            def read():
+                while not stop.is_set():
+                    try:
+                        if not client.recv(1 << 14):
+                            break
+                    except OSError:
+                        break
+                    time.sleep(readDelay)
+            reader = Thread(target=read)
+            reader.daemon = True
+            reader.start()
+            streamer = CameraStreamer(SimulatedCamera(), server.send, 30, (800, 600))
+            streamer.start()
+            time.sleep(2 if self.quick else 10)
+            streamer.stop()
+            stop.set()
+            client.close()
+            for viewer in viewers:
+                viewer.close()
+            server.stopServer()
+            results.append(dict(client=name, viewerDrops=server.stats.counters.get("viewerDrops", 0), **streamer.stats()))
+        return results
+
+
+    def scheduler(self):
+        """
+        SendScheduler : délai entre l'ajout d'un message "Dlt" et sa réception par un client lent, pendant l'envoi des images
+        """
+        connected = Event()
+        server = SocketServer(lambda: None)
+        server.PORT = self.PORT
+        server.startServer(connected.set)
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        client.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 1 << 16)
+        client.connect(("127.0.0.1", self.PORT))
+        connected.wait(5)
+        server.protocol.transport.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 1 << 16)
+
+        # Le client lit environ 1 Mo/s et note l'heure de réception des messages "Dlt" (qui contiennent leur heure d'envoi)
+        latencies = []
+        stop = Event()
+        def read():
+            data = bytearray()
+            while not stop.is_set():
+                try:
+                    chunk = client.recv(1 << 14)
+                except OSError:
+                    break
+                if not chunk:
+                    break
+                data += chunk
+                while len(data) >= 8:
+                    length = int.from_bytes(data[4:8], "little", signed=True)
+                    if len(data) < 8 + length:
+                        break
+                    if data[1:4] == b"Dlt":
+                        latencies.append(time.perf_counter() - struct.unpack_from("<d", data, 8)[0])
+                    del data[:8 + length]
+                time.sleep(0.016)
+        reader = Thread(target=read)
+        reader.daemon = True
+        reader.start()
+
+        scheduler = SendScheduler(server.send)
+        scheduler.start()
+        streamer = CameraStreamer(SimulatedCamera(), scheduler.send, 30, (800, 600))
+        streamer.start()
+        end = time.perf_counter() + (3 if self.quick else 15)
+        while time.perf_counter() < end:
+            scheduler.send("Dlt", struct.pack("<d", time.perf_counter()) + bytes(200))
+            time.sleep(0.02)
+        streamer.stop()
+        scheduler.stop()
+        stop.set()
+        client.close()
+        server.stopServer()
+        latencies = np.array(latencies)
+        return {
+            "deltas": len(latencies),
+            "meanLatency": float(latencies.mean()) if len(latencies) > 0 else None,
+            "p95Latency": float(np.percentile(latencies, 95)) if len(latencies) > 0 else None,
+            "camera": streamer.stats(),
+            "scheduler": scheduler.stats(),
+        }
+
+
+    def control(self):
+        """
+        Main en mode télécommandé : temps CPU utilisé par le thread principal quand le robot attend une instruction,
+        délai entre l'envoi d'une commande par la télécommande (en texte "Ins" ou en binaire "Cmd") et le premier pas des moteurs,
+        et durée du décodage d'une commande (Command)
+        """
+        import Main
+        Main.Main.CAMERA_FRAMERATE = 5 # Peu d'images : le client n'a presque rien à lire
+        launcher = Thread(target=Main.Main)
+        launcher.daemon = True
+        launcher.start()
+        client = None
+        for i in range(50):
+            try:
+                client = socket.create_connection(("127.0.0.1", SocketServer.PORT))
+                break
+            except OSError:
+                time.sleep(0.1)
+        stop = Event()
+        def read():
+            while not stop.is_set():
+                try:
+                    if not client.recv(1 << 20):
+                        break
+                except OSError:
+                    break
+        reader = Thread(target=read)
+        reader.daemon = True
+        reader.start()
+        def send(instruction, binary=False):
+            content = Command.parse(instruction).encode() if binary else instruction.encode()
+            client.sendall((b"bCmd" if binary else b"sIns") + len(content).to_bytes(4, "little", signed=True) + content)
+        def firstStep(start):
+            steps = [edge[0] for edge in list(Hardware.GPIO.edges)[-50:] if edge[1] == Robot.M1STEP and edge[0] > start]
+            return min(steps) if len(steps) > 0 else None
+
+        send("controlled 2")
+        time.sleep(2)
+        main = next(thread for thread in threading.enumerate() if thread.name.endswith("(start)"))
+        # Robot à l'arrêt (aucune instruction depuis plus d'une seconde)
+        duration = 2 if self.quick else 10
+        threadStart, processStart = self.__threadTime(main.native_id), time.process_time()
+        time.sleep(duration)
+        idle = {
+            "mainThreadCpu": (self.__threadTime(main.native_id) - threadStart) / duration,
+            "processCpu": (time.process_time() - processStart) / duration,
+        }
+
+        # Délai entre "forward" et le premier front envoyé au moteur 1 (moteurs déjà alimentés)
+        commandLatency = {}
+        for binary in [False, True]:
+            latencies = []
+            for i in range(5 if self.quick else 20):
+                send("nothing", binary)
+                time.sleep(0.1)
+                start = time.perf_counter()
+                send("forward 10", binary)
+                while firstStep(start) == None and time.perf_counter() - start < 2:
+                    time.sleep(0.0002)
+                step = firstStep(start)
+                if step != None:
+                    latencies.append(step - start)
+            commandLatency["binary" if binary else "text"] = {
+                "commands": len(latencies),
+                "mean": float(np.mean(latencies)) if len(latencies) > 0 else None,
+                "median": float(np.median(latencies)) if len(latencies) > 0 else None,
+                "max": float(np.max(latencies)) if len(latencies) > 0 else None,
+            }
+
+        # Messages invalides (binaire avec un header inconnu, instruction inconnue) : ignorés, la connexion doit rester ouverte
+        send("nothing")
+        invalid = b"\x01\x02\x03"
+        client.sendall(b"bXyz" + len(invalid).to_bytes(4, "little", signed=True) + invalid)
+        client.sendall(b"sIns" + len(invalid).to_bytes(4, "little", signed=True) + invalid)
+        time.sleep(0.1)
+        start = time.perf_counter()
+        send("forward 10", True)
+        while firstStep(start) == None and time.perf_counter() - start < 2:
+            time.sleep(0.0002)
+        invalidMessages = {"connectionKept": firstStep(start) != None}
+        send("shutdown")
+        time.sleep(2)
+        stop.set()
+        client.close()
+
+        count = 100000
+        encoded = Command.parse("combine 10 -5").encode()
+        start = time.perf_counter()
+        for i in range(count):
+            Command.parse("combine 10 -5")
+        textDecode = (time.perf_counter() - start) / count
+        start = time.perf_counter()
+        for i in range(count):
+            Command.decode(encoded)
+        binaryDecode = (time.perf_counter() - start) / count
+        return {
+            "idle": idle,
+            "commandLatency": commandLatency,
+            "invalidMessages": invalidMessages,
+            "decode": {"text": textDecode, "binary": binaryDecode},
+        }
+
+
+    def __threadTime(self, nativeId: int) -> float:
+        """
+        Renvoie le temps CPU (s) utilisé par le thread [nativeId] (Linux uniquement : lu dans /proc)
+        """
+        with open("/proc/self/task/{}/stat".format(nativeId)) as file:
+            fields = file.read().rsplit(")", 1)[1].split()
+        return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+    def run(self, only: list = None):
+        """
+        Lance toutes les mesures (ou seulement celles de [only]) et renvoie les résultats
+        """
+        results = {"meta": self.meta()}
+        for name in ["motor", "map", "sampling", "odometry", "scan", "log", "interpolation", "detection", "stats", "precision", "encode", "socket", "camera", "scheduler", "control"]:
+            if only == None or name in only:
+                start = time.perf_counter()
+                results[name] = getattr(self, name)()
+                print("{} done in {:.1f} s".format(name, time.perf_counter() - start))
+        return results
+
+
+    def meta(self):
+        """
+        Informations permettant de comparer les résultats entre versions et entre machines
+        """
+        try:
+            version = subprocess.check_output(["git", "rev-parse", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+        except Exception:
+            version = None
+        return {
+            "version": version,
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "platform": platform.platform(),
+            "quick": self.quick,
+        }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mesure les performances du robot avec le matériel simulé")
+    parser.add_argument("--output", help="Fichier JSON où écrire les résultats (sinon : affichés)")
+    parser.add_argument("--quick", action="store_true", help="Mesures plus courtes")
+    parser.add_argument("--only", help="Mesures à faire, séparées par des virgules (motor, map, sampling, odometry, scan, log, interpolation, detection, stats, precision, encode, socket, camera, scheduler, control)")
+    args = parser.parse_args()
+
+    results = Benchmark(args.quick).run(args.only.split(",") if args.only else None)
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    else:
+        print(json.dumps(results, indent=2))
@@ -0,0 +1,194 @@
+import time
+from threading import Thread, Condition, Event
+import traceback
+
+
+class CameraStreamer:
+    """Capture les images de la caméra en continu dans un petit anneau de buffers réutilisables
+    et les envoie dans un autre thread : seule la dernière image capturée est envoyée,
+    les images qui n'ont pas pu être envoyées à temps (connexion lente) sont abandonnées"""
+
+    RING_SIZE = 4 # Nombre de buffers : un en cours de capture, un prêt à être envoyé, un en cours d'envoi et un de réserve
+    FRAME_CAPACITY = 1 << 17 # Taille initiale (octets) de chaque buffer (agrandi si une image ne tient pas dedans)
+
+    class Frame:
+        """Buffer réutilisable contenant une image JPEG, dans lequel la caméra écrit comme dans un fichier"""
+
+        def __init__(self, capacity: int):
+            self.buffer = bytearray(capacity)
+            self.length = 0 # Nombre d'octets de l'image
+            self.number = 0 # Numéro de l'image (depuis start())
+            self.time = 0 # Heure (time.perf_counter()) de la fin de la capture
+
+        def write(self, data) -> int:
+            end = self.length + len(data)
+            if end > len(self.buffer):
+                # Nouveau buffer (pas de redimensionnement : un memoryview de l'ancien peut encore être en cours d'envoi)
+                buffer = bytearray(max(end, 2 * len(self.buffer)))
+                buffer[:self.length] = memoryview(self.buffer)[:self.length]
+                self.buffer = buffer
+            self.buffer[self.length:end] = data
+            self.length = end
+            return len(data)
+
+        def flush(self):
+            pass
+
+        def content(self) -> memoryview:
+            """
+            Renvoie l'image (sans copie)
+            """
+            return memoryview(self.buffer)[:self.length]
+
+
+    class Output:
+        """Objet donné à camera.capture_continuous() : écrit dans le buffer en cours de capture"""
+
+        def __init__(self, frame):
+            self.frame = frame
+
+        def write(self, data) -> int:
+            return self.frame.write(data)
+
+        def flush(self):
+            pass
+
+
+    def __init__(self, camera, send: callable, framerate: float = 30, resolution: tuple = (800, 600), onFrameSent: callable = None):
+        """
+        -[camera] : caméra (voir Hardware.Camera())
+        -[send] : fonction envoyant un message (SocketServer.send : header, contenu, callback appelée quand le contenu a été envoyé)
+        -[framerate] : nombre d'images capturées par seconde
+        -[resolution] : (largeur, hauteur) des images
+        -[onFrameSent] : fonction appelée après chaque envoi d'image (dans le thread d'envoi)
+        """
+        self.camera = camera
+        self.send = send
+        self.framerate = framerate
+        self.resolution = resolution
+        self.onFrameSent = onFrameSent
+        self.running = False
+        self.stopped = Event() # Mis à 1 quand le thread d'envoi s'est terminé (arrêt demandé, connexion perdue ou erreur)
+        self.__sent = Event() # Mis à 1 quand l'image en cours d'envoi a été envoyée (ou par stop())
+        self.__condition = Condition()
+        self.__free = [] # Buffers libres
+        self.__latest = None # Dernière image capturée, pas encore envoyée
+        self.captured = 0
+        self.sent = 0
+        self.dropped = 0
+        self.sentBytes = 0
+        self.startTime = 0
+
+
+    def start(self):
+        """
+        Règle la caméra et démarre les threads de capture et d'envoi
+        """
+        self.camera.resolution = self.resolution
+        self.camera.framerate = self.framerate
+        self.__free = [self.Frame(self.FRAME_CAPACITY) for i in range(self.RING_SIZE)]
+        self.__latest = None
+        self.captured = self.sent = self.dropped = self.sentBytes = 0
+        self.startTime = time.perf_counter()
+        self.stopped.clear()
+        self.running = True
+        self.__captureThread = Thread(target=self.__capture)
+        self.__captureThread.daemon = True
+        self.__captureThread.start()
+        self.__sendThread = Thread(target=self.__send)
+        self.__sendThread.daemon = True
+        self.__sendThread.start()
+
+
+    def stop(self):
+        """
+        Arrête la capture et l'envoi des images
+        """
+        with self.__condition:
+            self.running = False
+            self.__condition.notify_all()
+        self.__sent.set() # Le thread d'envoi n'attend plus la fin de l'envoi en cours
+        for thread in (self.__captureThread, self.__sendThread):
+            thread.join(2)
+
+
+    def __capture(self):
+        """
+        Fonction appellée par start() dans un thread :
+        capture les images en continu, chacune dans un buffer libre, et remplace la dernière image par la nouvelle
+        """
+        try:
+            output = self.Output(self.__free.pop())
+            for _ in self.camera.capture_continuous(output, "jpeg", use_video_port=True):
+                with self.__condition:
+                    frame = output.frame
+                    frame.number = self.captured
+                    frame.time = time.perf_counter()
+                    self.captured += 1
+                    if self.__latest != None:
+                        # L'image précédente n'a pas encore été prise par le thread d'envoi : elle est abandonnée
+                        self.dropped += 1
+                        self.__free.append(self.__latest)
+                    self.__latest = frame
+                    self.__condition.notify_all()
+                    while len(self.__free) == 0 and self.running:
+                        self.__condition.wait()
+                    if not self.running:
+                        break
+                    output.frame = self.__free.pop()
+                    output.frame.length = 0
+        except:
+            print(traceback.format_exc())
+            self.running = False
+        print("End of capture")
+
+
+    def __send(self):
+        """
+        Fonction appellée par start() dans un thread :
+        envoie la dernière image capturée dès que la précédente a été envoyée
+        """
+        sent = self.__sent
+        try:
+            while True:
+                with self.__condition:
+                    while self.__latest == None and self.running:
+                        self.__condition.wait()
+                    if not self.running:
+                        break
+                    frame, self.__latest = self.__latest, None
+                sent.clear()
+                if not self.running:
+                    break
+                if not self.send("Img", frame.content(), sent.set):
+                    break
+                sent.wait()
+                with self.__condition:
+                    self.sent += 1
+                    self.sentBytes += frame.length
+                    self.__free.append(frame)
+                    self.__condition.notify_all()
+                if self.onFrameSent != None:
+                    self.onFrameSent()
+        except:
+            print(traceback.format_exc())
+        with self.__condition:
+            self.running = False
+            self.__condition.notify_all()
+        self.stopped.set()
+        print("End of send images")
+
+
+    def stats(self) -> dict:
+        """
+        Renvoie le nombre d'images capturées, envoyées et abandonnées, et les nombres d'images par seconde correspondants
+        """
+        duration = max(time.perf_counter() - self.startTime, 1e-9)
+        return {
+            "captured": self.captured,
+            "sent": self.sent,
+            "dropped": self.dropped,
+            "sentBytes": self.sentBytes,
+            "captureRate": self.captured / duration,
+            "sendRate": self.sent / duration,
+        }
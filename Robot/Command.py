@@ -0,0 +1,78 @@
+import struct
+from typing import NamedTuple
+
+
+class Command(NamedTuple):
+    """Instruction de la télécommande, décodée une seule fois à la réception (voir Main.onMessageReceive()) :
+    [name] est le nom de l'instruction et [args] ses arguments déjà convertis en nombres
+    Deux encodages :
+    -Texte (header "Ins", type "s") : "nom arg1 arg2...", ex: "forward 10"
+    -Binaire (header "Cmd", type "b") : code de l'instruction (uint8) suivi de ses arguments (float32 little-endian),
+    pour les messages fréquents (ex: joystick) sans découpage ni conversion de texte"""
+
+    name: str
+    args: tuple = ()
+
+    # Pour chaque instruction : code dans l'encodage binaire et nombre d'arguments
+    INSTRUCTIONS = {
+        "": (0, 0), # Aucune instruction (mise par Main quand il a pris en compte la précédente)
+        "end": (1, 0),
+        "shutdown": (2, 0),
+        "scan": (3, 4), # sizeX sizeY precision speed
+        "resume": (4, 0),
+        "controlled": (5, 1), # precision
+        "precision": (6, 1), # taille
+        "nothing": (7, 0),
+        "forward": (8, 1), # speed
+        "backward": (9, 1), # speed
+        "left": (10, 1), # speed
+        "right": (11, 1), # speed
+        "combine": (12, 2), # speed1 speed2
+        # Demandes traitées dès leur réception, sans changer l'instruction en cours (voir Main.requests)
+        "map": (13, 0), # Envoie la grille complète
+        "stream": (14, 1), # 1 : envoie les modifications de la grille au fur et à mesure, 0 : seulement les cibles (faible débit)
+        "deltas": (15, 1), # 1 : envoie seulement les cases modifiées ("Dlt"), 0 : la grille complète ("Map") à chaque envoi
+    }
+    # Pour chaque code : nom de l'instruction et format de ses arguments
+    CODES = {code: (name, struct.Struct("<{}f".format(count))) for name, (code, count) in INSTRUCTIONS.items()}
+
+    @classmethod
+    def parse(cls, text: str):
+        """
+        Décode une instruction texte ("nom arg1 arg2...") : lève ValueError si elle est inconnue ou n'a pas le bon nombre d'arguments
+        (ou si [text] n'est pas une chaine de caractères, ex: le contenu d'un message binaire avec un autre header que "Cmd")
+        """
+        if not isinstance(text, str):
+            raise ValueError("Text command expected, got " + type(text).__name__)
+        words = text.split() or [""]
+        instruction = cls.INSTRUCTIONS.get(words[0])
+        if instruction == None:
+            raise ValueError("Unknown command: " + text)
+        if len(words) - 1 != instruction[1]:
+            raise ValueError("Wrong number of arguments: " + text)
+        return cls(words[0], tuple(float(word) for word in words[1:]))
+
+
+    @classmethod
+    def decode(cls, data: bytes):
+        """
+        Décode une instruction binaire (voir encode()) : lève ValueError si elle est inconnue ou n'a pas la bonne taille
+        """
+        if len(data) == 0 or data[0] not in cls.CODES:
+            raise ValueError("Unknown command code")
+        name, arguments = cls.CODES[data[0]]
+        if len(data) != 1 + arguments.size:
+            raise ValueError("Wrong command size for " + name)
+        return cls(name, arguments.unpack_from(data, 1))
+
+
+    def encode(self) -> bytes:
+        """
+        Renvoie l'encodage binaire de l'instruction (message "Cmd")
+        """
+        code = self.INSTRUCTIONS[self.name][0]
+        return bytes((code,)) + self.CODES[code][1].pack(*self.args)
+
+
+    def __str__(self):
+        return " ".join([self.name] + ["{:g}".format(arg) for arg in self.args])
@@ -0,0 +1,95 @@
+import struct
+
+
+class FrameReader:
+    """Découpe en messages les octets reçus de la télécommande, dans un seul buffer réutilisé (agrandi si un message ne tient pas dedans) :
+    -Les octets sont écrits directement dans le buffer (getBuffer(), pour recv_into ou asyncio.BufferedProtocol)
+    -frames() renvoie tous les messages complets du buffer sous forme de memoryview, sans copie
+    Chaque message commence par [frame] : type (1 octet), header (3 caractères) et taille du contenu (voir SocketServer.FRAME)"""
+
+    MIN_READ = 4096 # Place libre minimum proposée par getBuffer() (les octets non traités sont déplacés au début du buffer sinon)
+
+    def __init__(self, frame: struct.Struct, capacity: int, maxMessageSize: int):
+        self.frame = frame
+        self.maxMessageSize = maxMessageSize
+        self.buffer = bytearray(capacity)
+        self.view = memoryview(self.buffer)
+        self.start = 0 # Début du premier message pas encore traité
+        self.end = 0 # Fin des octets reçus
+        self.needed = 0 # Taille du message incomplet au début de self.start (0 si on ne la connait pas encore)
+        self.headers = {} # Headers déjà décodés (évite de décoder les 3 octets à chaque message)
+
+
+    def getBuffer(self) -> memoryview:
+        """
+        Renvoie la partie libre du buffer, dans laquelle écrire les octets reçus (puis appeler received())
+        Fait de la place si le message incomplet ne peut pas tenir dans le buffer ou s'il reste moins de self.MIN_READ octets libres
+        """
+        if self.start > 0 and (len(self.buffer) - self.end < self.MIN_READ or self.start + self.needed > len(self.buffer)):
+            self.__makeRoom(self.needed)
+        if self.end == len(self.buffer) or self.needed > len(self.buffer):
+            self.__makeRoom(max(self.needed, len(self.buffer) + 1))
+        return self.view[self.end:]
+
+
+    def received(self, nbytes: int):
+        """
+        Indique que [nbytes] octets ont été écrits au début de la partie libre du buffer
+        """
+        self.end += nbytes
+
+
+    def frames(self):
+        """
+        Générateur renvoyant, pour chaque message complet reçu : son type (b"s" ou b"b"), son header (str) et son contenu (memoryview)
+        -Le contenu n'est valide que jusqu'au message suivant (le copier pour le garder)
+        -Les messages ne sont lus qu'à la demande : si on arrête d'en demander, les suivants restent dans le buffer
+        Lève ValueError si la taille d'un message n'est pas valide (connexion corrompue)
+        """
+        size = self.frame.size
+        while self.end - self.start >= size:
+            contentType, header, length = self.frame.unpack_from(self.buffer, self.start)
+            if length < 0 or length > self.maxMessageSize:
+                raise ValueError("Invalid message length: " + str(length))
+            start = self.start + size
+            if self.end - start < length:
+                self.needed = size + length
+                return
+            self.start = start + length
+            self.needed = 0
+            name = self.headers.get(header)
+            if name == None:
+                name = self.headers[header] = header.decode()
+            content = self.view[start:start + length]
+            try:
+                yield contentType, name, content
+            finally:
+                content.release()
+        self.needed = size if self.end > self.start else 0
+        if self.start == self.end:
+            self.start = self.end = 0
+
+
+    def clear(self):
+        """
+        Supprime les octets reçus (ex: connexion corrompue)
+        """
+        self.start = self.end = self.needed = 0
+
+
+    def __makeRoom(self, needed: int):
+        """
+        Déplace le message incomplet au début du buffer, ou agrandit le buffer s'il ne peut pas contenir [needed] octets
+        """
+        pending = self.end - self.start
+        if needed <= len(self.buffer):
+            # Copie intermédiaire seulement si les deux zones se chevauchent
+            start = self.view[self.start:self.end]
+            self.buffer[:pending] = start if pending <= self.start else bytes(start)
+            start.release()
+        else:
+            buffer = bytearray(max(needed, 2 * len(self.buffer)))
+            buffer[:pending] = self.view[self.start:self.end]
+            self.view.release()
+            self.buffer, self.view = buffer, memoryview(buffer)
+        self.start, self.end = 0, pending
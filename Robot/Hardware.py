@@ -0,0 +1,52 @@
+# Choix du matériel utilisé par le robot :
+# -"pi" : le vrai matériel du Raspberry (RPi.GPIO, MCP3008 sur le bus SPI, picamera)
+# -"sim" : du matériel simulé (voir Simulation.py), pour faire tourner et mesurer le programme sur n'importe quel ordinateur
+# Le choix se fait avec la variable d'environnement ROBOT_HARDWARE ou en appelant select() avant d'importer les autres modules
+import os
+
+BACKEND = None
+GPIO = None
+
+
+def select(backend: str):
+    """
+    Choisit le matériel utilisé ("pi" ou "sim")
+    A appeler avant d'importer Robot, MetalMap et Main (qui récupèrent GPIO à leur import)
+    """
+    global BACKEND, GPIO
+    if backend == "pi":
+        import RPi.GPIO
+        GPIO = RPi.GPIO
+    elif backend == "sim":
+        from Simulation import SimulatedGPIO
+        GPIO = SimulatedGPIO()
+    else:
+        raise ValueError("Unknown hardware backend: " + backend)
+    BACKEND = backend
+
+
+def MCP3008(getPosition: callable):
+    """
+    Renvoie l'objet permettant de lire les valeurs du détecteur de métaux
+    [getPosition] est une fonction renvoyant la position actuelle du capteur (utilisée uniquement par le détecteur simulé)
+    """
+    if BACKEND == "sim":
+        from Simulation import SimulatedMCP3008
+        return SimulatedMCP3008(getPosition)
+    import Adafruit_GPIO.SPI
+    import Adafruit_MCP3008
+    return Adafruit_MCP3008.MCP3008(spi=Adafruit_GPIO.SPI.SpiDev(0, 0))
+
+
+def Camera():
+    """
+    Renvoie l'objet permettant de prendre des images avec la caméra
+    """
+    if BACKEND == "sim":
+        from Simulation import SimulatedCamera
+        return SimulatedCamera()
+    from picamera import PiCamera
+    return PiCamera()
+
+
+select(os.environ.get("ROBOT_HARDWARE", "pi"))
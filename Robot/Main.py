@@ -1,13 +1,18 @@
-import RPi.GPIO as GPIO
+import Hardware
+from Hardware import GPIO
 import time
-from math import pi
 from Robot import Robot
 from MetalMap import MetalMap
 from SocketServer import SocketServer
-from picamera import PiCamera
-import io
-from threading import Thread
+from CameraStreamer import CameraStreamer
+from SendScheduler import SendScheduler
+from ScanPlanner import ScanPlanner
+from Stats import Stats
+from Command import Command
+from Profiler import Profiler
+from threading import Thread, Event
 import os
+import json
 
 
 class Main:
@@ -20,6 +25,12 @@ class Main:
     CONNECTION_LED = 27
     TEST_LED = 17
     BUTTON = 4
+
+    # Caméra
+    CAMERA_RESOLUTION = (800, 600)
+    CAMERA_FRAMERATE = 30 # Images capturées par seconde (les images qui ne peuvent pas être envoyées à temps sont abandonnées)
+
+    STATS_PERIOD = 1 # Temps (s) entre chaque envoi des statistiques à la télécommande (message "Sta")
     
     def __init__(self):
         GPIO.setmode(GPIO.BCM)
@@ -33,6 +44,9 @@ class Main:
         GPIO.output(self.TEST_LED, GPIO.LOW)
         self.started = False
         self.camera = None
+        self.metalMap = None
+        if Hardware.BACKEND == "sim":
+            GPIO.press(self.BUTTON, 0.3, 0.5) # Pas de bouton sur le matériel simulé : démarre directement
         self.launcher()
 
 
@@ -93,24 +107,58 @@ class Main:
         Fonction appellée au démarrage du programme
         -Envoie le broadcast pour donner l'adresse IP du serveur (= le robot) au client (= la télécommande)
         -Démarre le serveur
+        -Profile la session si la variable d'environnement ROBOT_PROFILE est définie (voir Profiler)
         """
-        self.robot = Robot(self.robotOtherAction, self.robotBreakCondition)
+        self.profiler = Profiler.fromEnvironment()
+        if self.profiler != None:
+            self.profiler.start()
+        self.stats = Stats() # Instructions reçues, charge du processeur, files d'envoi et caméra (voir publishStats())
+        self.cameraStreamer = None
+        self.robot = Robot(None, self.robotBreakCondition)
         self.server = SocketServer(self.serverErrorCallback)
-        self.metalMap = MetalMap(self, self.robot)
-        self.instruction = "end"  # Dernière instruction recue de la télécommande
+        if self.metalMap != None:
+            self.metalMap.close() # Ferme le journal de la session précédente avant de le rouvrir
+        self.metalMap = MetalMap(self, self.robot) # Recharge les mesures enregistrées avant le dernier arrêt du programme (voir SampleLog)
+        pose = self.metalMap.log.lastPose() if self.metalMap.log != None else None
+        if pose != None:
+            self.robot.setSensorPose(*pose) # Le robot n'a pas bougé depuis sa dernière mesure (pour pouvoir reprendre un scan)
+        self.instruction = Command("end")  # Dernière instruction recue de la télécommande (voir Command)
+        # Fonction de main() pour chaque instruction (appelée avec ses arguments)
+        self.modes = {"end": self.runEnd, "scan": self.runScan, "resume": self.runResume, "controlled": self.runControlled, "shutdown": self.runShutdown}
+        # Fonction appelée dès la réception de chaque demande (avec ses arguments), sans changer self.instruction
+        self.requests = {"map": self.sendFullMap, "stream": self.setMapStreaming, "deltas": self.setMapDeltas}
+        # Fonction de self.robot donnant les arguments de move() pour chaque instruction du mode télécommandé (voir controlledMoveArgs())
+        self.controlledMoves = {
+            "nothing": self.robot.nothing,
+            "combine": self.robot.turnWhileMoving,
+            "forward": self.robot.forward,
+            "backward": self.robot.backward,
+            "left": self.robot.turnLeft,
+            "right": self.robot.turnRight,
+        }
         self.mode = ""  # "controlled" si on est en mode télécommandé, "scan" si on est en mode scan
         self.moveArgs = self.robot.nothing() # Arguments (calculés à l'avance) à donner à self.robot.move() pour le prochain mouvement
         self.lastInstructionTime = 0 # Temps auquel la dernière instruction a été reçue
-        self.connected = False
-        self.mustSend = []
+        self.instructionChanged = Event() # Mis à 1 quand self.instruction change (pour attendre une instruction sans utiliser le processeur)
+        self.connected = Event() # Mis à 1 quand le client est connecté (ou quand la session s'arrête, pour réveiller les threads qui l'attendent)
+        self.stopping = Event() # Mis à 1 au début de stopRobot()
+        self.sender = SendScheduler(self.server.send) # Messages à envoyer à la télécommande
+        self.sender.overflowHandlers[SendScheduler.MAP] = self.metalMap.requestFullMap
+        # Un spectateur qui n'a pas reçu une grille ou des modifications reçoit de nouveau toute la grille (lui seul), quand il a lu
+        self.server.resyncHandlers["Map"] = self.server.resyncHandlers["Dlt"] = self.metalMap.requestResync
 
         print("Sending broadcast and starting server")
         self.server.sendBroadcast("IP")
-        self.server.startServer(self.onClientConnected)
+        self.server.startServer(self.onClientConnected, self.onViewerConnected, self.onClientDisconnected, self.onClientReconnected)
         self.cameraThread = Thread(target=self.sendCameraImages)
         self.cameraThread.daemon = True
         self.cameraThread.start()
+        self.statsThread = Thread(target=self.publishStats)
+        self.statsThread.daemon = True
+        self.statsThread.start()
         self.main()
+        if self.profiler != None:
+            self.profiler.stop()
         print("End of main")
   
       
@@ -119,33 +167,128 @@ class Main:
         Fonction donnée en callback à la fonction SocketServer.startServer() lors du démarrage du serveur
         Elle est donc appellée quand le client se connecte
         -Démarre la réception des messages du client
+        -Envoie l'état de la session et la grille complète (voir sendState())
         """
         print("Client connected")
         GPIO.output(self.CONNECTION_LED, GPIO.HIGH)
         self.server.startReceive(self.onMessageReceive)
-        self.connected = True
+        self.sender.start()
+        self.sendState()
+        self.connected.set()
+
+
+    def onViewerConnected(self):
+        """
+        Fonction donnée en callback à la fonction SocketServer.startServer() : appelée quand un spectateur se connecte
+        Lui envoie l'état de la session (voir sendState())
+        """
+        self.sendState()
+
+
+    def onClientDisconnected(self):
+        """
+        Fonction donnée en callback à la fonction SocketServer.startServer() : appelée quand la télécommande se déconnecte
+        La session continue en attendant qu'elle se reconnecte (en mode télécommandé, le robot s'arrête de lui-même sans instruction, voir robotBreakCondition())
+        """
+        GPIO.output(self.CONNECTION_LED, GPIO.LOW)
+
+
+    def onClientReconnected(self):
+        """
+        Fonction donnée en callback à la fonction SocketServer.startServer() : appelée quand la télécommande se reconnecte à la session en cours
+        Recommence la réception de ses messages et lui renvoie l'état de la session (voir sendState())
+        """
+        GPIO.output(self.CONNECTION_LED, GPIO.HIGH)
+        self.server.startReceive(self.onMessageReceive)
+        self.sendState()
+
+
+    def sendState(self):
+        """
+        Envoie à tous les clients (les messages ne sont encodés qu'une fois) l'état de la session,
+        pour qu'un client qui (re)vient reprenne là où en est le robot sans recommencer la session :
+        -"Snp" : mode, instruction en cours, position du robot, taille des cases, scan en cours, envoi de la grille au fur et à mesure et envoi des modifications (JSON)
+        -"Res" : résolution des images
+        -"Map" : grille complète
+        -"Tgt" : cibles détectées
+        """
+        log = self.metalMap.log
+        scan = log.scan if log != None else None
+        self.sender.send("Snp", json.dumps({
+            "mode": self.mode,
+            "instruction": str(self.instruction),
+            "pose": [float(self.robot.position[0]), float(self.robot.position[1]), float(self.robot.orientation)],
+            "cellSize": float(self.metalMap.cellSize),
+            "scan": [float(value) for value in scan] if scan != None else None,
+            "lane": int(log.lane) if scan != None else None,
+            "streamMap": self.metalMap.streamMap,
+            "deltas": self.metalMap.sendDeltas,
+        }))
+        resolution = self.CAMERA_RESOLUTION
+        self.sender.send("Res", str(resolution[0]) + ";" + str(resolution[1]))
+        self.metalMap.sendMap(True)
+        self.metalMap.sendTargets()
+
+
+    def sendFullMap(self):
+        """
+        Demande "map" : envoie la grille complète (ex: en mode faible débit, où seules les cibles sont envoyées au fur et à mesure)
+        """
+        self.metalMap.sendMap(True)
+
+
+    def setMapStreaming(self, enabled: float):
+        """
+        Demande "stream" : active (1) ou désactive (0, faible débit) l'envoi des modifications de la grille au fur et à mesure
+        """
+        self.metalMap.setStreaming(enabled != 0)
+
+
+    def setMapDeltas(self, enabled: float):
+        """
+        Demande "deltas" : envoie seulement les cases modifiées ("Dlt", 1) ou la grille complète ("Map", 0) au fur et à mesure,
+        pour les clients qui savent appliquer les modifications
+        """
+        self.metalMap.setDeltas(enabled != 0)
   
       
-    def onMessageReceive(self, header: str, message: str):
+    def onMessageReceive(self, header: str, message):
         """
         Fonction donnée en callback à la fonction SocketServer.startReceive() lors du démarrage de la réception
         Elle est donc appellée quand un message est reçu
+        Décode l'instruction une seule fois (texte, ou binaire si [header] == "Cmd" : voir Command) et l'ignore si elle n'est pas valide
+        Les demandes (voir self.requests) sont traitées tout de suite et ne changent pas l'instruction en cours
         Si la nouvelle instruction diffère de la dernière instruction recue :
-        - Met à jour self.instruction
+        - Met à jour self.instruction et réveille les fonctions qui attendent une nouvelle instruction
         - Arrête le mouvement des moteurs si on est en mode télécommandé
         - Arrête le mouvement des moteurs si on est en mode scan et que l'instruction est "end"
+        En mode télécommandé, si aucune instruction n'avait été reçue depuis plus d'une seconde (robot arrêté), relance le mouvement
         """
+        self.stats.count("instructions")
+        try:
+            command = Command.decode(message) if header == "Cmd" else Command.parse(message)
+        except (ValueError, TypeError) as error:
+            print("Invalid instruction:", error)
+            return
+        request = self.requests.get(command.name)
+        if request != None:
+            request(*command.args)
+            return
+        lapsed = time.time() - self.lastInstructionTime > 1
         self.lastInstructionTime = time.time()
-        if message != self.instruction:
-            self.instruction = message
+        if command != self.instruction:
+            self.instruction = command
+            self.instructionChanged.set()
             if self.mode == "controlled":
-                if message == "end" or message == "shutdown" or message.startswith("precision"):
+                if command.name == "end" or command.name == "shutdown" or command.name == "precision":
                     self.robot.stop(self.robot.nothing())
                 else:
                     self.moveArgs = self.controlledMoveArgs()
                     self.robot.stop(self.moveArgs)
             else:
                 self.robot.stop(self.robot.nothing())
+        elif lapsed and self.mode == "controlled":
+            self.robot.stop(self.moveArgs)
   
       
     def main(self):
@@ -156,80 +299,121 @@ class Main:
         Commandes :
          * end : ne rien faire (c'était la commande pour quitter le mode précédent)
          * scan [sizeX] [sizeY] [precision] [speed] : appeler self.scan(sizeX, sizeY, precision, speed)
+         * resume : appeler self.resumeScan() (reprend le dernier scan, même après un redémarrage du programme)
          * controlled [precision] : appeler self.controlled(precision)
          * shutdown : quitter la boucle
         A la fin de la boucle, appeler self.stopRobot()
+        Pour toute autre instruction, attend que l'instruction change
+        L'instruction est déjà décodée (voir onMessageReceive()) : la fonction à appeler est trouvée dans self.modes
         """
         while self.started:
+          self.instructionChanged.clear()
           self.mode = ""
-          cmd = self.instruction.split()
-          if cmd[0] == "end" :
-            self.mode = ""
-            self.robot.move(*self.robot.nothing())
-          elif cmd[0] == "scan" : 
-            self.robot.reset()
-            self.metalMap.clearData()
-            self.instruction = ""
-            self.mode = "scan"
-            self.scan(float(cmd[1]), float(cmd[2]), float(cmd[3]), float(cmd[4]))
-          elif cmd[0] == "controlled" :
-            self.robot.reset()
-            self.metalMap.clearData()
-            self.instruction = "nothing"
-            self.mode = "controlled"
-            self.controlled(float(cmd[1]))
-          if cmd[0] == "shutdown" :
-            self.robot.reset()
-            self.stopRobot()
+          command = self.instruction
+          run = self.modes.get(command.name)
+          if run != None:
+            run(*command.args)
+          else:
+            self.instructionChanged.wait()
+
+
+    def runEnd(self):
+        self.robot.move(*self.robot.nothing())
+
+
+    def runScan(self, sizeX: float, sizeY: float, precision: float, speed: float):
+        scan = (sizeX, sizeY, precision, speed)
+        self.robot.reset()
+        self.metalMap.clearData(scan)
+        self.instruction = Command("")
+        self.mode = "scan"
+        self.metalMap.start()
+        self.scan(*scan)
+        self.metalMap.stop()
+
+
+    def runResume(self):
+        self.instruction = Command("")
+        self.mode = "scan"
+        self.metalMap.start()
+        self.resumeScan()
+        self.metalMap.stop()
+
+
+    def runControlled(self, precision: float):
+        self.robot.reset()
+        self.metalMap.clearData()
+        self.instruction = Command("nothing")
+        self.mode = "controlled"
+        self.metalMap.start()
+        self.controlled(precision)
+        self.metalMap.stop()
+
+
+    def runShutdown(self):
+        self.robot.reset()
+        self.stopRobot()
   
       
     def scan(self, sizeX: int, sizeY: int, precision: float, speed: float):
         """
         Scanne une zone de [sizeX] x [sizeY] (en cm) en faisant des allers-retours (on considère que la position actuelle du robot est le coin inférieur gauche)
-        Si self.instruction == "end" ou == "shutdown" : arrête la fonction
+        Si self.instruction.name == "end" ou == "shutdown" : arrête la fonction
         [precision] est :
         -La taille (en cm) d'une case de la grille qui sera renvoyée à la télécommande 
         -La distance entre chaque ligne parcourue par le robot
-        -Donne self.robotOtherAction comme [otherAction] aux fonctions de mouvement de Robot
+        Le parcours est préparé par ScanPlanner et ses segments sont enchaînés sans s'arrêter (voir Robot.move(nextMove=...))
+        Les mesures du détecteur de métaux sont prises et ajoutées à la grille pendant ce temps par self.metalMap (voir MetalMap.start())
+        """
+        self.metalMap.cellSize = precision
+        planner = ScanPlanner(self.robot, sizeX, sizeY, precision, speed)
+        start = time.time()
+        if self.followScan(planner, planner.moves()):
+            print("Scan done in {:.1f} s ({:.1f} cm²/s)".format(time.time() - start, sizeX * sizeY / (time.time() - start)))
+
+
+    def resumeScan(self):
+        """
+        Reprend le scan enregistré dans self.metalMap.log à la ligne où il s'était arrêté (voir ScanPlanner.resumeMoves()) :
+        on considère que le robot n'a pas été déplacé depuis (sa position est reprise du journal au démarrage du programme)
         """
-        i = 0 #variable qui va dire si on tourne à gauche ou a droite. 
-        count = 0 
+        if self.metalMap.log == None or self.metalMap.log.scan == None:
+            print("No scan to resume" if self.metalMap.log != None else "No sample log: cannot resume")
+            self.instruction = Command("end")
+            return
+        sizeX, sizeY, precision, speed = self.metalMap.log.scan
         self.metalMap.cellSize = precision
-        while count < sizeX / precision:
-            time.sleep(0.2)
-            if self.instruction == "end" or self.instruction == "shutdown":
-                return
-            self.robot.move(*self.robot.forward(speed * self.robot.WHEEL_DIAMETER * pi, sizeY, True))
-            
-            if count + 1 >= sizeX / precision:
-                break
-
-            time.sleep(0.2)
-            if self.instruction == "end" or self.instruction == "shutdown":
-                return 
-            self.robot.move(*self.robot.turnRight(speed*(-1)**i * 360 / (self.robot.DISTANCE_BETWEEN_WHEELS / self.robot.WHEEL_DIAMETER), 90, True))
-            
-            time.sleep(0.2)
-            if self.instruction == "end" or self.instruction == "shutdown":
-                return
-            self.robot.move(*self.robot.forward(speed * self.robot.WHEEL_DIAMETER * pi, precision, True))
-
-            time.sleep(0.2)
-            if self.instruction == "end" or self.instruction == "shutdown":
-                return
-            self.robot.move(*self.robot.turnRight(speed*(-1)**i * 360 / (self.robot.DISTANCE_BETWEEN_WHEELS / self.robot.WHEEL_DIAMETER), 90, True))
-            
-            i += 1
-            count += 1
+        planner = ScanPlanner(self.robot, sizeX, sizeY, precision, speed)
+        print("Resuming scan at lane", self.metalMap.log.lane)
+        start = time.time()
+        if self.followScan(planner, planner.resumeMoves(self.metalMap.log.lane, self.robot.position, self.robot.orientation)):
+            print("Scan done in {:.1f} s".format(time.time() - start))
+
+
+    def followScan(self, planner, moves: list) -> bool:
+        """
+        Enchaîne les segments [moves] du parcours préparé par [planner] en enregistrant la ligne en cours dans self.metalMap.log,
+        puis envoie la grille complète
+        Si self.instruction.name == "end" ou == "shutdown" : s'arrête et renvoie False
+        """
+        print("Scan: {} segments, about {:.1f} s".format(len(moves), planner.duration(moves)))
+        for i, move in enumerate(moves):
+            if self.instruction.name == "end" or self.instruction.name == "shutdown":
+                return False
+            if self.metalMap.log != None:
+                self.metalMap.log.setLane(planner.lanes[i])
+            self.robot.move(*move, nextMove=moves[i + 1] if i + 1 < len(moves) else None)
+        self.metalMap.stop()
         self.metalMap.sendMap(True)
-        self.instruction = "end"
+        self.instruction = Command("end")
+        return True
   
       
     def controlled(self, precision):
         """
         Démarre le mode télécommandé :
         -Attend la première instruction, puis :
-        -Boucle jusqu'à ce que self.instruction == "end" ou == "shutdown"
+        -Boucle jusqu'à ce que self.instruction.name == "end" ou == "shutdown"
          -A chaque fois, fait tourner les moteurs en fonction de l'instruction et indéfiniment (ils seront arrêtés à la prochaine instruction en utilisant Motor.stopMovement())
          -Instructions :
           * forward [speed]
@@ -238,38 +422,27 @@ class Main:
           * right [speed]
           * combine [speed1] [speed2]
           * nothing
-         -Donne self.robotOtherAction comme [otherAction] aux fonctions de mouvement de Robot
+         -Les mesures du détecteur de métaux sont prises et ajoutées à la grille pendant ce temps par self.metalMap (voir MetalMap.start())
         """
         self.metalMap.cellSize = precision
-        while self.instruction != "end" and self.instruction != "shutdown":
+        while self.instruction.name != "end" and self.instruction.name != "shutdown":
+            self.instructionChanged.clear()
             if time.time() - self.lastInstructionTime > 1:
-                self.robot.move(*self.robot.nothing())
-            elif self.instruction.startswith("precision"):
-                self.metalMap.changePrecision(float(self.instruction.split()[1]))
+                self.robot.move(*self.robot.nothing()) # Attend la prochaine instruction (robot.stop())
+            elif self.instruction.name == "precision":
+                self.metalMap.changePrecision(self.instruction.args[0])
+                self.instructionChanged.wait() # Une seule fois par instruction "precision"
             else:
                 self.robot.move(*self.moveArgs)
 
 
     def controlledMoveArgs(self):
         """
-        Retourne les arguments à donner à self.robot.move() pour exécuter self.instruction
+        Retourne les arguments à donner à self.robot.move() pour exécuter self.instruction (voir self.controlledMoves)
+        Les instructions qui ne sont pas des mouvements arrêtent le robot
         """ 
-        input = self.instruction.split()
-        cmd = input[0]
-        if len(input) > 1:
-            speed = float(input[1])
-        if cmd == "nothing":
-            return self.robot.nothing()
-        elif cmd == "combine" :
-            return self.robot.turnWhileMoving(float(input[1]), float(input[2]))
-        elif cmd == "forward" :
-            return self.robot.forward(speed)
-        elif cmd == "backward" :
-            return self.robot.backward(speed)
-        elif cmd == "left" :
-            return self.robot.turnLeft(speed)
-        elif cmd == "right" :
-            return self.robot.turnRight(speed)
+        move = self.controlledMoves.get(self.instruction.name)
+        return move(*self.instruction.args) if move != None else self.robot.nothing()
         
 
     def serverErrorCallback(self):
@@ -277,13 +450,6 @@ class Main:
             self.onMessageReceive("", "shutdown")
 
 
-    def robotOtherAction(self):
-        """
-        Fonction à donner en tant que [otherAction] aux fonctions de mouvement de la classe Robot
-        """
-        self.metalMap.addData()
-
-
     def robotBreakCondition(self):
         return self.mode == "controlled" and time.time() - self.lastInstructionTime > 1
         
@@ -294,31 +460,77 @@ class Main:
         -Fin du programme (jusqu'à ce que launcher() le relance)
         """
         print("Stopping server")
+        self.stopping.set()
+        self.connected.set() # Réveille publishStats() et sendCameraImages() s'ils attendent encore le client
+        if self.cameraStreamer != None:
+            self.cameraStreamer.stop()
         GPIO.output(self.CONNECTION_LED, GPIO.LOW)
         self.server.stopReceive()
         time.sleep(1)
+        self.sender.stop()
+        print("Sender:", self.sender.stats())
         self.server.stopServer()
         self.started = False
 
     
+    def publishStats(self):
+        """
+        Envoie toutes les self.STATS_PERIOD secondes (tant que le client est connecté) les statistiques de self.robot, self.metalMap,
+        self.server et de Main (message "Sta", JSON) : les histogrammes couvrent la période depuis l'envoi précédent
+        """
+        self.connected.wait()
+        cpuTime, wallTime = time.process_time(), time.perf_counter()
+        while not self.stopping.wait(self.STATS_PERIOD):
+            now, cpu = time.perf_counter(), time.process_time()
+            self.stats.gauge("cpu", (cpu - cpuTime) / (now - wallTime)) # Temps processeur de tous les threads / temps écoulé
+            self.stats.gauge("loadAverage", os.getloadavg()[0])
+            cpuTime, wallTime = cpu, now
+            senderStats = self.sender.stats()
+            for priority, name in ((SendScheduler.CONTROL, "control"), (SendScheduler.MAP, "map"), (SendScheduler.IMAGE, "image")):
+                self.stats.gauge("queued." + name, senderStats["queued"][priority])
+            self.stats.gauge("coalesced", senderStats["coalesced"])
+            self.stats.gauge("overflows", senderStats["overflows"])
+            if self.cameraStreamer != None:
+                cameraStats = self.cameraStreamer.stats()
+                self.stats.gauge("cameraCaptureRate", cameraStats["captureRate"])
+                self.stats.gauge("cameraSendRate", cameraStats["sendRate"])
+                self.stats.gauge("cameraDropped", cameraStats["dropped"])
+            if not self.stats.enabled:
+                continue
+            self.sender.send("Sta", json.dumps({
+                "time": time.time(),
+                "main": self.stats.snapshot(True),
+                "robot": self.robot.stats.snapshot(True),
+                "map": self.metalMap.stats.snapshot(True),
+                "server": self.server.stats.snapshot(True),
+            }))
+
+
     def sendCameraImages(self):
-        while not self.connected and self.started: pass
-        resolution = (800, 600)
-        self.server.send("Res", str(resolution[0]) + ";" + str(resolution[1]))
-        if self.camera == None and self.started:
-            self.camera = PiCamera()
+        """
+        Envoie la résolution des images puis diffuse les images de la caméra (voir CameraStreamer) jusqu'à la fin de la connexion
+        """
+        self.connected.wait()
+        if self.stopping.is_set():
+            return
+        resolution = self.CAMERA_RESOLUTION
+        self.sender.send("Res", str(resolution[0]) + ";" + str(resolution[1]))
+        if self.camera == None:
+            self.camera = Hardware.Camera()
             self.camera.resolution = (resolution[0], resolution[1])
-            time.sleep(2)
-        while self.started:
-            stream = io.BytesIO()
-            self.camera.capture(stream, "jpeg", use_video_port=True)
-            success = self.server.send("Img", stream.getvalue())
-            if not success: break
-            while len(self.mustSend) > 0:
-                self.server.send(*self.mustSend[0])
-                del self.mustSend[0]
+            self.stopping.wait(2)
+        if self.stopping.is_set():
+            return
+        self.cameraStreamer = CameraStreamer(self.camera, self.sender.send, self.CAMERA_FRAMERATE, resolution)
+        self.cameraStreamer.start()
+        if self.stopping.is_set():
+            self.cameraStreamer.stop() # stopRobot() a pu commencer avant que self.cameraStreamer existe
+        self.cameraStreamer.stopped.wait() # Jusqu'à l'arrêt de la session (stopRobot() arrête le streamer) ou la perte de la connexion
+        self.cameraStreamer.stop()
+        print("Camera:", self.cameraStreamer.stats())
         print("End of camera")
 
 
-Main()
-print("See you later alligator")
\ No newline at end of file
+if __name__ == "__main__":
+    Main()
+    print("See you later alligator")
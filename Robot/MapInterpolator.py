@@ -0,0 +1,195 @@
+from math import ceil
+import numpy as np
+
+
+class MapInterpolator:
+    """Reconstruit une carte dense à partir des mesures éparses d'un SampleStore (au lieu de la moyenne des mesures de chaque case) :
+    la valeur d'une case est la moyenne des mesures situées à moins de self.radius cm de son centre,
+    pondérée par l'inverse de la distance ("idw") ou par une gaussienne ("gaussian")
+    La taille des cases est indépendante de l'écart entre les lignes du scan : les cases entre deux lignes sont remplies par leurs voisines"""
+
+    METHODS = ("idw", "gaussian")
+    RADIUS = 3 # Distance (cm) maximum entre une mesure et le centre d'une case pour qu'elle compte dans la valeur de la case
+    POWER = 2 # Exposant de la distance pour "idw"
+    MIN_DISTANCE = 0.1 # Distance (cm) en dessous de laquelle le poids "idw" n'augmente plus (évite la division par 0)
+    SUBCELLS = 4 # Les mesures sont d'abord regroupées par sous-case de taille cellSize / SUBCELLS (0 : positions exactes)
+    TAIL_SIZE = 4096 # Nombre minimum de nouvelles mesures (non indexées) avant de reconstruire l'index
+
+    def __init__(self, samples, method: str = "idw", radius: float = RADIUS, power: float = POWER, sigma: float = None):
+        """
+        -[samples] : SampleStore contenant les mesures
+        -[method] : "idw" ou "gaussian"
+        -[radius] : voir self.RADIUS
+        -[power] : voir self.POWER
+        -[sigma] : écart-type (cm) de la gaussienne (radius / 2 si None)
+        """
+        if method not in self.METHODS:
+            raise ValueError("Unknown interpolation method: " + method)
+        self.samples = samples
+        self.method = method
+        self.radius = radius
+        self.power = power
+        self.sigma = sigma
+        self.clear()
+
+
+    def clear(self):
+        """
+        Supprime l'index (à appeler quand les mesures de self.samples sont supprimées)
+        """
+        self.__indexed = 0 # Nombre de mesures (les premières de self.samples) dans l'index
+        self.__bucketSize = None # Taille (cm) des cases de l'index (self.radius quand l'index a été construit)
+        self.__order = np.empty(0, dtype=np.int64) # Indices des mesures indexées, triées par case de l'index
+        self.__keys = np.empty(0, dtype=np.int64) # Clé (voir __key()) de la case de l'index de chaque mesure de self.__order
+
+
+    def __key(self, bx, by):
+        """
+        Renvoie la clé des cases de l'index ([bx], [by]) : l'ordre des clés est celui des cases triées par bx puis par by
+        """
+        return bx * (1 << 32) + by
+
+
+    def __bucket(self, positions):
+        return np.floor(positions / self.__bucketSize).astype(np.int64)
+
+
+    def __updateIndex(self):
+        """
+        Met à jour l'index spatial : les mesures sont triées par case de taille self.radius (toutes les mesures à moins de self.radius
+        d'un point sont dans les 3 x 3 cases autour de la sienne)
+        L'index n'est reconstruit que si self.radius a changé ou si assez de nouvelles mesures ont été ajoutées :
+        les autres sont parcourues directement par __select()
+        """
+        count = len(self.samples)
+        if count < self.__indexed or self.__bucketSize != self.radius:
+            self.clear()
+            self.__bucketSize = self.radius
+        if count - self.__indexed < max(self.TAIL_SIZE, self.__indexed // 8):
+            return
+        keys = self.__key(self.__bucket(self.samples.x), self.__bucket(self.samples.y))
+        self.__order = np.argsort(keys, kind="stable")
+        self.__keys = keys[self.__order]
+        self.__indexed = count
+
+
+    def __select(self, minX: float, minY: float, maxX: float, maxY: float) -> np.ndarray:
+        """
+        Renvoie les indices des mesures situées dans le rectangle ([minX], [minY]) - ([maxX], [maxY]) (cm)
+        (une recherche dichotomique dans l'index par colonne de cases, puis les mesures pas encore indexées)
+        """
+        self.__updateIndex()
+        x, y = self.samples.x, self.samples.y
+        selected = []
+        if self.__indexed > 0:
+            columns = np.arange(self.__bucket(minX), self.__bucket(maxX) + 1)
+            starts = np.searchsorted(self.__keys, self.__key(columns, self.__bucket(minY)))
+            ends = np.searchsorted(self.__keys, self.__key(columns, self.__bucket(maxY)), side="right")
+            lengths = ends - starts
+            # Concatène les plages [starts[i]:ends[i]] sans boucle
+            ranges = np.arange(lengths.sum()) + np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+            selected.append(self.__order[ranges])
+        selected.append(np.arange(self.__indexed, len(self.samples)))
+        indices = np.concatenate(selected)
+        inside = (x[indices] >= minX) & (x[indices] <= maxX) & (y[indices] >= minY) & (y[indices] <= maxY)
+        return indices[inside]
+
+
+    def getBounds(self, cellSize: float):
+        """
+        Renvoie les cases extrêmes (minX, minY, maxX, maxY) de la grille de taille [cellSize] pouvant avoir une valeur
+        (None s'il n'y a aucune mesure)
+        """
+        if len(self.samples) == 0:
+            return None
+        x, y = self.samples.x, self.samples.y
+        margin = ceil(self.radius / cellSize)
+        return (
+            int(np.floor(x.min() / cellSize + 0.5)) - margin, int(np.floor(y.min() / cellSize + 0.5)) - margin,
+            int(np.floor(x.max() / cellSize + 0.5)) + margin, int(np.floor(y.max() / cellSize + 0.5)) + margin
+        )
+
+
+    def getFrame(self, cellSize: float):
+        """
+        Renvoie la position de la case (0, 0) et la taille de la matrice que renverrait toDense([cellSize]) (comme MapPyramid.getFrame())
+        """
+        bounds = self.getBounds(cellSize)
+        if bounds == None:
+            return (0, 0), (1, 1)
+        minX, minY, maxX, maxY = bounds
+        return (-minX, -minY), (maxX - minX + 1, maxY - minY + 1)
+
+
+    def toDense(self, cellSize: float, bounds: tuple = None):
+        """
+        Renvoie la matrice dense des valeurs interpolées des cases de taille [cellSize] (centrées sur les multiples de [cellSize],
+        -1 pour les cases sans mesure à moins de self.radius) et la position de la case (0, 0) dans cette matrice (comme MapPyramid.toDense())
+        [bounds] : cases extrêmes (minX, minY, maxX, maxY) à calculer (toutes les cases pouvant avoir une valeur si None)
+        """
+        bounds = bounds if bounds != None else self.getBounds(cellSize)
+        if bounds == None:
+            return np.full((1, 1), -1.0), (0, 0)
+        minX, minY, maxX, maxY = bounds
+        radius = self.radius
+        indices = self.__select((minX - 0.5) * cellSize - radius, (minY - 0.5) * cellSize - radius,
+                                (maxX + 0.5) * cellSize + radius, (maxY + 0.5) * cellSize + radius)
+        xs, ys, sums, counts = self.__group(self.samples.x[indices], self.samples.y[indices], self.samples.value[indices], cellSize)
+
+        # Chaque mesure est ajoutée aux cases voisines (décalage (dx, dy) par rapport à sa case) : une passe vectorisée par décalage
+        # Les mesures sont à moins de radius de la zone : avec une marge de 2 * margin cases, les indices restent dans la matrice
+        margin = ceil(radius / cellSize)
+        width, height = maxX - minX + 1 + 4 * margin, maxY - minY + 1 + 4 * margin
+        cx, cy = np.floor(xs / cellSize + 0.5).astype(np.int64), np.floor(ys / cellSize + 0.5).astype(np.int64)
+        base = (cx - minX + 2 * margin) * height + (cy - minY + 2 * margin)
+        offsets = range(-margin, margin + 1)
+        dx2 = {d: (xs - (cx + d) * cellSize) ** 2 for d in offsets}
+        dy2 = {d: (ys - (cy + d) * cellSize) ** 2 for d in offsets}
+        weightSums = np.zeros(width * height)
+        valueSums = np.zeros(width * height)
+        r2 = radius ** 2
+        for dx in offsets:
+            for dy in offsets:
+                # Décalage trop grand pour qu'une mesure de la case soit à moins de radius du centre de la case voisine
+                if ((max(abs(dx) - 0.5, 0) ** 2 + max(abs(dy) - 0.5, 0) ** 2) * cellSize ** 2 > r2):
+                    continue
+                d2 = dx2[dx] + dy2[dy]
+                weights = np.where(d2 <= r2, self.__kernel(d2), 0)
+                cells = base + (dx * height + dy)
+                weightSums += np.bincount(cells, weights=weights * counts, minlength=width * height)
+                valueSums += np.bincount(cells, weights=weights * sums, minlength=width * height)
+
+        values = np.full(width * height, -1.0)
+        np.divide(valueSums, weightSums, out=values, where=weightSums > 0)
+        values = values.reshape(width, height)[2 * margin:width - 2 * margin, 2 * margin:height - 2 * margin]
+        return values, (-minX, -minY)
+
+
+    def __kernel(self, d2):
+        """
+        Renvoie le poids des mesures situées à la distance sqrt([d2]) du centre d'une case
+        """
+        if self.method == "idw":
+            return np.maximum(d2, self.MIN_DISTANCE ** 2) ** (-self.power / 2)
+        sigma = self.sigma if self.sigma != None else self.radius / 2
+        return np.exp(d2 / (-2 * sigma ** 2))
+
+
+    def __group(self, xs, ys, values, cellSize: float):
+        """
+        Regroupe les mesures par sous-case de taille [cellSize] / self.SUBCELLS :
+        renvoie la position moyenne, la somme des valeurs et le nombre de mesures de chaque sous-case occupée
+        (avec beaucoup de mesures, il y en a beaucoup moins que de mesures)
+        """
+        if self.SUBCELLS == 0 or len(xs) == 0:
+            return xs, ys, values, np.ones(len(xs))
+        size = cellSize / self.SUBCELLS
+        keys = self.__key(np.floor(xs / size).astype(np.int64), np.floor(ys / size).astype(np.int64))
+        keys, groups = np.unique(keys, return_inverse=True) # Numéro de la sous-case de chaque mesure (sans allouer toute la zone)
+        counts = np.bincount(groups).astype(np.float64)
+        return (
+            np.bincount(groups, weights=xs) / counts,
+            np.bincount(groups, weights=ys) / counts,
+            np.bincount(groups, weights=values),
+            counts
+        )
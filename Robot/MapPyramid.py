@@ -0,0 +1,179 @@
+import numpy as np
+from SparseGrid import SparseGrid
+
+
+class MapPyramid:
+    """Garde la somme et le nombre des mesures de chaque case à une résolution de base
+    et en déduit à la demande les grilles de cases plus grandes (gardées en cache)"""
+
+    # Taille (cm) des cases de base. Les cases de base ont leurs bords sur les multiples de BASE_CELL_SIZE,
+    # alors que les cases d'une grille de taille c sont centrées sur les multiples de c (la case 0 va de -c/2 à c/2) :
+    # une case de taille c est donc exactement une union de cases de base si c est un multiple pair de BASE_CELL_SIZE
+    BASE_CELL_SIZE = 0.5
+    MAX_LEVELS = 8 # Nombre maximum de grilles gardées en cache
+
+    class Level:
+        """Sommes et nombres de mesures des cases d'une grille de taille [cellSize]"""
+
+        def __init__(self, cellSize, version):
+            self.cellSize = cellSize
+            self.sums = SparseGrid(fill=0)
+            self.counts = SparseGrid(fill=0)
+            self.version = version # Valeur de MapPyramid.version quand la grille était à jour
+
+
+    def __init__(self, samples):
+        self.samples = samples # SampleStore contenant toutes les mesures (utilisé pour les tailles qui ne sont pas un multiple pair de la base)
+        self.clear()
+
+
+    def cellIndex(self, position: float, cellSize: float) -> int:
+        """
+        Renvoie l'indice de la case de taille [cellSize] contenant [position] (la case 0 est centrée sur 0)
+        """
+        return int(np.floor(position / cellSize + 0.5))
+
+
+    def add(self, x: float, y: float, value: float, cellSize: float):
+        """
+        Ajoute une mesure [value] prise en (x, y) :
+        -À la grille de base
+        -À la grille de taille [cellSize] (mise à jour directement si elle est en cache et à jour)
+        Les autres grilles en cache deviennent périmées et seront recalculées si on les redemande
+        Renvoie les coordonnées de la case modifiée dans la grille de taille [cellSize]
+        """
+        bx, by = int(np.floor(x / self.BASE_CELL_SIZE)), int(np.floor(y / self.BASE_CELL_SIZE))
+        self.baseSums.add(bx, by, value)
+        self.baseCounts.add(bx, by, 1)
+        cx, cy = self.cellIndex(x, cellSize), self.cellIndex(y, cellSize)
+        level = self.levels.get(cellSize)
+        if level != None and level.version == self.version:
+            level.sums.add(cx, cy, value)
+            level.counts.add(cx, cy, 1)
+            level.version += 1
+        self.version += 1
+        return cx, cy
+
+
+    def addMany(self, xs, ys, values, cellSize: float):
+        """
+        Ajoute d'un coup les mesures [values] prises aux positions ([xs], [ys]) (tableaux numpy), comme add()
+        Renvoie les coordonnées (tableaux xs, ys) des cases de la grille de taille [cellSize] contenant chaque mesure
+        """
+        bx, by = np.floor(xs / self.BASE_CELL_SIZE).astype(np.int64), np.floor(ys / self.BASE_CELL_SIZE).astype(np.int64)
+        ones = np.ones(len(values))
+        self.baseSums.addMany(bx, by, values)
+        self.baseCounts.addMany(bx, by, ones)
+        cx = np.floor(xs / cellSize + 0.5).astype(np.int64)
+        cy = np.floor(ys / cellSize + 0.5).astype(np.int64)
+        level = self.levels.get(cellSize)
+        if level != None and level.version == self.version:
+            level.sums.addMany(cx, cy, values)
+            level.counts.addMany(cx, cy, ones)
+            level.version += 1
+        self.version += 1
+        return cx, cy
+
+
+    def getLevel(self, cellSize: float):
+        """
+        Renvoie la grille (MapPyramid.Level) de taille [cellSize]
+        -Directement si elle est en cache et à jour
+        -Sinon, la calcule à partir des cases de base si [cellSize] en est un multiple pair, à partir de toutes les mesures sinon
+        """
+        level = self.levels.get(cellSize)
+        if level != None and level.version == self.version:
+            return level
+
+        level = self.Level(cellSize, self.version)
+        factor = cellSize / self.BASE_CELL_SIZE
+        if abs(factor - round(factor)) < 1e-9 and round(factor) % 2 == 0:
+            factor = int(round(factor))
+            xs, ys, sums, counts = self.__baseCells()
+            xs, ys = (xs + factor // 2) // factor, (ys + factor // 2) // factor
+        else:
+            xs = np.floor(self.samples.x / cellSize + 0.5).astype(np.int64)
+            ys = np.floor(self.samples.y / cellSize + 0.5).astype(np.int64)
+            sums, counts = self.samples.value, None
+        xs, ys, sums, counts = self.__aggregate(xs, ys, sums, counts)
+        level.sums.setMany(xs, ys, sums)
+        level.counts.setMany(xs, ys, counts)
+
+        self.levels.pop(cellSize, None)
+        if len(self.levels) >= self.MAX_LEVELS:
+            del self.levels[next(iter(self.levels))] # Supprime la grille mise en cache depuis le plus longtemps
+        self.levels[cellSize] = level
+        return level
+
+
+    def __baseCells(self):
+        """
+        Renvoie les coordonnées, les sommes et les nombres de mesures des cases de base contenant au moins une mesure
+        (self.baseSums et self.baseCounts étant toujours modifiées ensemble, elles ont les mêmes tuiles)
+        """
+        size = self.baseCounts.tileSize
+        xs, ys, sums, counts = [np.empty(0, dtype=np.int64)], [np.empty(0, dtype=np.int64)], [np.empty(0)], [np.empty(0)]
+        for (tx, ty), tileCounts in self.baseCounts.tiles.items():
+            lx, ly = np.nonzero(tileCounts)
+            xs.append(lx + tx * size)
+            ys.append(ly + ty * size)
+            sums.append(self.baseSums.tiles[(tx, ty)][lx, ly])
+            counts.append(tileCounts[lx, ly])
+        return np.concatenate(xs), np.concatenate(ys), np.concatenate(sums), np.concatenate(counts)
+
+
+    def __aggregate(self, xs, ys, sums, counts):
+        """
+        Additionne en une passe (np.unique puis np.bincount) les sommes [sums] et les nombres [counts] (1 par élément si None) tombant dans la même case (xs, ys)
+        Renvoie les cases distinctes, leurs sommes et leurs nombres de mesures
+        """
+        if len(xs) == 0:
+            return xs, ys, sums, np.empty(0)
+        minX, minY = xs.min(), ys.min()
+        height = int(ys.max() - minY) + 1
+        keys = (xs - minX) * height + (ys - minY)
+        keys, groups = np.unique(keys, return_inverse=True) # Numéro de la case de chaque élément (sans allouer toute la zone)
+        totalSums = np.bincount(groups, weights=sums, minlength=len(keys))
+        totalCounts = np.bincount(groups, weights=counts, minlength=len(keys))
+        cells = np.flatnonzero(totalCounts)
+        keys = keys[cells]
+        return keys // height + minX, keys % height + minY, totalSums[cells], totalCounts[cells]
+
+
+    def getMean(self, cellSize: float, x: int, y: int) -> float:
+        """
+        Renvoie la moyenne des mesures de la case (x, y) de la grille de taille [cellSize] (-1 si elle ne contient aucune mesure)
+        """
+        level = self.getLevel(cellSize)
+        count = level.counts.get(x, y)
+        return level.sums.get(x, y) / count if count > 0 else -1
+
+
+    def toDense(self, cellSize: float):
+        """
+        Renvoie la matrice dense des moyennes de la grille de taille [cellSize] (-1 pour les cases sans mesure)
+        et la position de la case (0, 0) dans cette matrice (voir SparseGrid.toDense())
+        """
+        level = self.getLevel(cellSize)
+        sums, originCoords = level.sums.toDense()
+        counts, _ = level.counts.toDense()
+        means = np.full(sums.shape, -1.0)
+        np.divide(sums, counts, out=means, where=counts > 0)
+        return means, originCoords
+
+
+    def getFrame(self, cellSize: float):
+        """
+        Renvoie la position de la case (0, 0) et la taille de la matrice que renverrait toDense([cellSize])
+        """
+        return self.getLevel(cellSize).counts.getFrame()
+
+
+    def clear(self):
+        """
+        Supprime toutes les sommes et toutes les grilles en cache
+        """
+        self.baseSums = SparseGrid(fill=0)
+        self.baseCounts = SparseGrid(fill=0)
+        self.levels = {}
+        self.version = 0
@@ -1,10 +1,20 @@
 # Modules pour récupérer les données du détecteur de métaux
-import Adafruit_GPIO.SPI 
-import Adafruit_MCP3008
+import Hardware
 import numpy as np
+from SampleStore import SampleStore
+from MapPyramid import MapPyramid
+from MapInterpolator import MapInterpolator
+from TargetDetector import TargetDetector
+from Sampler import Sampler
+from SampleLog import SampleLog
+from Stats import Stats
+import time
+from threading import Thread, Event, RLock
+import traceback
 
-# Module pour transformer des objets en chaine de caractères
+# Modules pour transformer la grille en chaine de caractères ou en octets
 import json
+import struct
 
 
 class MetalMap:
@@ -12,142 +22,395 @@ class MetalMap:
     l'association de ces données avec la position du robot et 
     l'envoi des données à la télécommande"""
 
-    SEND_FREQUENCY = 10 # Nombre de addData() entre chaque envoi automatique à la télécommande
+    INTEGRATE_PERIOD = 0.1 # Temps (s) entre chaque ajout des nouvelles mesures à la grille (et envoi des modifications à la télécommande)
 
-    def __init__(self, main, robot):
+    # Encodage de la grille envoyée à la télécommande : "json" (texte) ou binaire avec des cases en "float32", "uint16" ou "uint8"
+    # (la télécommande Unity ne lit que le texte : les formats binaires sont pour les autres clients, ex: les spectateurs)
+    MAP_FORMAT = "json"
+    # Pour chaque format binaire : (code envoyé dans l'en-tête, type numpy little-endian, valeur représentant -1 (None pour float32))
+    MAP_FORMATS = {
+        "float32": (0, np.dtype("<f4"), None),
+        "uint8": (1, np.dtype("u1"), 255),
+        "uint16": (2, np.dtype("<u2"), 65535),
+    }
+    # Valeur des cases envoyées : None (moyenne des mesures de la case) ou méthode d'interpolation ("idw" ou "gaussian", voir MapInterpolator)
+    INTERPOLATION = None
+    MAP_HEADER = struct.Struct("<fffiiiiB") # x, y, orientation, originX, originY, tailleX, tailleY, format
+    DELTA_HEADER = struct.Struct("<fffiiiiBI") # Idem + nombre de cases modifiées
+    TARGETS_HEADER = struct.Struct("<H") # Nombre de cibles
+    TARGET = struct.Struct("<IfffffH") # Identifiant, x, y, intensité, tailleX, tailleY, nombre de passages de chaque cible
+    # True : les modifications de la grille sont envoyées au fur et à mesure. False (faible débit) : seules les cibles le sont,
+    # la grille complète n'est envoyée qu'à la demande (instruction "map") et à la connexion
+    STREAM_MAP = True
+    # True : seules les cases modifiées sont envoyées au fur et à mesure ("Dlt"). False : la grille complète ("Map") à chaque envoi,
+    # pour les clients qui ne savent pas appliquer les modifications (ex: la télécommande Unity). Demande "deltas" pour l'activer
+    SEND_DELTAS = False
+    FULL_MAP_PERIOD = 1 # Temps minimum (s) entre deux envois automatiques de la grille complète quand self.sendDeltas est False (elle est lourde à encoder)
+
+    def __init__(self, main, robot, logPath: str = SampleLog.PATH):
         self.main = main
         self.robot = robot # Référence de l'objet Robot pour avoir accès à la position du robot (robot.getSensorPosition())
-        self.data = {} # Dictionnaire associant les positions (tuple[float]) auxquelles ont a prélevé les données du détecteur et la valeur du métal détecté à ces positions
-        self.matrix = -np.ones((3,3))
-        self.originCoords = (0, 0) # Coordonnées de l'entrée de self.matrix représentant la case dont le centre est la position (0, 0) du capteur de métaux
-        self.decal_x = 0
-        self.decal_y = 0
-        self.mcp3008 = Adafruit_MCP3008.MCP3008(spi=Adafruit_GPIO.SPI.SpiDev(0, 0)) # Objet pour récupérer les données du détecteur de métaux
+        self.samples = SampleStore() # Positions (x, y) auxquelles on a prélevé les données du détecteur, valeur du métal détecté à ces positions et moment de la mesure
+        self.pyramid = MapPyramid(self.samples) # Sommes et nombres de mesures par case, pour toutes les tailles de case (la case (0, 0) est celle dont le centre est la position (0, 0) du capteur de métaux)
+        self.dirty = set() # Cases (x, y) de la grille de taille self.cellSize modifiées depuis le dernier envoi
+        self.fullPending = True # True si le prochain envoi doit être la grille complète ("Map") et non les modifications ("Dlt")
+        self.lastFullMap = 0 # Heure (time.perf_counter()) du dernier envoi de la grille complète
+        self.mcp3008 = Hardware.MCP3008(robot.getSensorPosition) # Objet pour récupérer les données du détecteur de métaux
+        self.sampler = Sampler(self.mcp3008) # Lit le détecteur à fréquence fixe dans son propre thread
+        self.cursor = 0 # Numéro (voir Sampler.read()) de la prochaine mesure à ajouter à la grille
+        self.lostSamples = 0 # Nombre de mesures écrasées dans l'anneau du Sampler avant d'avoir été ajoutées
+        self.stats = Stats() # Durées d'ajout des mesures et d'encodage des grilles, nombre de mesures et de grilles envoyées (publiés par Main)
         self.cellSize = 1 # Taille d'une case de la grille
-        self.count = 0
-        self.values = np.array([])
-        self.x = 0
-        self.y = 0
-
-    # Permet d'ajouter des colonnes ou des lignes à la matrice
-    def addColR(self, n):
-        self.matrix = np.c_[self.matrix, -np.ones((np.shape(self.matrix)[0],n))]
-
-    def addColL(self, n):
-        self.matrix = np.c_[-np.ones((np.shape(self.matrix)[0],n)),self.matrix]
-
-    def addRowU(self, n):
-        self.matrix = np.r_[-np.ones((n, np.shape(self.matrix)[1])), self.matrix]
-
-    def addRowD(self,n):
-        self.matrix = np.r_[self.matrix, -np.ones((n, np.shape(self.matrix)[1]))]
-
-    def addToMatrix(self, value, x, y):
-        x += self.decal_x,
-        y += self.decal_y
-        if x >= np.shape(self.matrix)[0]:
-            self.addRowD(x - np.shape(self.matrix)[0]+1)
-        if y >= np.shape(self.matrix)[1]:
-            self.addColR(y - np.shape(self.matrix)[1]+1)
-        if x < 0:
-            self.decal_x += abs(x)
-            self.addRowU(-x)
-            x = 0
-        if y < 0:
-            self.decal_y += abs(y)
-            self.addColL(-y)
-            y = 0
-        self.matrix[x, y] = value
-
-    def addData(self, lastSend=False):
-        """
-        -Récupère la valeur captée par le détecteur de métaux
-        -Associe la position actuelle du détecteur de métaux avec cette valeur dans self.data
-        -Ajoute la valeur au bon endroit dans self.matrix (et y ajouter une ligne ou une colonne au début ou à la fin et mettre à jour self.originCoords si besoin)
-        -Une fois sur [self.SEND_FREQUENCY], appelle self.sendMap()
-        """
-        position = self.robot.getSensorPosition()
-        value = 1 - self.mcp3008.read_adc(0) / 855
-        self.data[position] = value
-
-        self.count += 1
-        xtmp = position[0] / self.cellSize + 0.5
-        ytmp = position[1] / self.cellSize + 0.5
-        x = int(xtmp if xtmp > 0 else xtmp - 1)
-        y = int(ytmp if ytmp > 0 else ytmp - 1)
-
-        if x == self.x and y == self.y:    # Si on est sur la même case, rajoute une donnée dans la liste
-            self.values = np.append(self.values, value)
+        self.interpolator = None # MapInterpolator utilisé pour calculer les cases envoyées (None : moyenne des mesures de chaque case)
+        self.detector = TargetDetector() # Cibles détectées au fur et à mesure des mesures (message "Tgt")
+        self.streamMap = self.STREAM_MAP
+        self.sendDeltas = self.SEND_DELTAS
+        self.lock = RLock() # Les mesures sont ajoutées dans un thread, la grille peut être changée et envoyée depuis les autres
+        self.recording = False
+        self.__stopEvent = Event()
+        self.__thread = None
+        self.log = None # Journal de toutes les mesures sur le disque (None : pas de journal, ou il n'a pas pu être ouvert)
+        if logPath != None:
+            try:
+                self.log = SampleLog(logPath)
+            except OSError as error:
+                print("Cannot open the sample log:", error)
+        self.setInterpolation(self.INTERPOLATION)
+        self.load()
+
+
+    def start(self):
+        """
+        Commence l'enregistrement : démarre les mesures (self.sampler) et le thread qui les ajoute à la grille (fonction __run)
+        Au premier enregistrement, calibre d'abord le détecteur (le robot n'a pas encore bougé, il est supposé loin de tout métal)
+        """
+        if not self.sampler.calibrated:
+            self.sampler.calibrate()
+            self.detector.noise = self.sampler.noise / self.sampler.scale
+        self.cursor = self.sampler.written
+        self.sampler.start()
+        self.recording = True
+        self.__stopEvent.clear()
+        self.__thread = Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+
+    def stop(self):
+        """
+        Arrête l'enregistrement après avoir ajouté les dernières mesures à la grille (et envoyé les cases pas encore envoyées, si self.streamMap)
+        """
+        if not self.recording:
+            return
+        self.sampler.stop()
+        self.recording = False
+        self.__stopEvent.set()
+        self.__thread.join(1)
+        with self.lock:
+            self.integrate()
+            if self.streamMap and len(self.dirty) > 0:
+                self.sendMap()
+        if self.log != None:
+            self.log.flush()
+
+
+    def close(self):
+        """
+        Arrête l'enregistrement et ferme le journal (quand la carte est remplacée, ex: nouvelle session de Main)
+        """
+        self.stop()
+        if self.log != None:
+            self.log.close()
+            self.log = None
+
+
+    def __run(self):
+        """
+        Fonction appellée par start() dans un thread :
+        toutes les self.INTEGRATE_PERIOD secondes, ajoute les nouvelles mesures à la grille et l'envoie (si self.streamMap, voir sendMap())
+        et les cibles si elles ont changé. Sans self.sendDeltas, la grille complète n'est envoyée qu'au plus toutes les self.FULL_MAP_PERIOD secondes
+        (les cases modifiées entre temps restent dans self.dirty)
+        """
+        try:
+            while not self.__stopEvent.wait(self.INTEGRATE_PERIOD):
+                with self.lock:
+                    self.integrate()
+                    due = self.sendDeltas or time.perf_counter() - self.lastFullMap >= self.FULL_MAP_PERIOD
+                    if self.streamMap and (self.fullPending or (len(self.dirty) > 0 and due)):
+                        self.sendMap()
+                    if self.detector.changed:
+                        self.sendTargets()
+        except:
+            print(traceback.format_exc())
 
-        else:
-            if len(self.values) > 0:    # self.x et self.y sont de base à 0, 0 donc lorsque qu'on exécute le programme, il veut envoyer la moyenne d'une liste vide
-                self.addToMatrix(np.mean(self.values), self.x, self.y)
-            self.x = x
-            self.y = y
-            self.values = np.array([value])
-        
-        if self.count == self.SEND_FREQUENCY or lastSend:  # envoie les donnée
-            self.addToMatrix(np.mean(self.values), self.x, self.y)
-            self.count = 0
-            self.sendMap()
+
+    def integrate(self) -> int:
+        """
+        Ajoute à la grille les mesures prises par self.sampler depuis le dernier appel :
+        -Associe chaque mesure à la position qu'avait le détecteur de métaux au moment de la mesure (voir Robot.getSensorPositionAt())
+        (les mesures prises après la dernière position connue du robot attendent le prochain appel)
+        -Les ajoute à self.samples, à la somme de leur case dans self.pyramid (la valeur d'une case est la moyenne de toutes ses mesures) et à self.log
+        -Les donne à self.detector
+        Renvoie le nombre de mesures ajoutées
+        """
+        with self.lock:
+            start = time.perf_counter()
+            times, raw, self.cursor, lost = self.sampler.read(self.cursor, self.robot.poseKnownUntil())
+            self.lostSamples += lost
+            if len(times) == 0:
+                return 0
+            xs, ys, orientations = self.robot.getSensorPoseAt(times)
+            values = self.sampler.normalize(raw)
+            timestamps = times + (time.time() - time.perf_counter())
+            self.samples.extend(xs, ys, values, timestamps)
+            if self.log != None:
+                self.log.append(timestamps, xs, ys, orientations, raw, values)
+            cx, cy = self.pyramid.addMany(xs, ys, values, self.cellSize)
+            self.dirty.update(zip(cx.tolist(), cy.tolist()))
+            detectStart = time.perf_counter()
+            self.detector.add(xs, ys, values)
+            self.stats.record("detect", time.perf_counter() - detectStart)
+            self.stats.gauge("targets", len(self.detector.targets))
+            self.stats.record("integrate", time.perf_counter() - start)
+            self.stats.count("samples", len(times))
+            self.stats.gauge("lostSamples", self.lostSamples)
+            return len(times)
 
     
     def changePrecision(self, newprecision):
-        self.cellSize = newprecision
-
-        self.decal_x = 0
-        self.decal_y = 0
-        self.x = 0
-        self.y = 0
-        self.matrix = -np.ones((3,3))
-        self.values = np.array([])
-
-        counts = {}
-        for position in self.data:
-            xtmp = position[0] / self.cellSize + 0.5
-            ytmp = position[1] / self.cellSize + 0.5
-            x = int(xtmp if xtmp > 0 else xtmp - 1)
-            y = int(ytmp if ytmp > 0 else ytmp - 1)
-            intpos = (x, y)
-            if intpos in counts:
-                counts[intpos] += 1
-                self.addToMatrix(((counts[intpos] - 1) * self.matrix[x + self.decal_x, y + self.decal_y] + self.data[position]) / counts[intpos], x, y)
+        """
+        Change la taille des cases de la grille et l'envoie à la télécommande
+        -La grille est reprise du cache de self.pyramid si elle a déjà été calculée et qu'aucune mesure n'a été ajoutée depuis
+        -Sinon, elle est déduite des cases de base (ou de toutes les mesures si [newprecision] n'est pas un multiple pair de MapPyramid.BASE_CELL_SIZE)
+        """
+        with self.lock:
+            self.cellSize = newprecision
+            self.sendMap(True)
+
+
+    def setInterpolation(self, method: str):
+        """
+        Choisit la valeur des cases envoyées à la télécommande (voir self.INTERPOLATION) et renvoie la grille complète
+        Le rayon de l'interpolation est au moins l'écart entre les lignes du scan enregistré, pour remplir les cases entre les lignes
+        """
+        with self.lock:
+            self.interpolator = MapInterpolator(self.samples, method) if method != None else None
+            self.__updateRadius()
+            self.fullPending = True
+
+
+    def __updateRadius(self):
+        if self.interpolator != None:
+            scan = self.log.scan if self.log != None else None
+            self.interpolator.radius = max(MapInterpolator.RADIUS, scan[2]) if scan != None else MapInterpolator.RADIUS
+
+
+    def clearData(self, scan: tuple = None):
+        """
+        Supprime toutes les données (et le journal) pour recommencer une nouvelle carte
+        [scan] : paramètres (sizeX, sizeY, precision, speed) du scan qui commence, gardés dans le journal pour pouvoir le reprendre
+        """
+        with self.lock:
+            self.cursor = self.sampler.written
+            self.samples.clear()
+            self.pyramid.clear()
+            self.dirty = set()
+            self.fullPending = True
+            self.detector.clear()
+            self.detector.changed = True # Pour effacer les cibles de la télécommande
+            if self.log != None:
+                self.log.reset(scan)
+            if self.interpolator != None:
+                self.interpolator.clear()
+                self.__updateRadius()
+
+
+    def load(self) -> int:
+        """
+        Reconstruit la carte à partir des mesures de self.log (ex: après un redémarrage du programme), en une fois pour toutes les mesures
+        Renvoie le nombre de mesures chargées
+        """
+        if self.log == None:
+            return 0
+        with self.lock:
+            records = self.log.load()
+            self.samples.clear()
+            self.pyramid.clear()
+            self.dirty = set()
+            self.fullPending = True
+            self.detector.clear()
+            if self.log.scan != None:
+                self.cellSize = self.log.scan[2]
+            if self.interpolator != None:
+                self.interpolator.clear()
+                self.__updateRadius()
+            if len(records) > 0:
+                self.samples.extend(records["x"], records["y"], records["value"], records["time"])
+                self.pyramid.addMany(records["x"], records["y"], records["value"].astype(np.float64), self.cellSize)
+                self.detector.add(records["x"], records["y"], records["value"])
+            return len(records)
+
+
+    def sendMap(self, full: bool = False):
+        """
+        Envoie la grille à la télécommande :
+        -Si [full] (ou si une grille complète est en attente : connexion, nouvelle carte, ou si not self.sendDeltas) :
+         envoie toute la grille sous forme de matrice dense (message "Map")
+        -Sinon : envoie uniquement les cases modifiées depuis le dernier envoi (message "Dlt")
+        Avec self.interpolator, les cases sont interpolées et les cases modifiées sont toutes celles à moins du rayon de l'interpolation des nouvelles mesures
+        """
+        with self.lock:
+            start = time.perf_counter()
+            pos = self.robot.getSensorPosition()
+            if full or self.fullPending or not self.sendDeltas:
+                header, content = self.fullMapMessage()
+                self.fullPending = False
+                self.lastFullMap = time.perf_counter()
+            elif self.interpolator != None:
+                header = "Dlt"
+                originCoords, size = self.interpolator.getFrame(self.cellSize)
+                if len(self.dirty) > 0:
+                    dirty = np.array(list(self.dirty))
+                    margin = int(np.ceil(self.interpolator.radius / self.cellSize))
+                    minX, minY = dirty.min(axis=0) - margin
+                    maxX, maxY = dirty.max(axis=0) + margin
+                    matrix, _ = self.interpolator.toDense(self.cellSize, (minX, minY, maxX, maxY))
+                    i, j = np.nonzero(matrix != -1)
+                    cells = np.stack((i + minX, j + minY), axis=1).astype(np.int32)
+                    values = matrix[i, j]
+                else:
+                    cells, values = np.empty((0, 2), dtype=np.int32), np.empty(0)
+                content = self.encodeDelta(pos, cells + originCoords, values, originCoords, size)
             else:
-                counts[intpos] = 1
-                self.addToMatrix(self.data[position], x, y)
+                header = "Dlt"
+                originCoords, size = self.pyramid.getFrame(self.cellSize)
+                cells = np.array(list(self.dirty), dtype=np.int32).reshape(-1, 2)
+                values = np.array([self.pyramid.getMean(self.cellSize, x, y) for x, y in self.dirty], dtype=np.float64)
+                content = self.encodeDelta(pos, cells + originCoords, values, originCoords, size)
+            self.dirty = set()
+            self.stats.record("encode" + header, time.perf_counter() - start)
+            self.stats.count("sent" + header)
+            self.stats.count("sentBytes", len(content))
+            self.main.sender.send(header, content)
 
-        self.sendMap()
-        self.count = 0
 
+    def fullMapMessage(self) -> tuple:
+        """
+        Renvoie le message ("Map", contenu) de la grille complète, sans changer l'état des envois (self.dirty, self.fullPending)
+        Ex: pour un spectateur qui a perdu des messages (voir requestResync()), sans renvoyer la grille aux autres clients
+        """
+        with self.lock:
+            matrix, originCoords = (self.interpolator or self.pyramid).toDense(self.cellSize)
+            return "Map", self.encodeMap(self.robot.getSensorPosition(), matrix, originCoords)
 
-    def sendMap(self):
+
+    def requestResync(self, send: callable):
         """
-        -Récupère la grille
-        -Transforme la grille en une chaine de caractère
-        -Envoie la grille à la télécommande
+        Fonction de SocketServer.resyncHandlers, appelée dans la boucle asyncio : demande la construction de la grille complète
+        dans le thread d'envoi de self.main.sender (à son tour, après les modifications déjà en attente), puis son envoi avec [send] (un seul spectateur)
         """
-        pos = self.robot.getSensorPosition()
-        self.server.send("Map", "{};{};{};{};{};{}".format(pos[0], pos[1], self.robot.orientation, self.decal_x, self.decal_y, json.dumps(self.matrix.tolist())))
+        self.main.sender.call(lambda: send(*self.fullMapMessage()))
 
-    
-    def clearData(self):
+
+    def sendTargets(self):
+        """
+        Envoie toutes les cibles détectées à la télécommande (message "Tgt", quelques dizaines d'octets par cible)
+        """
+        with self.lock:
+            start = time.perf_counter()
+            content = self.encodeTargets(self.detector.targets)
+            self.detector.changed = False
+            self.stats.record("encodeTgt", time.perf_counter() - start)
+            self.stats.count("sentTgt")
+            self.stats.count("sentBytes", len(content))
+            self.main.sender.send("Tgt", content)
+
+
+    def setStreaming(self, enabled: bool):
+        """
+        Active ou désactive l'envoi des modifications de la grille au fur et à mesure (voir self.STREAM_MAP)
+        En le réactivant, la grille complète est envoyée au prochain envoi
+        """
+        with self.lock:
+            self.streamMap = enabled
+            self.fullPending = True
+
+
+    def setDeltas(self, enabled: bool):
         """
-        Supprime toutes les données pour recommencer une nouvelle carte
+        Active ou désactive l'envoi des seules cases modifiées ("Dlt") à la place de la grille complète (voir self.SEND_DELTAS)
+        La grille complète est envoyée au prochain envoi, pour que les modifications suivantes s'appliquent à une grille à jour
         """
-        self.data = {}
-        self.decal_x = 0
-        self.decal_y = 0
-        self.x = 0
-        self.y = 0
-        self.matrix = -np.ones((3,3))
-        self.values = np.array([])
+        with self.lock:
+            self.sendDeltas = enabled
+            self.fullPending = True
+
+
+    def encodeTargets(self, targets: list):
+        """
+        Encode les cibles selon self.MAP_FORMAT :
+        -"json" : chaine "[[id, x, y, intensité, tailleX, tailleY, passages], ...]"
+        -Sinon : self.TARGETS_HEADER suivi de self.TARGET pour chaque cible
+        """
+        if self.MAP_FORMAT == "json":
+            return json.dumps([[target.id, target.x, target.y, target.strength, *target.size, target.hits] for target in targets])
+        buffer = bytearray(self.TARGETS_HEADER.size + len(targets) * self.TARGET.size)
+        self.TARGETS_HEADER.pack_into(buffer, 0, len(targets))
+        for i, target in enumerate(targets):
+            self.TARGET.pack_into(buffer, self.TARGETS_HEADER.size + i * self.TARGET.size,
+                                  target.id, target.x, target.y, target.strength, *target.size, min(target.hits, 65535))
+        return buffer
+
+
+    def encodeMap(self, pos, matrix, originCoords):
+        """
+        Encode une grille complète selon self.MAP_FORMAT :
+        -"json" : chaine "x;y;orientation;originX;originY;[[valeurs]]"
+        -Sinon : self.MAP_HEADER suivi des cases (ligne par ligne) écrites directement dans le buffer envoyé
+        """
+        if self.MAP_FORMAT == "json":
+            return "{};{};{};{};{};{}".format(pos[0], pos[1], self.robot.orientation, originCoords[0], originCoords[1], json.dumps(matrix.tolist()))
+        code, dtype, sentinel = self.MAP_FORMATS[self.MAP_FORMAT]
+        buffer = bytearray(self.MAP_HEADER.size + matrix.size * dtype.itemsize)
+        self.MAP_HEADER.pack_into(buffer, 0, pos[0], pos[1], self.robot.orientation, originCoords[0], originCoords[1], matrix.shape[0], matrix.shape[1], code)
+        self.__quantize(matrix, np.frombuffer(buffer, dtype, offset=self.MAP_HEADER.size).reshape(matrix.shape), sentinel)
+        return buffer
+
+
+    def encodeDelta(self, pos, cells, values, originCoords, size):
+        """
+        Encode les cases modifiées ([cells] : tableau (n, 2) d'indices dans la matrice, [values] : leurs valeurs) selon self.MAP_FORMAT :
+        -"json" : chaine "x;y;orientation;originX;originY;tailleX;tailleY;[[i, j, valeur], ...]"
+        -Sinon : self.DELTA_HEADER suivi des n indices i (int32), des n indices j (int32) et des n valeurs
+        """
+        if self.MAP_FORMAT == "json":
+            triplets = [[int(c[0]), int(c[1]), float(v)] for c, v in zip(cells, values)]
+            return "{};{};{};{};{};{};{};{}".format(pos[0], pos[1], self.robot.orientation, originCoords[0], originCoords[1], size[0], size[1], json.dumps(triplets))
+        code, dtype, sentinel = self.MAP_FORMATS[self.MAP_FORMAT]
+        n = len(values)
+        start = self.DELTA_HEADER.size
+        buffer = bytearray(start + n * (8 + dtype.itemsize))
+        self.DELTA_HEADER.pack_into(buffer, 0, pos[0], pos[1], self.robot.orientation, originCoords[0], originCoords[1], size[0], size[1], code, n)
+        np.frombuffer(buffer, "<i4", count=2 * n, offset=start).reshape(2, n)[...] = cells.T
+        self.__quantize(values, np.frombuffer(buffer, dtype, count=n, offset=start + 8 * n), sentinel)
+        return buffer
+
+
+    def __quantize(self, values, out, sentinel):
+        """
+        Écrit [values] dans [out] :
+        -En float32 : tel quel
+        -En entiers : les valeurs (limitées à [0, 1]) sont multipliées par sentinel - 1 et les cases vides (-1) valent sentinel
+        """
+        if sentinel == None:
+            out[...] = values
+        else:
+            out[...] = np.rint(np.clip(values, 0, 1) * (sentinel - 1))
+            out[values == -1] = sentinel
 
 
-    def sendMap(self):
+    def requestFullMap(self):
         """
-        -Récupère la grille
-        -Transforme la grille en une chaine de caractère
-        -Envoie la grille à la télécommande
+        Force l'envoi de la grille complète au prochain sendMap() (ex: quand la télécommande se connecte)
         """
-        pos = self.robot.getSensorPosition()
-        self.main.mustSend.append(("Map", "{};{};{};{};{};{}".format(pos[0], pos[1], self.robot.orientation, self.originCoords[0], self.originCoords[1], json.dumps(self.matrix.tolist()))))
\ No newline at end of file
+        self.fullPending = True
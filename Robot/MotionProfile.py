@@ -0,0 +1,136 @@
+import numpy as np
+from math import sqrt, floor, inf
+
+
+class MotionProfile:
+    """Profil de vitesse trapézoïdal d'un moteur pas à pas :
+    accélération de [startSpeed] à [maxSpeed], vitesse constante puis décélération jusqu'à [endSpeed]
+    Calcule à l'avance les instants de tous les fronts (montants et descendants) du signal STEP"""
+
+    def __init__(self, startSpeed: float, maxSpeed: float, accelerationRate: float, steps: float = -1, endSpeed: float = None, phase: float = 0):
+        """
+        -[startSpeed], [maxSpeed], [endSpeed] : vitesses en pas/s (seules les valeurs absolues sont utilisées)
+        -[accelerationRate] : accélération en pas/s²
+        -[steps] : nombre de pas à faire (-1 : indéfiniment, sans décélération)
+        -[endSpeed] : vitesse à atteindre au dernier pas (None : pas de décélération, le moteur s'arrête net)
+        -[phase] : partie du demi-pas en cours déjà parcourue (en pas, entre 0 et 0.5) au début du profil
+        """
+        self.accelerationRate = a = abs(accelerationRate)
+        self.startSpeed = v0 = abs(startSpeed)
+        self.phase = phase
+        self.infinite = steps < 0
+        self.steps = inf if self.infinite else max(steps, 0)
+        self.cursor = 0 # Indice du prochain front à renvoyer par nextEdges()
+        vmax = max(abs(maxSpeed), v0)
+
+        if v0 == 0 and vmax == 0:
+            # Moteur à l'arrêt : aucun front
+            self.steps = 0
+            self.peakSpeed = self.endSpeed = 0
+            self.accelDistance = self.decelDistance = self.cruiseDistance = 0
+            self.accelTime = self.cruiseTime = self.decelTime = 0
+            self.totalEdges = 0
+            return
+
+        vend = vmax if self.infinite or endSpeed == None or a == 0 else min(abs(endSpeed), vmax)
+        accelDistance = (vmax * vmax - v0 * v0) / (2 * a) if a > 0 else 0
+        decelDistance = (vmax * vmax - vend * vend) / (2 * a) if a > 0 else 0
+        if not self.infinite and accelDistance + decelDistance > self.steps:
+            # Profil triangulaire : la vitesse maximale n'est pas atteinte
+            vmax = sqrt(max((2 * a * self.steps + v0 * v0 + vend * vend) / 2, 0))
+            if vmax < v0:
+                # Impossible d'atteindre [endSpeed] à temps : on décélère dès le début
+                vmax = v0
+                vend = sqrt(max(v0 * v0 - 2 * a * self.steps, 0))
+            accelDistance = (vmax * vmax - v0 * v0) / (2 * a)
+            decelDistance = self.steps - accelDistance
+
+        self.peakSpeed = vmax
+        self.endSpeed = vend
+        self.accelDistance = accelDistance
+        self.decelDistance = decelDistance
+        self.cruiseDistance = self.steps - accelDistance - decelDistance
+        self.accelTime = (vmax - v0) / a if a > 0 else 0
+        self.cruiseTime = self.cruiseDistance / vmax
+        self.decelTime = (vmax - vend) / a if a > 0 else 0
+        # Le front k (k = 0, 1, ...) a lieu à la position (0.5 - phase) + 0.5 * k, les fronts pairs sont montants (= un pas)
+        self.totalEdges = inf if self.infinite else max(int(floor((self.steps - (0.5 - phase)) * 2 + 1e-9)) + 1, 0)
+
+
+    def duration(self) -> float:
+        """
+        Renvoie la durée totale du profil (inf si le moteur tourne indéfiniment)
+        """
+        return self.accelTime + self.cruiseTime + self.decelTime
+
+
+    def positionAt(self, t: float) -> float:
+        """
+        Renvoie la position (en pas, depuis le début du profil) au temps [t]
+        """
+        a, v0, vmax = self.accelerationRate, self.startSpeed, self.peakSpeed
+        if t <= self.accelTime:
+            return v0 * t + a * t * t / 2
+        t -= self.accelTime
+        if t <= self.cruiseTime:
+            return self.accelDistance + vmax * t
+        t = min(t - self.cruiseTime, self.decelTime)
+        return self.accelDistance + self.cruiseDistance + vmax * t - a * t * t / 2
+
+
+    def speedAt(self, t: float) -> float:
+        """
+        Renvoie la vitesse (en pas/s, positive) au temps [t] (0 après la fin du profil)
+        """
+        if t <= self.accelTime:
+            return self.startSpeed + self.accelerationRate * t
+        t -= self.accelTime
+        if t <= self.cruiseTime:
+            return self.peakSpeed
+        t -= self.cruiseTime
+        if t <= self.decelTime:
+            return self.peakSpeed - self.accelerationRate * t
+        return 0
+
+
+    def timesAt(self, positions):
+        """
+        Renvoie les instants (tableau numpy) auxquels le moteur atteint les [positions] (tableau numpy, en pas)
+        """
+        a, v0, vmax = self.accelerationRate, self.startSpeed, self.peakSpeed
+        s = np.asarray(positions, dtype=np.float64)
+        times = np.empty(len(s))
+        accel = s <= self.accelDistance
+        decel = s > self.accelDistance + self.cruiseDistance
+        cruise = ~(accel | decel)
+        if a > 0:
+            times[accel] = (np.sqrt(v0 * v0 + 2 * a * s[accel]) - v0) / a
+            sd = s[decel] - self.accelDistance - self.cruiseDistance
+            times[decel] = self.accelTime + self.cruiseTime + (vmax - np.sqrt(np.maximum(vmax * vmax - 2 * a * sd, 0))) / a
+        else:
+            times[accel | decel] = s[accel | decel] / vmax
+        times[cruise] = self.accelTime + (s[cruise] - self.accelDistance) / vmax
+        return times
+
+
+    def nextEdges(self, until: float):
+        """
+        Renvoie les instants des prochains fronts du signal STEP ayant lieu avant [until] (tableau numpy)
+        et l'indice du premier de ces fronts (les fronts d'indice pair sont montants)
+        """
+        first = self.cursor
+        if first >= self.totalEdges:
+            return np.empty(0), first
+        last = int(floor((self.positionAt(until) - (0.5 - self.phase)) * 2 + 1e-9)) # Dernier front avant [until]
+        last = min(last, self.totalEdges - 1)
+        if last < first:
+            return np.empty(0), first
+        self.cursor = last + 1
+        return self.timesAt((0.5 - self.phase) + 0.5 * np.arange(first, last + 1)), first
+
+
+    def emittedPosition(self) -> float:
+        """
+        Renvoie la position (en pas) du dernier front renvoyé par nextEdges()
+        """
+        return (0.5 - self.phase) + 0.5 * (self.cursor - 1) if self.cursor > 0 else 0
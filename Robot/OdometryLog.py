@@ -0,0 +1,112 @@
+from math import pi
+import numpy as np
+
+
+class OdometryLog:
+    """Historique des positions du robot (odométrie) dans un anneau de tableaux préalloués :
+    -Le thread des moteurs y ajoute une position à chaque mise à jour (sans allocation)
+    -Les autres threads retrouvent, par interpolation, la position du robot ou du détecteur de métaux à n'importe quel instant récent"""
+
+    CAPACITY = 16384 # Nombre de positions gardées (les plus anciennes sont écrasées)
+
+    def __init__(self, sensorPosition: tuple, capacity: int = CAPACITY):
+        self.sensorPosition = sensorPosition # Position (x, y) du détecteur de métaux par rapport au point entre les 2 roues (voir Robot.SENSOR_POSITION)
+        self.times = np.zeros(capacity) # Heure (time.perf_counter()) de chaque position
+        self.x = np.zeros(capacity)
+        self.y = np.zeros(capacity)
+        self.orientation = np.zeros(capacity) # Orientation (radians)
+        self.steps = np.zeros((capacity, 2), dtype=np.int64) # Nombre total de pas de chaque moteur (négatif vers l'arrière)
+        self.written = 0 # Nombre total de positions écrites (la position n est à l'indice n % capacity)
+
+
+    def append(self, t: float, x: float, y: float, orientation: float, m1Steps: int, m2Steps: int):
+        """
+        Ajoute la position ([x], [y], [orientation]) du robot à l'instant [t] et le nombre total de pas de chaque moteur
+        Les positions doivent être ajoutées dans l'ordre chronologique, depuis un seul thread
+        """
+        i = self.written % len(self.times)
+        self.times[i] = t
+        self.x[i] = x
+        self.y[i] = y
+        self.orientation[i] = orientation
+        self.steps[i, 0] = m1Steps
+        self.steps[i, 1] = m2Steps
+        self.written += 1 # Après l'écriture : les lectures ne voient jamais une position incomplète
+
+
+    def clear(self):
+        """
+        Supprime toutes les positions (ex: quand la position du robot est remise à zéro)
+        """
+        self.written = 0
+
+
+    def lastTime(self) -> float:
+        """
+        Renvoie l'heure de la dernière position ajoutée (-inf s'il n'y en a pas)
+        """
+        end = self.written
+        return self.times[(end - 1) % len(self.times)] if end > 0 else float("-inf")
+
+
+    def __window(self, since: float) -> np.ndarray:
+        """
+        Renvoie les indices (dans l'ordre chronologique) des positions nécessaires pour interpoler à partir de l'instant [since] :
+        la dernière position avant [since] et toutes les suivantes (recherche dichotomique, sans copier l'anneau)
+        """
+        capacity = len(self.times)
+        end = self.written
+        low, high = max(end - capacity + 1, 0), end # + 1 : la plus ancienne position peut être en train d'être écrasée
+        while low < high:
+            middle = (low + high) // 2
+            if self.times[middle % capacity] <= since:
+                low = middle + 1
+            else:
+                high = middle
+        first = max(low - 1, max(end - capacity + 1, 0))
+        return np.arange(first, end) % capacity
+
+
+    def poseAt(self, times) -> tuple:
+        """
+        Renvoie les positions (tableaux numpy x, y, orientation) du robot aux instants [times] (tableau numpy de time.perf_counter(), ou un nombre)
+        Interpole linéairement entre les deux positions enregistrées autour de chaque instant
+        (avant la première ou après la dernière position gardée : la plus proche)
+        """
+        times = np.atleast_1d(np.asarray(times, dtype=float))
+        if self.written == 0:
+            raise ValueError("No pose recorded")
+        indices = self.__window(times.min())
+        t, x, y, orientation = self.times[indices], self.x[indices], self.y[indices], self.orientation[indices]
+        if len(indices) == 1:
+            return np.full(len(times), x[0]), np.full(len(times), y[0]), np.full(len(times), orientation[0])
+        after = np.clip(np.searchsorted(t, times, side="right"), 1, len(t) - 1)
+        before = after - 1
+        duration = t[after] - t[before]
+        weight = np.clip(np.divide(times - t[before], duration, out=np.zeros(len(times)), where=duration > 0), 0, 1)
+        turn = (orientation[after] - orientation[before] + pi) % (2 * pi) - pi # Plus petit angle entre les deux orientations
+        return (
+            x[before] + weight * (x[after] - x[before]),
+            y[before] + weight * (y[after] - y[before]),
+            orientation[before] + weight * turn
+        )
+
+
+    def sensorPositionAt(self, times) -> tuple:
+        """
+        Renvoie les positions (tableaux numpy x, y) du détecteur de métaux aux instants [times] (voir poseAt())
+        """
+        return self.sensorPoseAt(times)[:2]
+
+
+    def sensorPoseAt(self, times) -> tuple:
+        """
+        Renvoie les positions et orientations (tableaux numpy x, y, orientation) du détecteur de métaux aux instants [times] (voir poseAt())
+        """
+        x, y, orientation = self.poseAt(times)
+        cosines, sines = np.cos(orientation), np.sin(orientation)
+        return (
+            x + self.sensorPosition[0] * cosines - self.sensorPosition[1] * sines,
+            y + self.sensorPosition[0] * sines + self.sensorPosition[1] * cosines,
+            orientation
+        )
@@ -0,0 +1,100 @@
+import os
+import sys
+import time
+import cProfile
+import pstats
+import threading
+from threading import Thread, Event
+import traceback
+
+
+class Profiler:
+    """Profilage optionnel d'une session du programme (de Main.start() à la fin de Main.main()), choisi avec la variable d'environnement ROBOT_PROFILE :
+    -"cprofile" : cProfile sur le thread principal (mouvements des moteurs, mode scan...), résultats dans un fichier .prof (voir pstats, snakeviz)
+    -"sampling" : relève la pile de tous les threads toutes les SAMPLING_INTERVAL secondes (thread de mesure, boucle asyncio, caméra...),
+    résultats dans un fichier texte au format "thread;fonction;fonction nombre" (flamegraph.pl, speedscope)"""
+
+    MODES = ("cprofile", "sampling")
+    SAMPLING_INTERVAL = 0.005 # Temps (s) entre deux relevés des piles en mode "sampling"
+    DIRECTORY = os.path.dirname(os.path.abspath(__file__)) # Dossier des fichiers de résultats
+
+    def __init__(self, mode: str, path: str = None):
+        """
+        -[mode] : "cprofile" ou "sampling"
+        -[path] : fichier de résultats (profile-[date].prof ou .txt dans self.DIRECTORY si None)
+        """
+        if mode not in self.MODES:
+            raise ValueError("Unknown profiler mode: " + mode)
+        self.mode = mode
+        extension = ".prof" if mode == "cprofile" else ".txt"
+        self.path = path if path != None else os.path.join(self.DIRECTORY, "profile-" + time.strftime("%Y%m%d-%H%M%S") + extension)
+        self.__profile = None
+        self.__stacks = {} # Nombre de relevés de chaque pile (mode "sampling")
+        self.__stopEvent = Event()
+        self.__thread = None
+
+
+    @classmethod
+    def fromEnvironment(cls):
+        """
+        Renvoie le Profiler demandé par la variable d'environnement ROBOT_PROFILE (None si elle n'est pas définie)
+        """
+        mode = os.environ.get("ROBOT_PROFILE")
+        return cls(mode) if mode else None
+
+
+    def start(self):
+        """
+        Commence le profilage (en mode "cprofile", seul le thread qui appelle start() est profilé)
+        """
+        if self.mode == "cprofile":
+            self.__profile = cProfile.Profile()
+            self.__profile.enable()
+        else:
+            self.__stacks = {}
+            self.__stopEvent.clear()
+            self.__thread = Thread(target=self.__sample)
+            self.__thread.daemon = True
+            self.__thread.start()
+
+
+    def stop(self):
+        """
+        Arrête le profilage et écrit les résultats dans self.path (et les fonctions les plus coûteuses dans la console)
+        """
+        if self.mode == "cprofile":
+            self.__profile.disable()
+            self.__profile.dump_stats(self.path)
+            pstats.Stats(self.__profile).sort_stats("cumulative").print_stats(20)
+        else:
+            self.__stopEvent.set()
+            self.__thread.join(1)
+            with open(self.path, "w") as file:
+                for stack, count in sorted(self.__stacks.items(), key=lambda item: -item[1]):
+                    file.write("{} {}\n".format(stack, count))
+            print("Most sampled stacks:")
+            for stack, count in sorted(self.__stacks.items(), key=lambda item: -item[1])[:10]:
+                print(count, stack[-150:])
+        print("Profile written to", self.path)
+
+
+    def __sample(self):
+        """
+        Fonction appellée par start() dans un thread en mode "sampling" : relève la pile de chaque autre thread toutes les self.SAMPLING_INTERVAL secondes
+        """
+        own = threading.get_ident()
+        try:
+            while not self.__stopEvent.wait(self.SAMPLING_INTERVAL):
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                for ident, frame in sys._current_frames().items():
+                    if ident == own:
+                        continue
+                    functions = []
+                    while frame != None:
+                        code = frame.f_code
+                        functions.append("{}:{}".format(os.path.basename(code.co_filename), code.co_name))
+                        frame = frame.f_back
+                    stack = ";".join([names.get(ident, str(ident))] + functions[::-1])
+                    self.__stacks[stack] = self.__stacks.get(stack, 0) + 1
+        except:
+            print(traceback.format_exc())
@@ -1,8 +1,14 @@
 import time
-from math import cos, sin, pi
+from math import cos, sin, pi, sqrt
+from threading import Event
+import numpy as np
+from MotionProfile import MotionProfile
+from OdometryLog import OdometryLog
+from Stats import Stats
 
-# Module pour interagir avec le GPIO (uniquement disponible sur le Raspberry)
-import RPi.GPIO as GPIO
+# Module pour interagir avec le GPIO (RPi.GPIO sur le Raspberry, simulé sinon : voir Hardware.py)
+import Hardware
+from Hardware import GPIO
 
 class Robot:
     """Gère le mouvement des deux moteurs pas à pas et le calcul de la position du robot"""
@@ -31,81 +37,25 @@ class Robot:
 
     # Autres
     STEPS_PER_ACTION = 40 # Nombre de pas entre chaque exécution de [otherAction] pour les fonctions de mouvement
+    ODOMETRY_STEPS = 4 # Nombre de pas entre chaque mise à jour de la position (et ajout à self.odometry)
     MAX_INSTANT_ACCELERATION = 200
     ACCELERATION_RATE = 4000
 
-
-    class MotorMove:
-        """Classe utilisée par la fonction move()"""
-        
-        totalCount = 0
-
-        def __init__(self, pin, steps, startSpeed, maxSpeed, accelerationRate):
-            self.pin = pin
-            self.steps = steps
-            self.startSpeed = startSpeed
-            self.maxSpeed = abs(maxSpeed)
-            self.accelerationRate = accelerationRate
-            self.speed = abs(startSpeed)
-            self.count = 0
-            self.actionCount = 0
-            self.isHigh = False
-            self.waited = 0
-            self.decelerating = False
-
-        def wait(self, time):
-            if self.speed != 0:
-                self.waited += time
-                if self.waited >= 1 / (2 * self.speed):
-                    self.waited = 0
-                    self.isHigh = not self.isHigh
-                    GPIO.output(self.pin, GPIO.HIGH if self.isHigh else GPIO.LOW)
-                    if self.decelerating:
-                        self.decelerate(1 / (2 * self.speed))
-                    else:
-                        self.__accelerate(1 / (2 * self.speed))
-                    if self.isHigh:
-                        self.count += 1
-                        self.actionCount += 1
-                        self.__class__.totalCount += 1
-                        if self.steps > 0 and self.count >= self.steps:
-                            self.speed = 0
-
-        def nextStep(self):
-            if self.speed == 0:
-                return 0
-            else:
-                return 1 / (2 * self.speed) - self.waited
-            
-        def getSpeed(self):
-            return self.speed if self.startSpeed > 0 else -self.speed
-            
-        def __accelerate(self, passedTime):
-            if self.speed != 0 and self.speed < self.maxSpeed:
-                self.speed += self.accelerationRate * passedTime
-                if self.speed > self.maxSpeed:
-                    self.speed = self.maxSpeed
-
-        def mustDecelerate(self, canJump):
-            if self.steps == -1: 
-                return False
-            else:
-                return (self.speed*self.speed - canJump*canJump) / (2 * self.accelerationRate) >= self.steps - self.count
-
-        def startDecelerate(self):
-            self.decelerating = True
-
-        def decelerate(self, time):
-            self.speed -= self.accelerationRate * time
-
-        def canJumpTo(self, speed, canJump):
-            return abs(speed - self.getSpeed()) <= canJump
+    # Minutage des pas
+    CHUNK_DURATION = 0.25 # Durée (s) des fronts calculés d'un coup par move()
+    # Durée (s) avant un front pendant laquelle on attend activement (en cédant le GIL aux autres threads) au lieu d'utiliser time.sleep()
+    # Mesuré sur PC (200 pas/s, processeur libre) : retard moyen des fronts 74 µs sans attente active, 38 µs avec (écart-type 63 et 53 µs) ;
+    # sans céder le GIL, 6 µs, mais un autre thread qui calcule ne recevait plus que 10 % du processeur. 0 en simulation (pas de vrais moteurs)
+    SPIN_TIME = 0.0005 if Hardware.BACKEND != "sim" else 0
+    MAX_LATENESS = 0.002 # Retard (s) au-delà duquel l'horloge des fronts est décalée (pour ne pas enchainer les fronts en retard)
+    IDLE_DISABLE_DELAY = 0.2 # Temps (s) sans mouvement après lequel les moteurs sont coupés
 
 
     def __init__(self, otherAction: callable, breakCondition: callable):
         self.position = [0, 0] # Position (x, y) du point entre les 2 roues (cm)
         self.orientation = 0 # Orientation du robot (degrés)
         self.stopMovement = False
+        self.stopEvent = Event() # Mis à 1 par stop() pour réveiller move() quand il attend sans faire tourner les moteurs
         self.stopped = True
         self.otherAction = otherAction
         self.breakCondition = breakCondition
@@ -115,6 +65,12 @@ class Robot:
         self.m2NextSpeed = 0
         self.canJump1 = self.MAX_INSTANT_ACCELERATION
         self.canJump2 = self.MAX_INSTANT_ACCELERATION
+        self.lastMoveTiming = None # Statistiques de minutage du dernier mouvement (voir __runProfiles)
+        self.stats = Stats() # Retard des fronts, durée de otherAction, nombre de mouvements et de fronts (publiés par Main)
+        self.moving = False # True pendant que les moteurs tournent (la position après self.odometry.lastTime() n'est alors pas encore connue)
+        self.stepCounts = [0, 0] # Nombre total de pas de chaque moteur (négatif vers l'arrière)
+        self.odometry = OdometryLog(self.SENSOR_POSITION) # Positions du robot au cours du temps (voir getSensorPositionAt())
+        self.recordPose()
         GPIO.setup(self.M1STEP, GPIO.OUT)
         GPIO.setup(self.M1DIR, GPIO.OUT)
         GPIO.setup(self.M1ENABLE, GPIO.OUT)
@@ -136,7 +92,7 @@ class Robot:
         )
 
 
-    def move(self, m1Steps: int, m2Steps: int, m1Speed: float, m2Speed: float, positionIncrement: tuple, decelerate: bool = False):
+    def move(self, m1Steps: int, m2Steps: int, m1Speed: float, m2Speed: float, positionIncrement: tuple, decelerate: bool = False, nextMove: tuple = None):
         """
         -Fait tourner les deux moteurs pas à pas
          * de [m1Steps] et [m2Steps] respectivement (ou indéfiniment si ils valent -1)
@@ -144,32 +100,33 @@ class Robot:
          * vers l'avant si la vitesse est positive, vers l'arrière sinon
         -Appelle [otherAction] à chaque [self.STEPS_PER_ACTION] pas
         -Arrête le mouvement si self.stopMovement == True (dans ce cas, le remettre à False)
-        -Met à jour self.position et self.orientation grâce à [positionIncrement] :
+        -Met à jour self.position et self.orientation à chaque [self.ODOMETRY_STEPS] pas grâce à [positionIncrement] (et les ajoute à self.odometry) :
         [positionIncrement] est un tuple contenant :
          * Si la trajectoire est circulaire : (r, da, m) où r est le rayon du cercle et da est l'angle (en degrés dans le sens trigonométrique) parcouru par le robot à chaque pas du moteur m (1 ou 2) (le cercle est à droite si r >= 0 et à gauche sinon)
          * Si la trajectoire est rectiligne : (None, dx, None) où dx est la distance parcourue par le robot à chaque pas du moteur 1
+        -Si [nextMove] (arguments du prochain appel à move()) est donné, décélère seulement jusqu'aux vitesses qui permettent
+        de l'enchaîner sans s'arrêter (voir blendSpeeds(), [decelerate] est alors ignoré)
         """
         # Pendant que les moteurs tournent, l'exécution du programme sera bloquée dans cette fonction.
         # On ne pourra donc pas faire autre chose ou réagir à des évènements extérieurs.
-        # C'est à ca que sert le paramètre [otherAction]
-        # Nous y mettrons les actions à faire périodiquement (ex: enregistrer les données du capteur)
+        # C'est à ca que sert le paramètre [otherAction] (None si rien à faire)
+        # Nous y mettrons les actions courtes à faire périodiquement (les mesures du détecteur de métaux sont prises dans leur propre thread : voir Sampler)
         GPIO.output(self.M1DIR, self.M1FORWARD if m1Speed > 0 else self.M1BACKWARD)
         GPIO.output(self.M2DIR, self.M2FORWARD if m2Speed > 0 else self.M2BACKWARD)
 
         if m1Speed == 0 and m2Speed == 0:
-            count = 0
-            while not self.stopMovement:
-                if not self.stopped:
-                    time.sleep(0.05)
-                    count += 0.05
-                    if count >= 0.2:
-                        GPIO.output(self.M1ENABLE, GPIO.HIGH)
-                        GPIO.output(self.M2ENABLE, GPIO.HIGH)
-                        self.stopped = True
-                        self.m1PreviousSpeed = 0
-                        self.m2PreviousSpeed = 0
-                        self.canJump1 = self.MAX_INSTANT_ACCELERATION
-                        self.canJump2 = self.MAX_INSTANT_ACCELERATION
+            # Attend stop() sans utiliser le processeur
+            # Les moteurs restent alimentés pendant self.IDLE_DISABLE_DELAY (pour pouvoir repartir directement), puis sont coupés
+            if not self.stopped and not self.__waitStop(self.IDLE_DISABLE_DELAY):
+                GPIO.output(self.M1ENABLE, GPIO.HIGH)
+                GPIO.output(self.M2ENABLE, GPIO.HIGH)
+                self.stopped = True
+                self.m1PreviousSpeed = 0
+                self.m2PreviousSpeed = 0
+                self.canJump1 = self.MAX_INSTANT_ACCELERATION
+                self.canJump2 = self.MAX_INSTANT_ACCELERATION
+            self.__waitStop(None)
+            self.stopMovement = False
 
         else:
             if self.stopped:
@@ -191,78 +148,220 @@ class Robot:
                 else:
                     jump1 = max(self.canJump1, self.canJump2 * m1Speed / m2Speed) * (1 if m1Speed - self.m1PreviousSpeed > 0 else -1)
                     jump2 = jump1 * m2Speed / m1Speed
+                # Un saut ne dépasse jamais la vitesse demandée (possible si le moteur tournait déjà : mouvement enchaîné)
+                needed1, needed2 = m1Speed - self.m1PreviousSpeed, m2Speed - self.m2PreviousSpeed
+                jump1 = max(min(jump1, max(needed1, 0)), min(needed1, 0))
+                jump2 = max(min(jump2, max(needed2, 0)), min(needed2, 0))
 
+            # Profils de vitesse des deux moteurs : le plus rapide accélère à self.ACCELERATION_RATE,
+            # l'autre proportionnellement pour que les deux atteignent leur vitesse maximale en même temps
             if abs(m1Speed) > abs(m2Speed):
-                fastest = self.MotorMove(self.M1STEP, m1Steps, self.m1PreviousSpeed + jump1, m1Speed, self.ACCELERATION_RATE)
-                slowest = self.MotorMove(self.M2STEP, m2Steps, self.m2PreviousSpeed + jump2, m2Speed, self.ACCELERATION_RATE * abs(m2Speed / m1Speed))
-                m1, m2 = fastest, slowest
+                rates = (self.ACCELERATION_RATE, self.ACCELERATION_RATE * abs(m2Speed / m1Speed))
+                fastest = 0
             else:
-                fastest = self.MotorMove(self.M2STEP, m2Steps, self.m2PreviousSpeed + jump2, m2Speed, self.ACCELERATION_RATE)
-                slowest = self.MotorMove(self.M1STEP, m1Steps, self.m1PreviousSpeed + jump1, m1Speed, self.ACCELERATION_RATE * abs(m1Speed / m2Speed))
-                m1, m2 = slowest, fastest
-
-            while True:
-                wait1, wait2 = fastest.nextStep(), slowest.nextStep()
-                if wait1 == 0 and wait2 == 0:
-                    break
-                elif wait1 == 0:
-                    wait = wait2
-                elif wait2 == 0:
-                    wait = wait1
+                rates = (self.ACCELERATION_RATE * abs(m1Speed / m2Speed), self.ACCELERATION_RATE)
+                fastest = 1
+            startSpeeds = (self.m1PreviousSpeed + jump1, self.m2PreviousSpeed + jump2)
+            signs = tuple(1 if speed > 0 else -1 for speed in startSpeeds)
+            if nextMove != None:
+                endSpeeds = self.blendSpeeds((m1Speed, m2Speed), nextMove)
+            elif decelerate:
+                endSpeeds = [self.MAX_INSTANT_ACCELERATION * rate / self.ACCELERATION_RATE for rate in rates]
+            else:
+                endSpeeds = [None, None]
+            profiles = [MotionProfile(startSpeeds[i], (m1Speed, m2Speed)[i], rates[i], (m1Steps, m2Steps)[i], endSpeeds[i]) for i in range(2)]
+
+            self.__timing = [0, 0, 0, 0] # Nombre de fronts, somme des retards, somme des carrés des retards, retard maximum
+            self.__actionCounts = [0, 0]
+            self.__stepCount = 0
+            self.__odometryCount = 0
+            self.__directions = (1 if m1Speed > 0 else -1, 1 if m2Speed > 0 else -1)
+            self.__levels = [False, False]
+            GPIO.output(self.M1STEP, GPIO.LOW)
+            GPIO.output(self.M2STEP, GPIO.LOW)
+            self.__start = time.perf_counter()
+            self.recordPose(self.__start) # Le robot était immobile jusqu'ici (pas d'interpolation depuis le mouvement précédent)
+            self.moving = True
+
+            stopTime, edgeCounts = self.__runProfiles(profiles, 0, positionIncrement, True)
+            if stopTime != None:
+                # Décélère jusqu'à ce que les deux moteurs puissent passer directement à la vitesse du prochain mouvement
+                # ou jusqu'à ce que le moteur le plus rapide soit presque à l'arrêt
+                speeds = [profile.speedAt(stopTime) for profile in profiles]
+                nextSpeeds = (self.m1NextSpeed, self.m2NextSpeed)
+                jumpTime = max(self.__timeToJump(speeds[i], signs[i] * nextSpeeds[i], rates[i]) for i in range(2))
+                stopTimeFastest = max(speeds[fastest] - self.MAX_INSTANT_ACCELERATION / 2, 0) / rates[fastest]
+                canJump = jumpTime <= stopTimeFastest
+                tailTime = jumpTime if canJump else stopTimeFastest
+
+                tails = []
+                for i, profile in enumerate(profiles):
+                    position = profile.positionAt(stopTime)
+                    lastEdge = (0.5 - profile.phase) + 0.5 * (edgeCounts[i] - 1) # Position du dernier front envoyé
+                    endSpeed = max(speeds[i] - rates[i] * tailTime, 0)
+                    distance = min((speeds[i] * speeds[i] - endSpeed * endSpeed) / (2 * rates[i]) if rates[i] > 0 else 0, profile.steps - position)
+                    tails.append(MotionProfile(speeds[i], speeds[i], rates[i], distance, endSpeed, min(max(position - lastEdge, 0), 0.5)))
+                self.__runProfiles(tails, stopTime, positionIncrement, False)
+
+                endSpeeds = [tail.endSpeed for tail in tails]
+                if canJump:
+                    self.canJump1 = self.MAX_INSTANT_ACCELERATION
+                    self.canJump2 = self.MAX_INSTANT_ACCELERATION
+                    self.m1PreviousSpeed = signs[0] * endSpeeds[0]
+                    self.m2PreviousSpeed = signs[1] * endSpeeds[1]
                 else:
-                    wait = min(wait1, wait2)
-
-                time.sleep(wait)
-                fastest.wait(wait)
-                slowest.wait(wait)
-
-                if not self.stopMovement and self.breakCondition():
-                    self.stopMovement = True
-
-                if not fastest.decelerating and (self.stopMovement or (decelerate and fastest.mustDecelerate(self.MAX_INSTANT_ACCELERATION))):
-                    fastest.startDecelerate()
-                    slowest.startDecelerate()
-
-                if self.stopMovement:
-                    if m1.canJumpTo(self.m1NextSpeed, self.MAX_INSTANT_ACCELERATION) and m2.canJumpTo(self.m2NextSpeed, self.MAX_INSTANT_ACCELERATION):
-                        self.canJump1 = self.MAX_INSTANT_ACCELERATION
-                        self.canJump2 = self.MAX_INSTANT_ACCELERATION
-                        self.m1PreviousSpeed = m1.getSpeed()
-                        self.m2PreviousSpeed = m2.getSpeed()
-                        break
-                    if fastest.canJumpTo(0, self.MAX_INSTANT_ACCELERATION / 2):
-                        if m1.getSpeed() * self.m1NextSpeed > 0:
-                            self.canJump1 = self.MAX_INSTANT_ACCELERATION + m1.speed
-                        else:
-                            self.canJump1 = self.MAX_INSTANT_ACCELERATION - m1.speed
-                        if m2.getSpeed() * self.m2NextSpeed > 0:
-                            self.canJump2 = self.MAX_INSTANT_ACCELERATION + m2.speed
-                        else:
-                            self.canJump2 = self.MAX_INSTANT_ACCELERATION - m2.speed
-                        self.m1PreviousSpeed = 0
-                        self.m2PreviousSpeed = 0
-                        break
-
-                if self.MotorMove.totalCount >= self.STEPS_PER_ACTION:
-                    self.MotorMove.totalCount = 0
-                    self.__incrementPosition(positionIncrement[0], positionIncrement[1] * (m1.actionCount if positionIncrement[2] == 1 else m2.actionCount))
-                    m1.actionCount = 0
-                    m2.actionCount = 0
-                    self.otherAction()
-
-            self.__incrementPosition(positionIncrement[0], positionIncrement[1] * (m1.actionCount if positionIncrement[2] == 1 else m2.actionCount))
+                    self.canJump1 = self.MAX_INSTANT_ACCELERATION + (endSpeeds[0] if signs[0] * self.m1NextSpeed > 0 else -endSpeeds[0])
+                    self.canJump2 = self.MAX_INSTANT_ACCELERATION + (endSpeeds[1] if signs[1] * self.m2NextSpeed > 0 else -endSpeeds[1])
+                    self.m1PreviousSpeed = 0
+                    self.m2PreviousSpeed = 0
+
+            self.__incrementPosition(positionIncrement[0], positionIncrement[1] * self.__actionCounts[positionIncrement[2] - 1], time.perf_counter())
+            self.moving = False
+            GPIO.output(self.M1STEP, GPIO.LOW)
+            GPIO.output(self.M2STEP, GPIO.LOW)
+            count, total, totalSquares, maxLateness = self.__timing
+            self.stats.count("moves")
+            self.stats.count("edges", count)
+            if count > 0:
+                mean = total / count
+                self.lastMoveTiming = {"edges": count, "meanLateness": mean, "jitter": sqrt(max(totalSquares / count - mean * mean, 0)), "maxLateness": maxLateness}
             self.m1NextSpeed = 0
             self.m2NextSpeed = 0
             if self.stopMovement:
                 self.stopMovement = False
             else:
-                self.m1PreviousSpeed = 0
-                self.m2PreviousSpeed = 0
+                # Les moteurs continuent à la vitesse de fin du profil si le mouvement suivant est enchaîné
+                self.m1PreviousSpeed = self.__directions[0] * profiles[0].endSpeed if nextMove != None else 0
+                self.m2PreviousSpeed = self.__directions[1] * profiles[1].endSpeed if nextMove != None else 0
                 self.canJump1 = self.MAX_INSTANT_ACCELERATION
                 self.canJump2 = self.MAX_INSTANT_ACCELERATION
     
 
-    def __incrementPosition(self, r, da):
+    def blendSpeeds(self, speeds: tuple, nextMove: tuple) -> tuple:
+        """
+        Renvoie les vitesses (pas/s, valeurs absolues) auxquelles terminer un mouvement aux vitesses [speeds] pour enchaîner directement [nextMove] :
+        -Chaque moteur doit pouvoir passer à sa vitesse du mouvement suivant en un saut d'au plus self.MAX_INSTANT_ACCELERATION
+        -Les deux vitesses gardent le même rapport qu'avant la décélération (la trajectoire n'est pas déformée)
+        """
+        scale = 1
+        for speed, nextSpeed in zip(speeds, nextMove[2:4]):
+            if speed == 0:
+                continue
+            if speed * nextSpeed > 0:
+                allowed = abs(nextSpeed) + self.MAX_INSTANT_ACCELERATION
+            else:
+                allowed = max(self.MAX_INSTANT_ACCELERATION - abs(nextSpeed), 0) # Changement de sens : presque à l'arrêt
+            scale = min(scale, allowed / abs(speed))
+        return tuple(abs(speed) * scale for speed in speeds)
+
+
+    def __waitStop(self, timeout: float) -> bool:
+        """
+        Attend que stop() soit appelée (au plus [timeout] secondes, indéfiniment si None)
+        Renvoie True si stop() a été appelée
+        """
+        end = None if timeout == None else time.perf_counter() + timeout
+        while not self.stopMovement:
+            remaining = None if end == None else end - time.perf_counter()
+            if remaining != None and remaining <= 0:
+                return False
+            self.stopEvent.wait(remaining)
+            self.stopEvent.clear()
+        return True
+
+
+    def __timeToJump(self, speed, nextSpeed, rate):
+        """
+        Renvoie le temps de décélération nécessaire (à [rate] pas/s²) pour qu'un moteur tournant à [speed] (pas/s, positive)
+        puisse passer directement à [nextSpeed] (dans le sens de rotation actuel du moteur), inf si c'est impossible en décélérant
+        """
+        if abs(speed - nextSpeed) <= self.MAX_INSTANT_ACCELERATION:
+            return 0
+        if speed < nextSpeed - self.MAX_INSTANT_ACCELERATION or nextSpeed + self.MAX_INSTANT_ACCELERATION < 0 or rate == 0:
+            return float("inf")
+        return (speed - nextSpeed - self.MAX_INSTANT_ACCELERATION) / rate
+
+
+    def __runProfiles(self, profiles, offset, positionIncrement, canStop):
+        """
+        Envoie aux pins STEP les fronts des profils de vitesse [profiles] (un par moteur) qui commencent au temps [offset] du mouvement :
+        -Les fronts sont calculés par blocs de self.CHUNK_DURATION secondes et envoyés à l'heure prévue (time.perf_counter())
+        -Si un front est envoyé avec plus de self.MAX_LATENESS de retard (ex: après otherAction), la suite est décalée d'autant
+        -Met à jour la position à chaque [self.ODOMETRY_STEPS] pas et appelle [otherAction] à chaque [self.STEPS_PER_ACTION] pas
+        -Si [canStop], s'arrête dès que self.stopMovement == True (ou breakCondition() == True)
+        Renvoie le temps (depuis le début du mouvement) du dernier front envoyé si le mouvement a été arrêté (None sinon)
+        et le nombre de fronts envoyés pour chaque moteur
+        """
+        pins = (self.M1STEP, self.M2STEP)
+        directions = self.__directions
+        stepCounts = self.stepCounts
+        edgeCounts = [0, 0]
+        chunkStart = 0
+        timing = self.__timing
+        latenesses = self.stats.histogram("edgeLateness") # None si les statistiques sont désactivées
+        actionDurations = self.stats.histogram("otherAction")
+        while any(profile.cursor < profile.totalEdges for profile in profiles):
+            chunkEnd = chunkStart + self.CHUNK_DURATION
+            times, motors = [], []
+            for i, profile in enumerate(profiles):
+                edgeTimes, _ = profile.nextEdges(chunkEnd)
+                times.append(edgeTimes)
+                motors.append(np.full(len(edgeTimes), i, dtype=np.int8))
+            times, motors = np.concatenate(times), np.concatenate(motors)
+            order = np.argsort(times, kind="stable")
+            chunkStart = chunkEnd
+
+            for t, motor in zip((times[order] + offset).tolist(), motors[order].tolist()):
+                target = self.__start + t
+                delay = target - time.perf_counter()
+                if delay > self.SPIN_TIME:
+                    time.sleep(delay - self.SPIN_TIME)
+                while time.perf_counter() < target:
+                    time.sleep(0) # Laisse les autres threads (Sampler, serveur, grille) prendre le GIL pendant l'attente
+                level = not self.__levels[motor]
+                GPIO.output(pins[motor], GPIO.HIGH if level else GPIO.LOW)
+                lateness = time.perf_counter() - target
+                self.__levels[motor] = level
+                edgeCounts[motor] += 1
+
+                timing[0] += 1
+                timing[1] += lateness
+                timing[2] += lateness * lateness
+                if lateness > timing[3]:
+                    timing[3] = lateness
+                if lateness > self.MAX_LATENESS:
+                    self.__start += lateness
+                if latenesses != None:
+                    latenesses.add(lateness)
+
+                if level:
+                    self.__actionCounts[motor] += 1
+                    stepCounts[motor] += directions[motor]
+                    self.__odometryCount += 1
+                    if self.__odometryCount >= self.ODOMETRY_STEPS:
+                        self.__odometryCount = 0
+                        self.__incrementPosition(positionIncrement[0], positionIncrement[1] * self.__actionCounts[positionIncrement[2] - 1], target + lateness)
+                        self.__actionCounts = [0, 0]
+                    self.__stepCount += 1
+                    if self.__stepCount >= self.STEPS_PER_ACTION:
+                        self.__stepCount = 0
+                        if self.otherAction != None:
+                            if actionDurations != None:
+                                actionStart = time.perf_counter()
+                                self.otherAction()
+                                actionDurations.add(time.perf_counter() - actionStart)
+                            else:
+                                self.otherAction()
+
+                if canStop:
+                    if not self.stopMovement and self.breakCondition():
+                        self.stopMovement = True
+                    if self.stopMovement:
+                        return t, edgeCounts
+        return None, edgeCounts
+
+
+    def __incrementPosition(self, r, da, t: float):
         if r == None:
             self.position[0] -= da * sin(self.orientation)
             self.position[1] += da * cos(self.orientation)
@@ -273,6 +372,51 @@ class Robot:
             self.orientation += da
             if self.orientation > 2 * pi:
                 self.orientation -= 2 * pi
+        self.recordPose(t)
+
+
+    def recordPose(self, t: float = None):
+        """
+        Ajoute la position et l'orientation actuelles du robot à self.odometry, à l'heure [t] (time.perf_counter() si None)
+        """
+        self.odometry.append(time.perf_counter() if t == None else t, self.position[0], self.position[1], self.orientation, self.stepCounts[0], self.stepCounts[1])
+
+
+    def getSensorPositionAt(self, times):
+        """
+        Renvoie les positions du détecteur de métaux (tableaux numpy x, y) aux instants [times] (tableau numpy de time.perf_counter())
+        Interpole entre les positions enregistrées dans self.odometry (voir OdometryLog.poseAt())
+        """
+        return self.odometry.sensorPositionAt(times)
+
+
+    def getSensorPoseAt(self, times):
+        """
+        Comme getSensorPositionAt(), mais renvoie aussi l'orientation du robot (tableaux numpy x, y, orientation)
+        """
+        return self.odometry.sensorPoseAt(times)
+
+
+    def setSensorPose(self, x: float, y: float, orientation: float):
+        """
+        Place le robot pour que le détecteur de métaux soit en ([x], [y]) avec l'orientation [orientation] (radians)
+        (ex: pour reprendre un scan là où le robot s'était arrêté, voir SampleLog.lastPose())
+        """
+        self.position = [
+            x - self.SENSOR_POSITION[0] * cos(orientation) + self.SENSOR_POSITION[1] * sin(orientation),
+            y - self.SENSOR_POSITION[0] * sin(orientation) - self.SENSOR_POSITION[1] * cos(orientation)
+        ]
+        self.orientation = orientation
+        self.odometry.clear()
+        self.recordPose()
+
+
+    def poseKnownUntil(self) -> float:
+        """
+        Renvoie l'instant jusqu'auquel la position du robot est connue :
+        celui de la dernière position enregistrée pendant un mouvement, maintenant sinon (le robot est immobile)
+        """
+        return self.odometry.lastTime() if self.moving else time.perf_counter()
 
 
     def nothing(self):
@@ -379,6 +523,7 @@ class Robot:
         self.m1NextSpeed = nextMove[2]
         self.m2NextSpeed = nextMove[3]
         self.stopMovement = True
+        self.stopEvent.set()
 
 
     def reset(self):
@@ -387,6 +532,8 @@ class Robot:
         """
         self.position = [0, 0]
         self.orientation = 0
+        self.odometry.clear()
+        self.recordPose()
         self.stopMovement = False
         self.stopped = True
         GPIO.output(self.M1ENABLE, GPIO.HIGH)
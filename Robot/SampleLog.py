@@ -0,0 +1,170 @@
+import os
+import mmap
+import struct
+import time
+from threading import Lock
+import numpy as np
+
+
+class SampleLog:
+    """Journal sur disque de toutes les mesures du détecteur de métaux : enregistrements binaires de taille fixe
+    ajoutés à la fin d'un fichier projeté en mémoire (mmap), pour que la carte survive à un arrêt du programme
+    (voir MetalMap.load() et la commande "resume" de Main)"""
+
+    PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "samples.log")
+    MAGIC = b"RSLG"
+    VERSION = 1
+    # En-tête : magic, version, taille d'un enregistrement, nombre d'enregistrements, sizeX, sizeY, precision et speed du scan (NaN si ce n'est pas un scan), ligne du scan en cours
+    HEADER = struct.Struct("<4sHHQ4dq8x")
+    # Enregistrement : heure (time.time()), position et orientation du détecteur, valeur lue sur le convertisseur (filtrée) et mesure
+    RECORD = np.dtype([("time", "<f8"), ("x", "<f8"), ("y", "<f8"), ("orientation", "<f8"), ("raw", "<f4"), ("value", "<f4")])
+    INITIAL_CAPACITY = 65536 # Nombre d'enregistrements que peut contenir le fichier avant d'être agrandi
+    FLUSH_PERIOD = 1 # Temps maximum (s) entre deux écritures sur le disque des enregistrements ajoutés
+
+    def __init__(self, path: str = PATH):
+        """
+        Ouvre le journal [path] (ses enregistrements sont gardés) ou le crée s'il n'existe pas ou n'est pas valide
+        """
+        self.path = path
+        self.scan = None # Paramètres (sizeX, sizeY, precision, speed) du scan enregistré (None si ce n'est pas un scan)
+        self.lane = 0 # Ligne du scan en cours (voir ScanPlanner.lanes)
+        self.count = 0 # Nombre d'enregistrements
+        self.lastFlush = time.monotonic()
+        self.__lock = Lock()
+        self.__file = open(path, "r+b" if os.path.exists(path) else "w+b")
+        if not self.__readHeader():
+            self.__file.truncate(self.HEADER.size + self.INITIAL_CAPACITY * self.RECORD.itemsize)
+        self.__map()
+        self.__writeHeader()
+
+
+    def __readHeader(self) -> bool:
+        """
+        Lit l'en-tête du fichier, renvoie False s'il n'est pas valide
+        """
+        self.__file.seek(0)
+        data = self.__file.read(self.HEADER.size)
+        if len(data) < self.HEADER.size:
+            return False
+        magic, version, recordSize, count, sizeX, sizeY, precision, speed, lane = self.HEADER.unpack(data)
+        capacity = (os.path.getsize(self.path) - self.HEADER.size) // self.RECORD.itemsize
+        if magic != self.MAGIC or version != self.VERSION or recordSize != self.RECORD.itemsize or count > capacity:
+            return False
+        self.count = count
+        self.scan = None if np.isnan(sizeX) else (sizeX, sizeY, precision, speed)
+        self.lane = lane
+        return True
+
+
+    def __writeHeader(self):
+        scan = self.scan if self.scan != None else (float("nan"),) * 4
+        self.HEADER.pack_into(self.__mmap, 0, self.MAGIC, self.VERSION, self.RECORD.itemsize, self.count, *scan, self.lane)
+
+
+    def __map(self):
+        """
+        Projette le fichier en mémoire : self.__records est une vue (sans copie) sur ses enregistrements
+        """
+        self.__mmap = mmap.mmap(self.__file.fileno(), 0)
+        capacity = (len(self.__mmap) - self.HEADER.size) // self.RECORD.itemsize
+        self.__records = np.frombuffer(self.__mmap, dtype=self.RECORD, count=capacity, offset=self.HEADER.size)
+
+
+    def __grow(self, needed: int):
+        """
+        Double la taille du fichier jusqu'à pouvoir contenir [needed] enregistrements
+        """
+        capacity = len(self.__records)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        self.__mmap.flush()
+        self.__records = None # La vue doit être libérée avant de fermer le mmap
+        self.__mmap.close()
+        self.__file.truncate(self.HEADER.size + capacity * self.RECORD.itemsize)
+        self.__map()
+
+
+    def append(self, times, x, y, orientation, raw, value):
+        """
+        Ajoute les mesures données (tableaux de même longueur) à la fin du journal
+        Les enregistrements sont écrits sur le disque au plus tard self.FLUSH_PERIOD secondes après (et par flush())
+        """
+        n = len(times)
+        with self.__lock:
+            self.__grow(self.count + n)
+            records = self.__records[self.count:self.count + n]
+            records["time"] = times
+            records["x"] = x
+            records["y"] = y
+            records["orientation"] = orientation
+            records["raw"] = raw
+            records["value"] = value
+            self.count += n
+            self.__writeHeader() # Après les enregistrements : un arrêt du programme ne laisse jamais d'enregistrement incomplet
+            if time.monotonic() - self.lastFlush > self.FLUSH_PERIOD:
+                self.__flush()
+
+
+    def setLane(self, lane: int):
+        """
+        Enregistre la ligne du scan en cours
+        """
+        with self.__lock:
+            if lane != self.lane:
+                self.lane = lane
+                self.__writeHeader()
+
+
+    def reset(self, scan: tuple = None):
+        """
+        Supprime tous les enregistrements pour commencer une nouvelle carte
+        [scan] : paramètres (sizeX, sizeY, precision, speed) du scan qui commence (None si ce n'est pas un scan)
+        """
+        with self.__lock:
+            self.count = 0
+            self.scan = tuple(scan) if scan != None else None
+            self.lane = 0
+            self.__writeHeader()
+            self.__flush()
+
+
+    def load(self) -> np.ndarray:
+        """
+        Renvoie une copie de tous les enregistrements (tableau numpy structuré, voir self.RECORD)
+        """
+        with self.__lock:
+            return self.__records[:self.count].copy()
+
+
+    def lastPose(self) -> tuple:
+        """
+        Renvoie la dernière position (x, y, orientation) enregistrée du détecteur de métaux (None si le journal est vide)
+        """
+        with self.__lock:
+            if self.count == 0:
+                return None
+            record = self.__records[self.count - 1]
+            return float(record["x"]), float(record["y"]), float(record["orientation"])
+
+
+    def flush(self):
+        """
+        Écrit sur le disque les enregistrements ajoutés
+        """
+        with self.__lock:
+            self.__flush()
+
+
+    def __flush(self):
+        self.__mmap.flush()
+        self.lastFlush = time.monotonic()
+
+
+    def close(self):
+        with self.__lock:
+            self.__flush()
+            self.__records = None
+            self.__mmap.close()
+            self.__file.close()
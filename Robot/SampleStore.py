@@ -0,0 +1,80 @@
+import numpy as np
+
+
+class SampleStore:
+    """Stocke les mesures du détecteur de métaux en colonnes (x, y, valeur, temps) dans des tableaux numpy agrandis au besoin"""
+
+    INITIAL_CAPACITY = 4096 # Nombre de mesures pouvant être stockées avant le premier agrandissement des tableaux
+    COLUMNS = ("x", "y", "value", "timestamp")
+
+    def __init__(self):
+        self.clear()
+
+
+    def __len__(self):
+        return self.size
+
+
+    def __grow(self, needed):
+        """
+        Double la capacité des colonnes jusqu'à pouvoir stocker [needed] mesures
+        """
+        capacity = len(self.__columns["x"])
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+        for name in self.COLUMNS:
+            column = np.empty(capacity, dtype=np.float64)
+            column[:self.size] = self.__columns[name][:self.size]
+            self.__columns[name] = column
+
+
+    def append(self, x: float, y: float, value: float, timestamp: float):
+        """
+        Ajoute une mesure
+        """
+        if self.size == len(self.__columns["x"]):
+            self.__grow(self.size + 1)
+        i = self.size
+        self.__columns["x"][i] = x
+        self.__columns["y"][i] = y
+        self.__columns["value"][i] = value
+        self.__columns["timestamp"][i] = timestamp
+        self.size += 1
+
+
+    def extend(self, x, y, value, timestamp):
+        """
+        Ajoute plusieurs mesures d'un coup (tableaux de même longueur)
+        """
+        n = len(x)
+        self.__grow(self.size + n)
+        for name, column in zip(self.COLUMNS, (x, y, value, timestamp)):
+            self.__columns[name][self.size:self.size + n] = column
+        self.size += n
+
+
+    @property
+    def x(self):
+        return self.__columns["x"][:self.size]
+
+    @property
+    def y(self):
+        return self.__columns["y"][:self.size]
+
+    @property
+    def value(self):
+        return self.__columns["value"][:self.size]
+
+    @property
+    def timestamp(self):
+        return self.__columns["timestamp"][:self.size]
+
+
+    def clear(self):
+        """
+        Supprime toutes les mesures
+        """
+        self.__columns = {name: np.empty(self.INITIAL_CAPACITY, dtype=np.float64) for name in self.COLUMNS}
+        self.size = 0
@@ -0,0 +1,156 @@
+import time
+from threading import Thread, Event, get_ident
+import traceback
+import numpy as np
+
+
+class Sampler:
+    """Lit le détecteur de métaux à fréquence fixe dans un thread (indépendamment du mouvement des moteurs)
+    et garde les dernières mesures, avec leur heure, dans un anneau de tableaux préalloués
+    Chaque mesure combine une rafale de lectures du convertisseur (moyenne, médiane ou filtre IIR) pour réduire le bruit"""
+
+    RATE = 100 # Nombre de mesures par seconde
+    CAPACITY = 8192 # Nombre de mesures gardées dans l'anneau (les plus anciennes sont écrasées)
+    OVERSAMPLING = 8 # Nombre de lectures du convertisseur combinées en une mesure
+    FILTERS = ("mean", "median", "iir")
+    IIR_ALPHA = 0.25 # Poids de chaque nouvelle lecture dans le filtre "iir" (moyenne exponentielle, continue d'une rafale à l'autre)
+    BASELINE = 855 # Valeur lue loin de tout métal, utilisée tant que calibrate() n'a pas été appelée
+    CALIBRATION_BURSTS = 50 # Nombre de mesures utilisées par calibrate()
+
+    def __init__(self, mcp3008, rate: float = RATE, capacity: int = CAPACITY, oversampling: int = OVERSAMPLING, filter: str = "mean"):
+        if filter not in self.FILTERS:
+            raise ValueError("Unknown filter: " + filter)
+        self.mcp3008 = mcp3008 # Objet pour lire les valeurs du détecteur de métaux (voir Hardware.MCP3008())
+        self.rate = rate
+        self.oversampling = oversampling
+        self.filter = filter
+        self.times = np.zeros(capacity) # Heure (time.perf_counter()) de chaque mesure
+        self.values = np.zeros(capacity) # Valeur filtrée lue sur le convertisseur (entre 0 et 1023)
+        self.written = 0 # Nombre total de mesures écrites (la mesure n est à l'indice n % capacity)
+        self.reads = 0 # Nombre total de lectures du convertisseur
+        self.baseline = self.BASELINE # Valeur lue loin de tout métal
+        self.scale = self.BASELINE # Baisse de la valeur lue qui correspond à une mesure de 1 (valeur 0 sur le convertisseur)
+        self.noise = None # Écart-type du bruit d'une mesure filtrée (en valeur du convertisseur), mesuré par calibrate()
+        self.calibrated = False
+        self.threadId = None # Identifiant du thread de mesure (pour mesurer son temps CPU)
+        self.running = False
+        self.__burst = np.zeros(oversampling) # Lectures de la rafale en cours (réutilisé)
+        # Filtre "iir" sur une rafale : y = decay * y_précédent + weights . lectures
+        self.__iirWeights = self.IIR_ALPHA * (1 - self.IIR_ALPHA) ** np.arange(oversampling - 1, -1, -1)
+        self.__iirDecay = (1 - self.IIR_ALPHA) ** oversampling
+        self.__iirState = None
+        self.__stopEvent = Event()
+        self.__thread = None
+
+
+    def start(self):
+        """
+        Démarre les mesures dans un thread
+        """
+        self.running = True
+        self.__stopEvent.clear()
+        self.__thread = Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+
+    def stop(self):
+        """
+        Arrête les mesures
+        """
+        self.running = False
+        self.__stopEvent.set()
+        if self.__thread != None:
+            self.__thread.join(1)
+
+
+    def calibrate(self, bursts: int = CALIBRATION_BURSTS):
+        """
+        Mesure la valeur lue loin de tout métal (médiane de [bursts] mesures) et le bruit d'une mesure
+        A appeler avant start(), quand le détecteur n'est au-dessus d'aucun métal
+        """
+        if self.running:
+            raise RuntimeError("Cannot calibrate while sampling")
+        self.__iirState = None
+        values = np.array([self.__measure() for i in range(bursts)])
+        self.baseline = float(np.median(values))
+        self.scale = self.baseline
+        self.noise = float(np.std(values))
+        self.calibrated = True
+        self.__iirState = None
+
+
+    def normalize(self, values: np.ndarray) -> np.ndarray:
+        """
+        Convertit des valeurs lues en mesures : 0 loin de tout métal, 1 quand le convertisseur lit 0
+        """
+        return (self.baseline - values) / self.scale
+
+
+    def __measure(self) -> float:
+        """
+        Lit une rafale de self.oversampling valeurs sur le convertisseur et renvoie la valeur filtrée
+        """
+        burst = self.__burst
+        readBurst = getattr(self.mcp3008, "read_burst", None)
+        if readBurst != None:
+            readBurst(0, burst)
+        else:
+            read = self.mcp3008.read_adc
+            for i in range(len(burst)):
+                burst[i] = read(0)
+        self.reads += len(burst)
+        if self.filter == "mean":
+            return burst.mean()
+        if self.filter == "median":
+            return np.median(burst)
+        if self.__iirState == None:
+            self.__iirState = burst[0]
+        self.__iirState = self.__iirDecay * self.__iirState + self.__iirWeights.dot(burst)
+        return self.__iirState
+
+
+    def __run(self):
+        """
+        Fonction appellée par start() dans un thread : fait une mesure toutes les 1 / self.rate secondes
+        Si une mesure a plus d'une période de retard, les suivantes sont décalées (au lieu d'être faites d'affilée)
+        """
+        self.threadId = get_ident()
+        try:
+            period = 1 / self.rate
+            capacity = len(self.times)
+            nextTime = time.perf_counter()
+            while self.running:
+                value = self.__measure()
+                now = time.perf_counter()
+                i = self.written % capacity
+                self.times[i] = now
+                self.values[i] = value
+                self.written += 1 # Après l'écriture : read() ne renvoie jamais une mesure incomplète
+                nextTime += period
+                if nextTime < now - period:
+                    nextTime = now
+                if self.__stopEvent.wait(max(nextTime - time.perf_counter(), 0)):
+                    break
+        except:
+            print(traceback.format_exc())
+            self.running = False
+
+
+    def read(self, since: int, until: float = None):
+        """
+        Renvoie les mesures écrites depuis la mesure numéro [since] (et prises au plus tard à l'heure [until] si donnée) :
+        -Leurs heures et leurs valeurs (copies des tableaux)
+        -Le numéro de la prochaine mesure (à donner au prochain appel)
+        -Le nombre de mesures perdues (écrasées avant d'avoir été lues)
+        """
+        end = self.written
+        capacity = len(self.times)
+        lost = max(end - since - capacity, 0)
+        start = since + lost
+        indices = np.arange(start, end) % capacity
+        times = self.times[indices]
+        if until != None:
+            count = np.searchsorted(times, until, side="right")
+            times, indices, end = times[:count], indices[:count], start + count
+        return times, self.values[indices], end, lost
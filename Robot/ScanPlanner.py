@@ -0,0 +1,118 @@
+from math import pi, ceil, degrees, radians
+from MotionProfile import MotionProfile
+
+
+class ScanPlanner:
+    """Prépare le parcours du mode scan : des allers-retours en ligne droite reliés par des demi-tours (sur place ou en arc de cercle),
+    à enchaîner sans s'arrêter entre les segments (voir Robot.move(nextMove=...))"""
+
+    def __init__(self, robot, sizeX: float, sizeY: float, precision: float, speed: float):
+        """
+        -[robot] : objet Robot (pour ses dimensions et ses fonctions de mouvement)
+        -[sizeX] x [sizeY] : taille (cm) de la zone à scanner (la position actuelle du robot est le coin inférieur gauche)
+        -[precision] : distance (cm) entre deux lignes parcourues
+        -[speed] : vitesse des roues (tours/s)
+        """
+        self.robot = robot
+        self.sizeX = sizeX
+        self.sizeY = sizeY
+        self.precision = precision
+        self.speed = speed
+        self.lanes = [] # Ligne du scan (0 : la première) de chaque segment du dernier parcours renvoyé par moves() ou resumeMoves()
+
+
+    def moves(self, firstLane: int = 0, firstDistance: float = None) -> list:
+        """
+        Renvoie la liste des arguments à donner à Robot.move() pour chaque segment du parcours :
+        une ligne droite de [sizeY] cm, un demi-tour vers la droite, une ligne droite dans l'autre sens,
+        un demi-tour vers la gauche... jusqu'à avoir couvert [sizeX] cm (comme Main.scan() avant)
+        Pour chaque demi-tour, garde celui des __halfTurns() dont la durée estimée est la plus courte
+        Commence à la ligne [firstLane], dont seuls les [firstDistance] derniers cm sont parcourus si [firstDistance] est donné
+        """
+        rows = max(int(ceil(self.sizeX / self.precision)), 1)
+        linearSpeed = self.speed * self.robot.WHEEL_DIAMETER * pi
+        row = self.robot.forward(linearSpeed, self.sizeY)
+        moves = []
+        self.lanes = []
+        for i in range(firstLane, rows):
+            distance = firstDistance if i == firstLane and firstDistance != None else self.sizeY
+            if distance > 0.5:
+                moves.append(self.robot.forward(linearSpeed, distance, i + 1 == rows))
+                self.lanes.append(i)
+            if i + 1 < rows:
+                # Demi-tour le plus rapide (durée estimée entre deux lignes, avec les transitions)
+                turn = min(self.__halfTurns(linearSpeed, i % 2 == 0), key=lambda turn: self.duration([row] + turn + [row]))
+                moves += turn
+                self.lanes += [i] * len(turn)
+        return moves
+
+
+    def resumeMoves(self, lane: int, position: tuple, orientation: float) -> list:
+        """
+        Renvoie le parcours (comme moves()) pour reprendre un scan interrompu à la ligne [lane],
+        le robot étant à la position [position] avec l'orientation [orientation] (radians, 0 : vers les y positifs) :
+        -Tourne sur place pour se remettre dans la direction de la ligne (si le robot s'est arrêté pendant un demi-tour)
+        -Finit la ligne (l'écart latéral éventuel avec la ligne n'est pas corrigé), puis continue le parcours normalement
+        """
+        heading = 0 if lane % 2 == 0 else pi
+        turn = (heading - orientation + pi) % (2 * pi) - pi
+        moves = []
+        if abs(turn) > radians(2):
+            turnSpeed = self.speed * self.robot.WHEEL_DIAMETER * pi * 180 / (pi * self.robot.DISTANCE_BETWEEN_WHEELS / 2)
+            moves.append(self.robot.turnLeft(turnSpeed, degrees(turn)) if turn > 0 else self.robot.turnRight(turnSpeed, degrees(-turn)))
+        remaining = self.sizeY - position[1] if lane % 2 == 0 else position[1]
+        moves += self.moves(lane, max(remaining, 0))
+        self.lanes = [lane] * (len(moves) - len(self.lanes)) + self.lanes
+        return moves
+
+
+    def __halfTurns(self, linearSpeed: float, right: bool) -> list:
+        """
+        Renvoie les demi-tours possibles vers la droite (ou la gauche) qui décalent le robot de self.precision,
+        la roue extérieure tournant à [linearSpeed] (cm/s), chacun sous forme de liste d'arguments de Robot.move() :
+        -Comme avant : un quart de tour sur place, self.precision cm en ligne droite et un autre quart de tour sur place
+        (trajet le plus court, mais une roue change de sens entre chaque segment : le robot doit presque s'arrêter)
+        -Un demi-cercle de diamètre self.precision (plus long, mais sans changement de sens si self.precision >= distance entre les roues)
+        """
+        robot = self.robot
+        radius = self.precision / 2
+        half = robot.DISTANCE_BETWEEN_WHEELS / 2
+        turnSpeed = linearSpeed * 180 / (pi * half) * (1 if right else -1)
+        pivots = [robot.turnRight(turnSpeed, 90), robot.forward(linearSpeed, self.precision), robot.turnRight(turnSpeed, 90)]
+        outerSpeed = linearSpeed
+        innerSpeed = linearSpeed * (radius - half) / (radius + half)
+        outerDistance = pi * (radius + half)
+        innerDistance = pi * abs(radius - half)
+        # Le moteur 1 est la roue gauche (roue extérieure d'un virage à droite)
+        if right:
+            arc = robot.turnWhileMoving(outerSpeed, innerSpeed, outerDistance, innerDistance)
+        else:
+            arc = robot.turnWhileMoving(innerSpeed, outerSpeed, innerDistance, outerDistance)
+        return [pivots, [arc]]
+
+
+    def duration(self, moves: list = None) -> float:
+        """
+        Renvoie une estimation de la durée (s) du parcours [moves] (self.moves() si None) enchaîné sans arrêt :
+        somme des durées des profils de vitesse du moteur le plus rapide de chaque segment,
+        avec les mêmes vitesses de début et de fin que Robot.move()
+        """
+        robot = self.robot
+        moves = self.moves() if moves == None else moves
+        total = 0.1 # Mise sous tension des moteurs (voir Robot.move())
+        previous = (0, 0)
+        for i, move in enumerate(moves):
+            steps, speeds, decelerate = move[0:2], move[2:4], move[5]
+            fastest = 0 if abs(speeds[0]) >= abs(speeds[1]) else 1
+            nextMove = moves[i + 1] if i + 1 < len(moves) else None
+            if nextMove != None:
+                endSpeeds = robot.blendSpeeds(speeds, nextMove)
+                endSpeed = endSpeeds[fastest]
+            else:
+                endSpeed = robot.MAX_INSTANT_ACCELERATION if decelerate else None
+            speed, previousSpeed = speeds[fastest], previous[fastest]
+            startSpeed = previousSpeed + max(min(speed - previousSpeed, robot.MAX_INSTANT_ACCELERATION), -robot.MAX_INSTANT_ACCELERATION)
+            profile = MotionProfile(startSpeed if startSpeed * speed > 0 else 0, speed, robot.ACCELERATION_RATE, steps[fastest], endSpeed)
+            total += profile.duration()
+            previous = tuple((1 if s > 0 else -1) * e for s, e in zip(speeds, endSpeeds)) if nextMove != None else (0, 0)
+        return total
@@ -0,0 +1,174 @@
+from collections import deque
+from threading import Thread, Condition
+import traceback
+
+
+class SendScheduler:
+    """File d'attente des messages à envoyer à la télécommande :
+    -Les messages sont envoyés par un seul thread, par ordre de priorité (contrôle et état, puis grille, puis images)
+    -Un nouveau message remplace les messages encore en attente qu'il rend inutiles (ex: une grille complète remplace les grilles et modifications précédentes)
+    -Le nombre de messages en attente est limité pour chaque priorité"""
+
+    # Priorités (la plus petite valeur est envoyée en premier)
+    CONTROL = 0
+    MAP = 1
+    IMAGE = 2
+    PRIORITIES = {"Map": MAP, "Dlt": MAP, "Img": IMAGE} # Priorité de chaque header (CONTROL pour les autres)
+    SUPERSEDES = {"Map": ("Map", "Dlt"), "Img": ("Img",), "Res": ("Res",), "Sta": ("Sta",), "Snp": ("Snp",), "Tgt": ("Tgt",)} # Headers des messages en attente remplacés par un nouveau message
+    MAX_QUEUED = {CONTROL: 64, MAP: 32, IMAGE: 2} # Nombre maximum de messages en attente pour chaque priorité
+    SEND_TIMEOUT = 10 # Temps maximum (s) pendant lequel send() attend qu'une file pleine se libère
+    # Temps maximum (s) pendant lequel l'envoi d'un message attend que le client lise (voir SocketServer.send) : une image en retard est abandonnée
+    # plutôt que de bloquer les messages de contrôle suivants (SocketServer.SEND_TIMEOUT pour les autres priorités)
+    DEADLINES = {IMAGE: 0.1}
+
+    def __init__(self, send: callable):
+        """
+        [send] est la fonction qui envoie vraiment un message (SocketServer.send : header, contenu, callback, timeout)
+        """
+        self.sendFunction = send
+        self.queues = {priority: deque() for priority in self.MAX_QUEUED} # Messages en attente (header, contenu, callback) pour chaque priorité (voir aussi call())
+        # Fonctions appelées quand la file d'une priorité est pleine : ses messages sont alors supprimés au lieu de bloquer send()
+        # (ex: pour la grille, MetalMap.requestFullMap() pour que le prochain envoi soit la grille complète)
+        self.overflowHandlers = {}
+        self.running = False # True pendant que le thread d'envoi tourne
+        self.stopped = False # True après stop() : les nouveaux messages sont refusés
+        self.__thread = None
+        self.__condition = Condition()
+        self.sent = 0 # Messages envoyés
+        self.coalesced = 0 # Messages remplacés par un message plus récent avant d'être envoyés
+        self.overflows = 0 # Nombre de fois qu'une file pleine a été vidée
+
+
+    def start(self):
+        """
+        Démarre le thread d'envoi (les messages ajoutés avant sont gardés)
+        """
+        self.running = True
+        self.stopped = False
+        self.__thread = Thread(target=self.__run)
+        self.__thread.daemon = True
+        self.__thread.start()
+
+
+    def stop(self):
+        """
+        Arrête le thread d'envoi (les messages en attente ne sont pas envoyés)
+        """
+        with self.__condition:
+            self.running = False
+            self.stopped = True
+            self.__condition.notify_all()
+        if self.__thread != None:
+            self.__thread.join(2)
+        with self.__condition:
+            for queue in self.queues.values():
+                self.__release(queue)
+
+
+    def send(self, header: str, content, callback: callable = None) -> bool:
+        """
+        Ajoute un message à envoyer (mêmes arguments que SocketServer.send)
+        -Supprime les messages en attente remplacés par ce message (leur callback est appelée)
+        -Si la file de sa priorité est pleine : la vide si elle a une fonction dans self.overflowHandlers, attend sinon
+        Renvoie False si le message n'a pas pu être ajouté (envoi arrêté ou file toujours pleine après SEND_TIMEOUT)
+        """
+        priority = self.PRIORITIES.get(header, self.CONTROL)
+        with self.__condition:
+            queue = self.queues[priority]
+            superseded = self.SUPERSEDES.get(header)
+            if superseded != None and len(queue) > 0:
+                kept = [message for message in queue if message[0] not in superseded]
+                self.coalesced += len(queue) - len(kept)
+                self.__release(message for message in queue if message[0] in superseded)
+                queue.clear()
+                queue.extend(kept)
+            if len(queue) >= self.MAX_QUEUED[priority]:
+                if priority in self.overflowHandlers:
+                    self.overflows += 1
+                    self.__release(queue)
+                    self.overflowHandlers[priority]()
+                elif not self.__condition.wait_for(lambda: len(queue) < self.MAX_QUEUED[priority] or self.stopped, self.SEND_TIMEOUT):
+                    return False
+            if self.stopped:
+                return False
+            queue.append((header, content, callback))
+            self.__condition.notify_all()
+        return True
+
+
+    def call(self, function: callable, priority: int = MAP) -> bool:
+        """
+        Ajoute [function] à la file [priority] : elle sera appelée dans le thread d'envoi, à son tour (après les messages déjà en attente)
+        Ex: construire un message lourd hors de la boucle asyncio de SocketServer. N'attend jamais, même si la file est pleine
+        (peut donc être appelée depuis la boucle asyncio). Renvoie False si l'envoi est arrêté
+        """
+        with self.__condition:
+            if self.stopped:
+                return False
+            self.queues[priority].append((None, function, None))
+            self.__condition.notify_all()
+        return True
+
+
+    def __release(self, messages):
+        """
+        Appelle la callback des [messages] qui ne seront pas envoyés (leur contenu peut être réutilisé) et vide la file si [messages] en est une
+        """
+        for header, content, callback in list(messages):
+            if callback != None:
+                callback()
+        if isinstance(messages, deque):
+            messages.clear()
+
+
+    def __next(self):
+        """
+        Renvoie la priorité et le premier message de la file la plus prioritaire qui n'est pas vide ((None, None) s'il n'y en a pas)
+        """
+        for priority in sorted(self.queues):
+            if len(self.queues[priority]) > 0:
+                return priority, self.queues[priority].popleft()
+        return None, None
+
+
+    def __run(self):
+        """
+        Fonction appellée par start() dans un thread : envoie les messages les uns après les autres, par ordre de priorité
+        """
+        try:
+            while True:
+                with self.__condition:
+                    priority, message = self.__next()
+                    while message == None and self.running:
+                        self.__condition.wait()
+                        priority, message = self.__next()
+                    if not self.running:
+                        if message != None:
+                            self.__release([message])
+                        break
+                    self.__condition.notify_all() # Une place s'est libérée
+                if message[0] == None:
+                    try:
+                        message[1]() # Fonction ajoutée par call()
+                    except:
+                        print(traceback.format_exc())
+                elif self.sendFunction(*message, timeout=self.DEADLINES.get(priority)):
+                    self.sent += 1
+                elif message[2] != None:
+                    message[2]()
+        except:
+            print(traceback.format_exc())
+        print("End of send")
+
+
+    def stats(self) -> dict:
+        """
+        Renvoie le nombre de messages envoyés, remplacés avant d'être envoyés et de files vidées, et le nombre de messages en attente par priorité
+        """
+        with self.__condition:
+            return {
+                "sent": self.sent,
+                "coalesced": self.coalesced,
+                "overflows": self.overflows,
+                "queued": {priority: len(queue) for priority, queue in self.queues.items()},
+            }
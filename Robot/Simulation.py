@@ -0,0 +1,169 @@
+import time
+import base64
+import threading
+from collections import deque
+from math import exp
+import random
+import numpy as np
+
+
+class SimulatedGPIO:
+    """Remplace RPi.GPIO : garde l'état des pins et enregistre chaque changement d'état (front) avec son heure"""
+
+    BCM = 11
+    BOARD = 10
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+    PUD_UP = 22
+    PUD_DOWN = 21
+    MAX_EDGES = 1000000 # Nombre maximum de fronts gardés (les plus anciens sont oubliés)
+
+    def __init__(self):
+        self.states = {} # État actuel de chaque pin
+        self.edges = deque(maxlen=self.MAX_EDGES) # Fronts (time.perf_counter(), pin, état)
+
+    def setmode(self, mode):
+        pass
+
+    def setwarnings(self, warnings):
+        pass
+
+    def setup(self, pin, mode, pull_up_down=None, initial=None):
+        if mode == self.IN:
+            self.states[pin] = self.LOW if pull_up_down == self.PUD_DOWN else self.HIGH
+        else:
+            self.states[pin] = initial if initial != None else self.LOW
+
+    def output(self, pin, value):
+        value = self.HIGH if value else self.LOW
+        if self.states.get(pin) != value:
+            self.states[pin] = value
+            self.edges.append((time.perf_counter(), pin, value))
+
+    def input(self, pin):
+        return self.states.get(pin, self.HIGH)
+
+    def cleanup(self):
+        self.states = {}
+
+    def press(self, pin, duration: float, delay: float = 0):
+        """
+        Simule un appui de [duration] secondes sur le bouton relié à [pin] (actif à l'état bas), après [delay] secondes
+        """
+        def run():
+            time.sleep(delay)
+            self.states[pin] = self.LOW
+            time.sleep(duration)
+            self.states[pin] = self.HIGH
+        thread = threading.Thread(target=run)
+        thread.daemon = True
+        thread.start()
+
+    def getEdges(self, pin=None):
+        """
+        Renvoie les fronts enregistrés (de [pin] uniquement si donné)
+        """
+        return [edge for edge in self.edges if pin == None or edge[1] == pin]
+
+
+class SimulatedMCP3008:
+    """Remplace Adafruit_MCP3008.MCP3008 : renvoie la valeur que mesurerait le détecteur de métaux
+    dans un champ de métal synthétique, à la position donnée par [getPosition]"""
+
+    BASELINE = 855 # Valeur lue loin de tout métal (voir Sampler.calibrate())
+    NOISE = 4 # Écart-type du bruit ajouté à chaque lecture
+    # Objets métalliques simulés : (x, y, intensité entre 0 et 1, rayon (cm))
+    TARGETS = [(20, 30, 0.8, 4), (-15, 60, 0.5, 6), (40, 80, 1, 3)]
+
+    def __init__(self, getPosition: callable, targets: list = None, seed: int = None):
+        self.getPosition = getPosition # Fonction renvoyant la position (x, y) actuelle du capteur
+        self.targets = targets if targets != None else self.TARGETS
+        self.random = random.Random(seed)
+        self.generator = np.random.default_rng(seed)
+        self.reads = 0
+
+    def field(self, x: float, y: float) -> float:
+        """
+        Renvoie l'intensité du champ de métal en (x, y) (entre 0 et 1)
+        """
+        value = 0
+        for tx, ty, strength, radius in self.targets:
+            value += strength * exp(-((x - tx) ** 2 + (y - ty) ** 2) / (2 * radius * radius))
+        return min(value, 1)
+
+    def read_adc(self, channel: int) -> int:
+        self.reads += 1
+        x, y = self.getPosition()
+        raw = self.BASELINE * (1 - self.field(x, y)) + self.random.gauss(0, self.NOISE)
+        return int(min(max(round(raw), 0), 1023))
+
+    def read_burst(self, channel: int, out: np.ndarray):
+        """
+        Remplit [out] de lectures successives (comme plusieurs read_adc(), mais en une fois : le capteur ne bouge pas pendant la rafale)
+        """
+        self.reads += len(out)
+        x, y = self.getPosition()
+        raw = self.BASELINE * (1 - self.field(x, y)) + self.generator.normal(0, self.NOISE, len(out))
+        np.clip(np.round(raw), 0, 1023, out=out)
+
+
+class SimulatedCamera:
+    """Remplace picamera.PiCamera : produit des images JPEG à [framerate] images par seconde"""
+
+    # Petite image JPEG valide, agrandie jusqu'à FRAME_BYTES octets avec des segments de commentaire (pour simuler la taille d'une vraie image)
+    JPEG = base64.b64decode(
+        "/9j/4AAQSkZJRgABAQAAAQABAAD/2wBDABALDA4MChAODQ4SERATGCgaGBYWGDEjJR0oOjM9PDkzODdASFxOQERXRTc4UG1RV19iZ2hnPk1xeXBkeFxlZ2P/2wBDARESEhgVGC8aGi9j"
+        "QjhCY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2NjY2P/wAARCAAMABADASIAAhEBAxEB/8QAHwAAAQUBAQEBAQEAAAAAAAAAAAECAwQFBgcICQoL/8QAtRAA"
+        "AgEDAwIEAwUFBAQAAAF9AQIDAAQRBRIhMUEGE1FhByJxFDKBkaEII0KxwRVS0fAkM2JyggkKFhcYGRolJicoKSo0NTY3ODk6Q0RFRkdISUpTVFVWV1hZWmNkZWZnaGlqc3R1dnd4eXqDhIWGh4iJ"
+        "ipKTlJWWl5iZmqKjpKWmp6ipqrKztLW2t7i5usLDxMXGx8jJytLT1NXW19jZ2uHi4+Tl5ufo6erx8vP09fb3+Pn6/8QAHwEAAwEBAQEBAQEBAQAAAAAAAAECAwQFBgcICQoL/8QAtREAAgECBAQD"
+        "BAcFBAQAAQJ3AAECAxEEBSExBhJBUQdhcRMiMoEIFEKRobHBCSMzUvAVYnLRChYkNOEl8RcYGRomJygpKjU2Nzg5OkNERUZHSElKU1RVVldYWVpjZGVmZ2hpanN0dXZ3eHl6goOEhYaHiImKkpOU"
+        "lZaXmJmaoqOkpaanqKmqsrO0tba3uLm6wsPExcbHyMnK0tPU1dbX2Nna4uPk5ebn6Onq8vP09fb3+Pn6/9oADAMBAAIRAxEAPwClRRRUGZ//2Q=="
+    )
+    FRAME_BYTES = 60000 # Taille approximative d'une image 800x600 (proportionnelle au nombre de pixels pour les autres résolutions)
+    CHUNK_BYTES = 65536 # Taille des morceaux écrits par capture_continuous() (picamera écrit aussi chaque image en plusieurs fois)
+
+    def __init__(self, framerate: float = 30):
+        self.resolution = (800, 600)
+        self.framerate = framerate
+        self.frames = 0
+        self.nextFrame = time.perf_counter()
+        self.closed = False
+
+    def __frame(self) -> bytes:
+        """
+        Attend l'image suivante (selon self.framerate) et la renvoie
+        """
+        now = time.perf_counter()
+        if self.nextFrame > now:
+            time.sleep(self.nextFrame - now)
+        self.nextFrame = max(self.nextFrame, now) + 1 / self.framerate
+        self.frames += 1
+        padding = bytearray()
+        remaining = self.FRAME_BYTES * self.resolution[0] * self.resolution[1] // (800 * 600) - len(self.JPEG)
+        while remaining > 4:
+            length = min(remaining - 2, 65535)
+            comment = ("frame {} {}x{} ".format(self.frames, *self.resolution).encode() * (length // 16 + 1))[:length - 2]
+            padding += b"\xff\xfe" + length.to_bytes(2, "big") + comment
+            remaining -= length + 2
+        return self.JPEG[:2] + bytes(padding) + self.JPEG[2:]
+
+    def capture(self, output, format: str = "jpeg", use_video_port: bool = False):
+        output.write(self.__frame())
+
+    def capture_continuous(self, output, format: str = "jpeg", use_video_port: bool = False):
+        """
+        Écrit les images les unes après les autres dans [output] et renvoie [output] après chaque image (comme picamera)
+        """
+        while not self.closed:
+            frame = memoryview(self.__frame())
+            for start in range(0, len(frame), self.CHUNK_BYTES):
+                output.write(frame[start:start + self.CHUNK_BYTES])
+            yield output
+
+    def stop_preview(self):
+        pass
+
+    def close(self):
+        self.closed = True
@@ -1,108 +1,300 @@
 # Modules pour la communication avec la télécommande
+import os
 import socket
-from threading import Thread
+import asyncio
+import struct
+from collections import deque
+from itertools import islice
+from threading import Thread, Event, Lock, get_ident
 import traceback
+import time
+from Stats import Stats
+from FrameReader import FrameReader
 
 class SocketServer:
-	"""Gère la communication en réseau local avec un client (= la télécommande)"""
+	"""Gère la communication en réseau local avec les clients :
+	-Le premier client connecté (= la télécommande) contrôle le robot : ses messages sont reçus et send() attend qu'il lise
+	-Si la télécommande se déconnecte (ex: coupure du Wi-Fi), le serveur annonce de nouveau son adresse (broadcast) et le prochain client
+	qui se connecte dans les RECONNECT_TIMEOUT secondes reprend la session en cours (la session n'est arrêtée qu'ensuite, voir errorCallback)
+	-Les suivants (jusqu'à MAX_CLIENTS) ne font que regarder : ils reçoivent les mêmes messages (encodés une seule fois), mais leurs messages sont ignorés
+	et ceux qu'ils n'ont pas le temps de lire sont abandonnés pour eux seuls (sans ralentir la télécommande ni le robot)
+	Le serveur tourne dans une boucle asyncio, dans son propre thread"""
 
 	PORT = 51399  # Port utilisé pour la communication
+	# Début de chaque message : type ("s" : chaine de caractères, "b" : bytes), header (3 caractères), taille du contenu (int32 little-endian)
+	FRAME = struct.Struct("<c3si")
+	BUFFER_SIZE = 65536 # Taille initiale du buffer de réception (agrandi si un message ne tient pas dedans)
+	MAX_MESSAGE_SIZE = 1 << 24 # Taille maximale d'un message reçu (au-delà, la connexion est considérée comme corrompue)
+	WRITE_BUFFER_LIMIT = 1 << 18 # Octets en attente d'envoi au-delà desquels send() attend que le client ait lu
+	SEND_TIMEOUT = 10 # Temps maximum (s) pendant lequel send() attend que le client lise
+	RECONNECT_TIMEOUT = 10 # Temps (s) pendant lequel la télécommande peut se reconnecter après une déconnexion
+	BROADCAST_PERIOD = 1 # Temps (s) entre deux annonces de l'adresse du serveur en attendant la reconnexion
+	MAX_CLIENTS = 4 # Nombre maximum de clients connectés en même temps (la télécommande et les spectateurs)
+	MAX_CHUNKS = 512 # Nombre maximum de morceaux (début ou contenu d'un message) écrits par un appel à sendmsg()
+
+
+	class Protocol(asyncio.BufferedProtocol):
+		"""Connexion avec un client :
+		-Reçoit ses octets directement dans le buffer d'un FrameReader (recv_into) et en extrait les messages au fur et à mesure
+		-Garde les morceaux des messages à lui envoyer (voir SocketServer.send())"""
+
+		def __init__(self, server):
+			self.server = server
+			self.transport = None
+			self.reader = FrameReader(server.FRAME, server.BUFFER_SIZE, server.MAX_MESSAGE_SIZE)
+			self.viewer = False # True si le client ne fait que regarder (ce n'est pas la télécommande)
+			self.socket = None # Copie (dup) du socket du client, écrite directement par SocketServer.__write() avec sendmsg()
+			self.pending = deque() # Morceaux (bytes ou memoryview, callback) à écrire : début puis contenu de chaque message, sans copie
+			self.pendingBytes = 0
+			self.writeScheduled = False
+			self.waitingWritable = False # True si SocketServer.__write() attend que le socket soit de nouveau prêt (loop.add_writer)
+			self.writable = Event() # Mis à zéro quand plus de WRITE_BUFFER_LIMIT octets sont en attente d'envoi
+			self.writable.set()
+			self.resync = set() # Fonctions de SocketServer.resyncHandlers à appeler pour ce spectateur quand il aura lu (messages abandonnés pour lui)
+
+		def connection_made(self, transport):
+			self.server._connected(self, transport)
+
+		def get_buffer(self, sizehint):
+			"""
+			Renvoie la partie libre du buffer, dans laquelle asyncio écrit directement les octets reçus (recv_into, autant que possible d'un coup)
+			"""
+			return self.reader.getBuffer()
+
+		def buffer_updated(self, nbytes):
+			"""
+			Appelée quand [nbytes] octets ont été écrits dans le buffer :
+			traite tous les messages complets, sans copier le buffer
+			"""
+			self.reader.received(nbytes)
+			self.server._frames(self)
+
+		def eof_received(self):
+			return False
+
+		def connection_lost(self, exc):
+			self.server._disconnected(self, exc)
 
 
 	def __init__(self, errorCallback):
 		self.errorCallback = errorCallback
+		self.loop = None
+		self.server = None
+		self.protocol = None # Connexion avec la télécommande
+		self.clients = [] # Connexions avec tous les clients (la télécommande puis les spectateurs), remplacée à chaque changement
+		self.receiving = False
+		self.reconnecting = False # True si la télécommande s'est déconnectée et peut encore se reconnecter
+		self.lost = False # True si la télécommande ne s'est pas reconnectée à temps (la session va s'arrêter)
+		self.viewerCallback = None
+		self.disconnectCallback = None
+		self.reconnectCallback = None
+		self.__broadcastMessage = None # Dernier message de broadcast, renvoyé en attendant la reconnexion
+		self.__reconnectTimer = None
+		# Pour chaque header : fonction qui demande un message remplaçant ceux de ce header abandonnés pour un spectateur trop lent
+		# (ex: pour "Map" et "Dlt", MetalMap.requestResync() : la grille complète). Elle est appelée dans la boucle asyncio quand le spectateur a lu,
+		# avec une fonction (header, contenu) qui envoie à ce spectateur seul : elle ne doit pas construire le message elle-même (la boucle serait bloquée).
+		# En attendant, le spectateur ne reçoit plus ces headers
+		self.resyncHandlers = {}
+		self.__loopThread = None
+		self.__sendLock = Lock() # Protège les morceaux en attente des clients (send() est appelée depuis plusieurs threads)
+		self.stats = Stats() # Messages et octets reçus et envoyés, durée de traitement des messages reçus, attente et taille des envois (publiés par Main)
 
 
-	def startServer(self, callback: callable):
+	def startServer(self, callback: callable, viewerCallback: callable = None, disconnectCallback: callable = None, reconnectCallback: callable = None):
 		"""
-		-Crée le serveur
-		-Attend que le client se connecte dans un thread (fonction __startServer)
+		-Crée la boucle asyncio dans un thread
+		-Attend que le client se connecte (fonction __startServer)
+		Ces fonctions sont appelées dans le thread de la boucle asyncio :
+		-[viewerCallback] quand un spectateur se connecte (ex: pour lui envoyer l'état actuel)
+		-[disconnectCallback] quand la télécommande se déconnecte (elle peut encore se reconnecter)
+		-[reconnectCallback] quand la télécommande se reconnecte (ex: pour recommencer la réception et lui renvoyer l'état actuel)
 		"""
-		self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-		self.__thread = Thread(target=lambda: self.__startServer(callback))
+		self.viewerCallback = viewerCallback
+		self.disconnectCallback = disconnectCallback
+		self.reconnectCallback = reconnectCallback
+		self.loop = asyncio.new_event_loop()
+		self.__thread = Thread(target=self.__run)
 		self.__thread.setDaemon(True)
 		self.__thread.start()
+		asyncio.run_coroutine_threadsafe(self.__startServer(callback), self.loop).result() # Attend que le serveur écoute
 
 
-	def __startServer(self, callback: callable):
+	def __run(self):
 		"""
-		Fonction appellée par startServer dans un thread :
-		-Attend que le client se connecte
-		-Appelle [callback] quand le client est connecté
+		Fonction appellée par startServer dans un thread : fait tourner la boucle asyncio jusqu'à stopServer()
 		"""
+		self.__loopThread = get_ident()
+		asyncio.set_event_loop(self.loop)
 		try:
-			self.socket.bind(("", self.PORT))
-			self.socket.listen(1)
-			self.client, address = self.socket.accept()
-			callback()
+			self.loop.run_forever()
+		finally:
+			self.loop.close()
+
+
+	async def __startServer(self, callback: callable):
+		"""
+		Coroutine lancée par startServer :
+		-Crée le serveur
+		-Appelle [callback] quand le client est connecté (dans le thread de la boucle asyncio)
+		"""
+		self.__connectCallback = callback
+		try:
+			self.server = await self.loop.create_server(lambda: self.Protocol(self), "", self.PORT, backlog=self.MAX_CLIENTS)
+		except:
+			print(traceback.format_exc())
+			self.errorCallback()
+
+
+	def _connected(self, protocol, transport):
+		"""
+		Appelée par le Protocol quand un client se connecte :
+		le premier est la télécommande, les suivants sont des spectateurs (refusés au-delà de self.MAX_CLIENTS clients)
+		"""
+		if len(self.clients) >= self.MAX_CLIENTS:
+			transport.close()
+			return
+		protocol.transport = transport
+		protocol.viewer = self.protocol != None
+		# Les envois n'utilisent pas le buffer du transport (qui recopie tous les morceaux en un seul bytes) mais sendmsg() sur une copie du socket
+		# (asyncio refuse add_writer() sur le descripteur utilisé par le transport)
+		protocol.socket = socket.socket(fileno=os.dup(transport.get_extra_info("socket").fileno()))
+		protocol.socket.setblocking(False)
+		with self.__sendLock:
+			self.clients = self.clients + [protocol]
+		self.stats.gauge("clients", len(self.clients))
+		if protocol.viewer:
+			# Les messages des spectateurs sont lus (pour détecter la fin de la connexion) puis ignorés
+			print("Viewer connected")
+			try:
+				if self.viewerCallback != None:
+					self.viewerCallback()
+			except:
+				print(traceback.format_exc())
+			return
+		self.protocol = protocol
+		transport.pause_reading() # Jusqu'à startReceive()
+		if self.reconnecting:
+			print("Client reconnected")
+			self.reconnecting = False
+			self.__reconnectTimer.cancel()
+			self.stats.count("reconnections")
+			callback = self.reconnectCallback
+		else:
+			callback = self.__connectCallback
+		try:
+			if callback != None:
+				callback()
 		except:
 			print(traceback.format_exc())
 			self.errorCallback()
 		print("End of startServer")
 
 
+	def _disconnected(self, protocol, exc):
+		"""
+		Appelée par le Protocol quand la connexion est fermée (par le client, par stopServer() ou à cause d'une erreur)
+		"""
+		if protocol not in self.clients:
+			return
+		self.__closeClient(protocol)
+		if protocol.viewer:
+			print("Viewer disconnected")
+			return
+		wasReceiving = self.receiving
+		self.receiving = False
+		if exc != None:
+			print("".join(traceback.format_exception(type(exc), exc, exc.__traceback__)))
+		if wasReceiving:
+			print("End of receive")
+		# La session continue : attend que la télécommande se reconnecte
+		print("Client disconnected, waiting {} s for reconnection".format(self.RECONNECT_TIMEOUT))
+		self.reconnecting = True
+		self.__reconnectTimer = self.loop.call_later(self.RECONNECT_TIMEOUT, self.__reconnectTimeout)
+		self.__announce()
+		try:
+			if self.disconnectCallback != None:
+				self.disconnectCallback()
+		except:
+			print(traceback.format_exc())
+
+
+	def __announce(self):
+		"""
+		Renvoie le dernier message de broadcast toutes les self.BROADCAST_PERIOD secondes en attendant que la télécommande se reconnecte
+		"""
+		if not self.reconnecting or self.__broadcastMessage == None:
+			return
+		try:
+			self.sendBroadcast(self.__broadcastMessage)
+		except OSError as error:
+			print("Broadcast failed:", error)
+		self.loop.call_later(self.BROADCAST_PERIOD, self.__announce)
+
+
+	def __reconnectTimeout(self):
+		"""
+		Appelée RECONNECT_TIMEOUT secondes après la déconnexion de la télécommande si elle ne s'est pas reconnectée : arrête la session
+		"""
+		if not self.reconnecting:
+			return
+		print("Client did not reconnect")
+		self.reconnecting = False
+		self.lost = True
+		if self.server != None:
+			self.server.close() # Plus de nouvelle connexion
+		self.errorCallback()
+
+
 	def startReceive(self, callback: callable):
 		"""
-		Commence à recevoir les messages du client dans un thread (fonction __receive)
+		Commence à recevoir les messages du client (dans le thread de la boucle asyncio)
 		[callback] est une fonction qui prend le header comme premier argument et le message comme deuxième argument
+		(str pour les messages texte, memoryview valide seulement pendant l'appel pour les messages binaires : à copier pour le garder)
 		"""
 		self.callback = callback
 		self.receiving = True
-		self.__thread = Thread(target=self.__receive)
-		self.__thread.setDaemon(True)
-		self.__thread.start()
+		self.__call(self.__resumeReading)
+
+
+	def __resumeReading(self):
+		if self.protocol != None and not self.protocol.transport.is_closing():
+			self.protocol.transport.resume_reading()
+			# Des messages complets ont peut-être été reçus avant un stopReceive()
+			self.protocol.buffer_updated(0)
 
 
-	def __receive(self):
+	def _frames(self, protocol):
 		"""
-		Fonction appellée par startReceive dans un thread :
-		-Reçoit les messages du client
-		-Appelle le callback donné à startReceive quand un message est reçu
+		Appelée par le Protocol quand des octets ont été reçus :
+		appelle le callback donné à startReceive pour chaque message complet reçu (tous ceux du buffer, en une fois)
+		Le contenu des messages binaires est donné sous forme de memoryview sur le buffer de réception, valide seulement pendant le callback
 		"""
 		try:
-			# Receive messages and return them in the callback
-			remaining = bytearray()
+			if protocol.viewer:
+				for frame in protocol.reader.frames():
+					self.stats.count("ignoredMessages")
+				return
+			frames = protocol.reader.frames()
 			while self.receiving:
-				# Receive parts of the message until it is complete
-				message = remaining
-				length = -1
-				contentType = ""
-				header = ""
-				pointer = -1
-				while length == -1 or pointer < length:
-					if length == -1 and len(message) > 7:
-						contentType = bytes([message[0]]).decode()
-						header = message[1:4].decode()
-						length = int.from_bytes(message[4:8], "little", signed=True)
-						start = message[8:]
-						message = bytearray(length + 1024)
-						message[:len(start)] = start
-						pointer = len(start)
-						if pointer >= length: break
-
-					messageBytes = self.client.recv(1024)
-					if messageBytes:
-						if pointer == -1:
-							message += messageBytes
-						else:
-							message[pointer:pointer+len(messageBytes)] = messageBytes
-							pointer += len(messageBytes)
-					else:
-						# Client disconnected
-						self.receiving = False
-						self.stopServer()
-				remaining = message[length:pointer]
-				message = message[:length]
-				if self.receiving:
-					if contentType == "b":
-						self.callback(header, message)
-					elif contentType == "s":
-						self.callback(header, message.decode())
-
+				frame = next(frames, None)
+				if frame == None:
+					break
+				contentType, header, content = frame
+				received = time.perf_counter()
+				if contentType == b"b":
+					self.callback(header, content)
+				elif contentType == b"s":
+					self.callback(header, str(content, "utf-8"))
+				# Le client n'envoie pas l'heure de ses messages : la latence mesurée est celle du traitement, depuis la réception des octets
+				self.stats.record("receive", time.perf_counter() - received)
+				self.stats.count("receivedMessages")
+				self.stats.count("receivedBytes", self.FRAME.size + len(content))
+			frames.close()
 		except:
 			print(traceback.format_exc())
-			self.errorCallback()
-		print("End of receive")
+			self.receiving = False
+			protocol.reader.clear()
+			protocol.transport.close() # La télécommande peut se reconnecter (voir _disconnected())
 
 
 	def stopReceive(self):
@@ -110,46 +302,270 @@ class SocketServer:
 		Arrête de recevoir les messages du client
 		"""
 		self.receiving = False
+		self.__call(self.__pauseReading)
 
 
-	def send(self, header: str, content):
+	def __pauseReading(self):
+		if self.protocol != None and not self.protocol.transport.is_closing():
+			self.protocol.transport.pause_reading()
+
+
+	def send(self, header: str, content, callback: callable = None, timeout: float = None) -> bool:
 		"""
-		Envoie le message [message] au client
+		Envoie le message [message] à tous les clients (peut être appelée depuis n'importe quel thread)
 		[header] est une chaine de 3 caractères
-		[content] est une chaine de caractères ou des bytes
+		[content] est une chaine de caractères, des bytes, un bytearray ou un memoryview
+		(à ne plus modifier ensuite : il est écrit plus tard dans la boucle asyncio, sans être recopié, pour chaque client)
+		[callback] est appelée (dans la boucle asyncio) quand [content] a été entièrement envoyé à la télécommande et peut donc être réutilisé :
+		les spectateurs en reçoivent une copie (un spectateur lent ne retarde pas la libération du contenu, ex: le buffer d'une image de CameraStreamer)
+		Si plus de WRITE_BUFFER_LIMIT octets sont déjà en attente d'envoi à la télécommande, attend au plus [timeout] secondes (0 : n'attend pas)
+		qu'elle ait lu, puis abandonne le message (si [timeout] est None : SEND_TIMEOUT secondes, puis la connexion est fermée et la télécommande peut se reconnecter)
+		Un spectateur qui a déjà plus de WRITE_BUFFER_LIMIT octets en attente ne reçoit pas le message (voir self.resyncHandlers)
+		En attendant la reconnexion de la télécommande, le message n'est envoyé qu'aux spectateurs
+		Renvoie False si le message n'a été envoyé à aucun client ([callback] n'est alors pas appelée)
 		"""
 		try:
-			if isinstance(content, str):
-				b = content.encode()
-				self.client.send(("s" + header).encode() + len(b).to_bytes(4, "little", signed=True) + b)
-			elif isinstance(content, bytes):
-				self.client.send(("b" + header).encode() + len(content).to_bytes(4, "little", signed=True) + content)
+			prefix, content = self.__frame(header, content)
+			size = len(prefix) + len(content)
+			protocol = self.protocol
+			if protocol != None and not protocol.writable.is_set() and get_ident() != self.__loopThread:
+				waitStart = time.perf_counter()
+				if not protocol.writable.wait(self.SEND_TIMEOUT if timeout == None else timeout):
+					self.stats.count("sendTimeouts")
+					if timeout != None:
+						return False
+					print("The client is not reading: closing the connection")
+					self.__call(protocol.transport.abort) # La télécommande peut se reconnecter (voir _disconnected())
+					return False
+				self.stats.record("sendWait", time.perf_counter() - waitStart)
+			if protocol == None and not self.reconnecting and not self.lost:
+				raise ConnectionError("The client is not connected")
+			resync = self.resyncHandlers.get(header)
+			scheduled = []
+			with self.__sendLock:
+				clients = []
+				for client in self.clients:
+					if not client.viewer or (client.pendingBytes < self.WRITE_BUFFER_LIMIT and resync not in client.resync):
+						clients.append(client)
+					elif resync != None:
+						client.resync.add(resync) # Ce spectateur recevra le message de resync quand il aura lu (voir __write())
+				dropped = len(self.clients) - len(clients)
+				if len(clients) == 0:
+					self.stats.count("disconnectedDrops")
+					return False
+				viewerContent = content
+				if callback != None and not isinstance(content, bytes) and any(client.viewer for client in clients):
+					viewerContent = bytes(content) # Une seule copie, partagée par les spectateurs
+				for client in clients:
+					if self.__append(client, prefix, viewerContent if client.viewer else content, None if client.viewer else callback):
+						scheduled.append(client)
+			for client in scheduled:
+				self.loop.call_soon_threadsafe(self.__write, client)
+			if callback != None and all(client.viewer for client in clients):
+				self.loop.call_soon_threadsafe(callback) # Pas de télécommande (en attendant sa reconnexion) : les spectateurs ont leur copie
+			self.stats.count("sentMessages")
+			self.stats.count("sentBytes", size * len(clients))
+			if dropped > 0:
+				self.stats.count("viewerDrops", dropped)
 			return True
 		except:
 			print(traceback.format_exc())
 			self.errorCallback()
 			return False
 
+
+	def __frame(self, header: str, content) -> tuple:
+		"""
+		Renvoie le début (self.FRAME) et le contenu (en octets, sans copie sauf pour une chaine de caractères) du message
+		"""
+		if isinstance(content, str):
+			content = content.encode()
+			contentType = b"s"
+		elif isinstance(content, (bytes, bytearray, memoryview)):
+			contentType = b"b"
+		else:
+			raise TypeError("Unsupported content type: " + type(content).__name__)
+		if isinstance(content, memoryview):
+			content = content.cast("B") # len() doit donner la taille en octets
+		return self.FRAME.pack(contentType, header.encode(), len(content)), content
+
+
+	def __append(self, client, prefix, content, callback) -> bool:
+		"""
+		Ajoute un message aux morceaux en attente de [client] (à appeler avec self.__sendLock)
+		Renvoie True si __write() doit être programmée pour ce client
+		"""
+		# Le début et le contenu sont ajoutés ensemble : les messages de plusieurs threads ne se mélangent jamais
+		client.pending.append((prefix, None))
+		client.pending.append((content, callback))
+		client.pendingBytes += len(prefix) + len(content)
+		if client.pendingBytes >= self.WRITE_BUFFER_LIMIT:
+			client.writable.clear()
+		if client.writeScheduled or client.waitingWritable:
+			return False
+		client.writeScheduled = True
+		return True
+
+
+	def __resync(self, client, handlers):
+		"""
+		Appelée dans la boucle asyncio quand un spectateur qui avait perdu des messages a lu :
+		demande à chaque fonction de [handlers] (voir self.resyncHandlers) son message, qui sera envoyé à ce spectateur seul
+		"""
+		send = lambda header, content: self.__sendTo(client, header, content)
+		for handler in handlers:
+			try:
+				handler(send)
+			except:
+				print(traceback.format_exc())
+
+
+	def __sendTo(self, client, header: str, content) -> bool:
+		"""
+		Envoie un message au seul [client] (peut être appelée depuis n'importe quel thread), sans attendre
+		Renvoie False si le client s'est déconnecté
+		"""
+		prefix, content = self.__frame(header, content)
+		with self.__sendLock:
+			if client not in self.clients:
+				return False
+			schedule = self.__append(client, prefix, content, None)
+		if schedule:
+			self.loop.call_soon_threadsafe(self.__write, client)
+		self.stats.count("viewerResyncs")
+		self.stats.count("sentBytes", len(prefix) + len(content))
+		return True
+
+
+	def __write(self, client):
+		"""
+		Fonction appellée dans la boucle asyncio (par send() ou quand le socket de [client] est de nouveau prêt) :
+		écrit les morceaux en attente pour [client] avec sendmsg(), jusqu'à self.MAX_CHUNKS morceaux par appel, sans les recopier
+		-Écriture partielle : le reste du morceau est gardé (memoryview décalé) et __write() sera rappelée quand le socket sera prêt
+		-Appelle la callback d'un message quand son contenu a été entièrement écrit
+		"""
+		with self.__sendLock:
+			client.writeScheduled = False
+		sock = client.socket
+		if sock == None:
+			return
+		while True:
+			with self.__sendLock:
+				chunks = [chunk for chunk, callback in islice(client.pending, self.MAX_CHUNKS)]
+			if len(chunks) == 0:
+				break
+			try:
+				sent = sock.sendmsg(chunks)
+			except (BlockingIOError, InterruptedError):
+				sent = 0
+			except OSError:
+				print(traceback.format_exc())
+				client.transport.abort() # Le transport appelle ensuite _disconnected()
+				return
+			self.stats.count("writes")
+			full = sent < sum(len(chunk) for chunk in chunks) # Le buffer d'envoi du socket est plein
+			completed = []
+			with self.__sendLock:
+				client.pendingBytes -= sent
+				while sent > 0:
+					view, callback = client.pending[0]
+					if sent >= len(view):
+						client.pending.popleft()
+						sent -= len(view)
+						if callback != None:
+							completed.append(callback)
+					else:
+						client.pending[0] = (memoryview(view)[sent:], callback)
+						sent = 0
+				if client.pendingBytes <= self.WRITE_BUFFER_LIMIT // 2:
+					client.writable.set()
+			for callback in completed:
+				callback()
+			if full:
+				self.stats.count("partialWrites")
+				break
+		with self.__sendLock:
+			# Sous le verrou : send() ne programme pas __write() tant que le socket est surveillé
+			wasWaiting, client.waitingWritable = client.waitingWritable, len(client.pending) > 0
+			self.stats.gauge("viewerPendingBytes" if client.viewer else "pendingBytes", client.pendingBytes)
+			resync = None
+			if len(client.resync) > 0 and client.pendingBytes <= self.WRITE_BUFFER_LIMIT // 2:
+				resync, client.resync = client.resync, set()
+		if client.waitingWritable and not wasWaiting:
+			self.loop.add_writer(sock.fileno(), self.__write, client)
+		elif not client.waitingWritable and wasWaiting:
+			self.loop.remove_writer(sock.fileno())
+		if resync != None:
+			self.__resync(client, resync)
+
+
+	def __closeClient(self, client):
+		"""
+		Ferme la copie du socket de [client] et abandonne ses morceaux en attente (leurs callbacks sont appelées : leur contenu peut être réutilisé)
+		"""
+		if client.socket != None:
+			if client.waitingWritable:
+				self.loop.remove_writer(client.socket.fileno())
+				client.waitingWritable = False
+			client.socket.close()
+			client.socket = None
+		with self.__sendLock:
+			self.clients = [other for other in self.clients if other is not client]
+			if client is self.protocol:
+				self.protocol = None
+			pending, client.pending = client.pending, deque()
+			client.pendingBytes = 0
+		client.writable.set()
+		self.stats.gauge("clients", len(self.clients))
+		for view, callback in pending:
+			if callback != None:
+				callback()
+
+
 	def sendBroadcast(self, message: str):
 		"""
 		Envoie le message [message] de broadcast à tout le réseau
-		-A utiliser au démarrage pour donner l'adresse IP du serveur au client
+		-A utiliser au démarrage pour donner l'adresse IP du serveur au client (renvoyé en attendant la reconnexion du client)
 		"""
+		self.__broadcastMessage = message
 		sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
 		sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
 		sock.sendto(message.encode(), ('<broadcast>', self.PORT))
 		sock.close()
 
 
+	def __call(self, function: callable):
+		"""
+		Appelle [function] dans la boucle asyncio (directement si on y est déjà)
+		"""
+		if self.loop == None or self.loop.is_closed():
+			return
+		if get_ident() == self.__loopThread:
+			function()
+		else:
+			self.loop.call_soon_threadsafe(function)
+
+
+	def __close(self):
+		for client in self.clients:
+			client.transport.abort()
+			self.__closeClient(client)
+		if self.server != None:
+			self.server.close()
+		self.loop.stop()
+
+
 	def stopServer(self):
 		"""
 		Arrête le serveur
 		"""
+		self.receiving = False
+		self.reconnecting = False
+		protocol = self.protocol
+		if protocol != None:
+			protocol.writable.set()
 		try:
-			self.client.shutdown(socket.SHUT_RDWR)
-			self.client.close()
+			self.__call(self.__close)
+			if get_ident() != self.__loopThread:
+				self.__thread.join(1)
 		except: pass
-		try:
-			self.socket.shutdown(socket.SHUT_RDWR)
-			self.socket.close()
-		except: pass
\ No newline at end of file
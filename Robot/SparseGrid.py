@@ -0,0 +1,148 @@
+import numpy as np
+
+
+class SparseGrid:
+    """Grille creuse découpée en tuiles de taille fixe, allouées uniquement quand une case de la tuile est écrite"""
+
+    TILE_SIZE = 32 # Nombre de cases sur le côté d'une tuile
+
+    def __init__(self, fill: float = -1, dtype=np.float64, tileSize: int = None):
+        self.fill = fill # Valeur des cases qui n'ont jamais été écrites
+        self.dtype = dtype
+        self.tileSize = tileSize if tileSize != None else self.TILE_SIZE
+        self.tiles = {} # Dictionnaire associant les coordonnées (tx, ty) d'une tuile à son tableau numpy
+        self.bounds = None # (minX, minY, maxX, maxY) des cases écrites, None si la grille est vide
+
+
+    def __getTile(self, tx, ty):
+        tile = self.tiles.get((tx, ty))
+        if tile is None:
+            tile = np.full((self.tileSize, self.tileSize), self.fill, dtype=self.dtype)
+            self.tiles[(tx, ty)] = tile
+        return tile
+
+
+    def __extendBounds(self, minX, minY, maxX, maxY):
+        if self.bounds == None:
+            self.bounds = (minX, minY, maxX, maxY)
+        else:
+            b = self.bounds
+            self.bounds = (min(b[0], minX), min(b[1], minY), max(b[2], maxX), max(b[3], maxY))
+
+
+    def get(self, x: int, y: int):
+        """
+        Renvoie la valeur de la case (x, y) (self.fill si elle n'a jamais été écrite)
+        """
+        tile = self.tiles.get((x // self.tileSize, y // self.tileSize))
+        if tile is None:
+            return self.fill
+        return tile[x % self.tileSize, y % self.tileSize]
+
+
+    def set(self, x: int, y: int, value: float):
+        """
+        Écrit [value] dans la case (x, y) (alloue la tuile si besoin)
+        """
+        self.__getTile(x // self.tileSize, y // self.tileSize)[x % self.tileSize, y % self.tileSize] = value
+        self.__extendBounds(x, y, x, y)
+
+
+    def add(self, x: int, y: int, value: float):
+        """
+        Ajoute [value] à la case (x, y) (alloue la tuile si besoin)
+        """
+        self.__getTile(x // self.tileSize, y // self.tileSize)[x % self.tileSize, y % self.tileSize] += value
+        self.__extendBounds(x, y, x, y)
+
+
+    def setMany(self, xs, ys, values):
+        """
+        Écrit [values] dans les cases ([xs], [ys]) (voir __writeMany)
+        """
+        self.__writeMany(xs, ys, values, False)
+
+
+    def addMany(self, xs, ys, values):
+        """
+        Ajoute [values] aux cases ([xs], [ys]) (voir __writeMany)
+        """
+        self.__writeMany(xs, ys, values, True)
+
+
+    def __groupByTile(self, xs, ys):
+        """
+        Trie les cases ([xs], [ys]) par tuile
+        Renvoie l'ordre de tri et, pour chaque tuile, ses coordonnées (tx, ty) et la plage [start:end] de ses cases dans l'ordre trié
+        """
+        tx, ty = xs // self.tileSize, ys // self.tileSize
+        order = np.lexsort((ty, tx))
+        tx, ty = tx[order], ty[order]
+        # Indices où commence chaque groupe de cases appartenant à la même tuile
+        starts = np.flatnonzero(np.r_[True, (tx[1:] != tx[:-1]) | (ty[1:] != ty[:-1])])
+        ends = np.r_[starts[1:], len(xs)]
+        return order, [((int(tx[start]), int(ty[start])), start, end) for start, end in zip(starts, ends)]
+
+
+    def __writeMany(self, xs, ys, values, add):
+        """
+        Écrit (ou ajoute si [add]) [values] dans les cases ([xs], [ys]) (tableaux numpy d'entiers de même longueur)
+        -Les cases sont triées par tuile pour n'accéder qu'une fois à chaque tuile
+        -En mode [add], une même case peut apparaitre plusieurs fois (np.add.at)
+        """
+        if len(xs) == 0:
+            return
+        size = self.tileSize
+        order, groups = self.__groupByTile(xs, ys)
+        xs, ys, values = xs[order], ys[order], np.asarray(values)[order]
+        for key, start, end in groups:
+            tile = self.__getTile(*key)
+            if add:
+                np.add.at(tile, (xs[start:end] % size, ys[start:end] % size), values[start:end])
+            else:
+                tile[xs[start:end] % size, ys[start:end] % size] = values[start:end]
+        self.__extendBounds(int(xs.min()), int(ys.min()), int(xs.max()), int(ys.max()))
+
+
+    def toDense(self):
+        """
+        Renvoie une matrice dense couvrant toutes les cases écrites et la position (offsetX, offsetY) de la case (0, 0) dans cette matrice :
+        la case (x, y) de la grille correspond à matrix[x + offsetX, y + offsetY]
+        """
+        if self.bounds == None:
+            return np.full((1, 1), self.fill, dtype=self.dtype), (0, 0)
+        minX, minY, maxX, maxY = self.bounds
+        matrix = np.full((maxX - minX + 1, maxY - minY + 1), self.fill, dtype=self.dtype)
+        size = self.tileSize
+        for (tx, ty), tile in self.tiles.items():
+            # Partie de la tuile comprise dans les limites (les tuiles des bords peuvent dépasser)
+            x0, y0 = max(tx * size, minX), max(ty * size, minY)
+            x1, y1 = min((tx + 1) * size, maxX + 1), min((ty + 1) * size, maxY + 1)
+            if x0 < x1 and y0 < y1:
+                matrix[x0 - minX:x1 - minX, y0 - minY:y1 - minY] = tile[x0 - tx * size:x1 - tx * size, y0 - ty * size:y1 - ty * size]
+        return matrix, (-minX, -minY)
+
+
+    def getFrame(self):
+        """
+        Renvoie la position (offsetX, offsetY) de la case (0, 0) et la taille (sizeX, sizeY) de la matrice que renverrait toDense(), sans la construire
+        """
+        if self.bounds == None:
+            return (0, 0), (1, 1)
+        minX, minY, maxX, maxY = self.bounds
+        return (-minX, -minY), (maxX - minX + 1, maxY - minY + 1)
+
+
+    def nbytes(self):
+        """
+        Renvoie la mémoire utilisée par les tuiles (en octets)
+        """
+        return sum(tile.nbytes for tile in self.tiles.values())
+
+
+    def clear(self):
+        """
+        Supprime toutes les tuiles
+        """
+        self.tiles = {}
+        self.bounds = None
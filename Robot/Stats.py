@@ -0,0 +1,112 @@
+from bisect import bisect_right
+
+
+class Stats:
+    """Compteurs, valeurs instantanées et histogrammes d'un composant du robot (Robot, MetalMap, SocketServer, Main),
+    mis à jour sans verrou depuis les boucles critiques (un seul thread écrit chaque statistique) et publiés par Main (message "Sta")
+    Si [enabled] est False, les fonctions d'ajout ne font rien et les boucles critiques ne récupèrent pas les histogrammes (voir histogram())"""
+
+    ENABLED = True # Valeur par défaut de [enabled]
+
+    class Histogram:
+        """Répartition de valeurs (durées en secondes) dans des intervalles de taille croissante (x 2^(1/4)),
+        pour en déduire les quantiles sans garder les valeurs"""
+
+        BOUNDS = [1e-6 * 2 ** (i / 4) for i in range(100)] # Bornes des intervalles (de 1 µs à environ 30 s)
+
+        def __init__(self):
+            self.reset()
+
+        def add(self, value: float):
+            self.buckets[bisect_right(self.BOUNDS, value)] += 1
+            self.count += 1
+            self.total += value
+            if value > self.max:
+                self.max = value
+
+        def quantile(self, q: float) -> float:
+            """
+            Renvoie la borne supérieure de l'intervalle contenant le quantile [q] (entre 0 et 1) des valeurs ajoutées (0 s'il n'y en a pas)
+            """
+            if self.count == 0:
+                return 0
+            rank, seen = q * self.count, 0
+            for i, count in enumerate(self.buckets):
+                seen += count
+                if seen >= rank and count > 0:
+                    return min(self.BOUNDS[i] if i < len(self.BOUNDS) else self.max, self.max)
+            return self.max
+
+        def snapshot(self) -> dict:
+            return {
+                "count": self.count,
+                "mean": self.total / self.count if self.count > 0 else 0,
+                "p50": self.quantile(0.5),
+                "p90": self.quantile(0.9),
+                "p99": self.quantile(0.99),
+                "max": self.max,
+            }
+
+        def reset(self):
+            self.buckets = [0] * (len(self.BOUNDS) + 1)
+            self.count = 0
+            self.total = 0
+            self.max = 0
+
+
+    def __init__(self, enabled: bool = None):
+        self.enabled = self.ENABLED if enabled == None else enabled
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+
+    def count(self, name: str, n: int = 1):
+        """
+        Ajoute [n] au compteur [name]
+        """
+        if self.enabled:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+
+    def gauge(self, name: str, value: float):
+        """
+        Enregistre la valeur instantanée [value] de [name] (ex: taille d'une file d'attente)
+        """
+        if self.enabled:
+            self.gauges[name] = value
+
+
+    def record(self, name: str, value: float):
+        """
+        Ajoute [value] à l'histogramme [name]
+        """
+        if self.enabled:
+            self.histogram(name).add(value)
+
+
+    def histogram(self, name: str):
+        """
+        Renvoie l'histogramme [name] (créé au besoin), ou None si les statistiques sont désactivées :
+        les boucles critiques le récupèrent une fois puis appellent directement add() si ce n'est pas None
+        """
+        if not self.enabled:
+            return None
+        histogram = self.histograms.get(name)
+        if histogram == None:
+            histogram = self.histograms[name] = self.Histogram()
+        return histogram
+
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """
+        Renvoie toutes les statistiques ({"counters": ..., "gauges": ..., "histograms": ...})
+        Les histogrammes vides ne sont pas renvoyés. Si [reset], les remet à zéro (chaque publication couvre alors la période depuis la précédente)
+        """
+        histograms = {}
+        for name, histogram in list(self.histograms.items()):
+            if histogram.count > 0:
+                histograms[name] = histogram.snapshot()
+            if reset:
+                histogram.reset()
+        return {"counters": dict(self.counters), "gauges": dict(self.gauges), "histograms": histograms}
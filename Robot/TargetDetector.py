@@ -0,0 +1,160 @@
+import numpy as np
+
+
+class TargetDetector:
+    """Détection en continu des objets métalliques, à partir des mesures ajoutées à la grille (voir MetalMap.integrate()) :
+    -Suit la dérive de la valeur de base (moyenne exponentielle des mesures prises hors des objets)
+    -Repère les passages au-dessus d'un objet avec une hystérésis : un passage commence quand la mesure dépasse la valeur de base
+    de plus de ON_THRESHOLD et se termine quand elle redescend sous OFF_THRESHOLD (le bruit ne coupe pas un passage en plusieurs)
+    -Regroupe les passages proches (ex: le même objet vu sur plusieurs lignes du scan) en cibles,
+    avec leur position estimée, leur intensité et leur taille
+    Les mesures sont traitées par paquets (tableaux numpy), seuls les passages sont traités un par un"""
+
+    ON_THRESHOLD = 0.05 # Écart minimum à la valeur de base (mesures entre 0 et 1) pour commencer un passage
+    OFF_THRESHOLD = 0.025 # Écart sous lequel le passage se termine
+    NOISE_FACTOR = 6 # Les seuils valent au moins NOISE_FACTOR (début) et NOISE_FACTOR / 2 (fin) fois le bruit des mesures
+    BASELINE_ALPHA = 0.005 # Poids de chaque mesure prise hors des objets dans la valeur de base (environ 2 s à 100 mesures/s)
+    MIN_SAMPLES = 3 # Nombre minimum de mesures d'un passage (les passages plus courts sont du bruit)
+    CLUSTER_DISTANCE = 6 # Distance (cm) entre un passage et une cible en dessous de laquelle le passage appartient à la cible
+
+    class Target:
+        """Cible candidate : regroupement de passages proches"""
+
+        def __init__(self, id: int, hit: dict):
+            self.id = id
+            self.weight = hit["weight"] # Somme des écarts à la valeur de base des mesures des passages
+            self.x = hit["x"] # Position estimée (moyenne des positions des mesures, pondérée par leur écart à la valeur de base)
+            self.y = hit["y"]
+            self.strength = hit["peak"] # Plus grand écart à la valeur de base
+            self.bounds = list(hit["bounds"]) # minX, minY, maxX, maxY des mesures des passages
+            self.hits = 1
+
+        def merge(self, other):
+            """
+            Ajoute à la cible les passages de [other] (une autre cible ou un passage : mêmes attributs)
+            """
+            weight = self.weight + other.weight
+            self.x = (self.x * self.weight + other.x * other.weight) / weight
+            self.y = (self.y * self.weight + other.y * other.weight) / weight
+            self.weight = weight
+            self.strength = max(self.strength, other.strength)
+            self.bounds = [min(self.bounds[0], other.bounds[0]), min(self.bounds[1], other.bounds[1]),
+                           max(self.bounds[2], other.bounds[2]), max(self.bounds[3], other.bounds[3])]
+            self.hits += other.hits
+
+        def distance(self, bounds) -> float:
+            """
+            Renvoie la distance entre les mesures de la cible et le rectangle [bounds] (0 s'ils se touchent)
+            """
+            dx = max(0, self.bounds[0] - bounds[2], bounds[0] - self.bounds[2])
+            dy = max(0, self.bounds[1] - bounds[3], bounds[1] - self.bounds[3])
+            return (dx * dx + dy * dy) ** 0.5
+
+        @property
+        def size(self) -> tuple:
+            return (self.bounds[2] - self.bounds[0], self.bounds[3] - self.bounds[1])
+
+
+    def __init__(self):
+        self.noise = 0 # Écart-type du bruit d'une mesure (mesures entre 0 et 1, voir Sampler.calibrate())
+        self.clear()
+
+
+    def clear(self):
+        """
+        Oublie les cibles et la valeur de base (nouvelle carte)
+        """
+        self.baseline = 0 # Valeur mesurée loin de tout métal (les mesures sont déjà à 0 loin du métal juste après la calibration)
+        self.targets = [] # Cibles candidates (self.Target)
+        self.hits = 0 # Nombre de passages détectés
+        self.changed = False # True si les cibles ont changé depuis le dernier envoi (remis à False par MetalMap.sendTargets())
+        self.__nextId = 1
+        self.__active = False # True si la dernière mesure était dans un passage
+        self.__hit = None # Passage en cours (sommes des mesures depuis son début, il peut continuer au paquet suivant)
+
+
+    def thresholds(self) -> tuple:
+        """
+        Renvoie les seuils (début, fin) des passages, relevés si le bruit des mesures est plus grand qu'attendu
+        """
+        return max(self.ON_THRESHOLD, self.NOISE_FACTOR * self.noise), max(self.OFF_THRESHOLD, self.NOISE_FACTOR / 2 * self.noise)
+
+
+    def add(self, xs: np.ndarray, ys: np.ndarray, values: np.ndarray) -> int:
+        """
+        Ajoute des mesures (dans l'ordre où elles ont été prises) aux positions ([xs], [ys]) :
+        -Met à jour l'état de l'hystérésis de chaque mesure (par rapport à la valeur de base au début du paquet)
+        -Ajoute les passages terminés aux cibles, puis met à jour la valeur de base avec les mesures hors des passages
+        Renvoie le nombre de passages terminés
+        """
+        n = len(values)
+        if n == 0:
+            return 0
+        on, off = self.thresholds()
+        residual = np.asarray(values, dtype=np.float64) - self.baseline
+        # Hystérésis sans boucle : chaque mesure prend l'état de la dernière mesure (elle comprise) au-dessus du seuil de début ou sous le seuil de fin
+        events = np.full(n, -1, dtype=np.int8)
+        events[residual <= off] = 0
+        events[residual >= on] = 1
+        last = np.where(events >= 0, np.arange(n), -1)
+        np.maximum.accumulate(last, out=last)
+        active = np.where(last >= 0, events[np.maximum(last, 0)] == 1, self.__active)
+        # Début et fin des passages dans le paquet
+        changes = np.flatnonzero(np.diff(active.astype(np.int8), prepend=np.int8(self.__active)))
+        bounds = np.concatenate(([0], changes, [n]))
+        finished = 0
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            if end == start:
+                continue
+            if active[start]:
+                self.__accumulate(xs[start:end], ys[start:end], residual[start:end])
+            elif self.__hit != None:
+                finished += self.__finish() # Le passage s'est terminé à la fin du segment précédent (éventuellement dans le paquet précédent)
+        self.__active = bool(active[-1])
+        quiet = values[~active]
+        if len(quiet) > 0:
+            self.baseline += (1 - (1 - self.BASELINE_ALPHA) ** len(quiet)) * (float(np.mean(quiet)) - self.baseline)
+        return finished
+
+
+    def __accumulate(self, xs, ys, residual):
+        """
+        Ajoute au passage en cours des mesures dont l'état est "dans un passage"
+        """
+        weights = np.maximum(residual, 0)
+        hit = self.__hit
+        if hit == None:
+            hit = self.__hit = {"weight": 0.0, "sumX": 0.0, "sumY": 0.0, "peak": -np.inf, "count": 0,
+                                "bounds": [np.inf, np.inf, -np.inf, -np.inf]}
+        hit["weight"] += float(weights.sum())
+        hit["sumX"] += float(np.dot(weights, xs))
+        hit["sumY"] += float(np.dot(weights, ys))
+        hit["count"] += len(residual)
+        hit["peak"] = max(hit["peak"], float(residual.max()))
+        bounds = hit["bounds"]
+        hit["bounds"] = [min(bounds[0], float(xs.min())), min(bounds[1], float(ys.min())), max(bounds[2], float(xs.max())), max(bounds[3], float(ys.max()))]
+
+
+    def __finish(self) -> int:
+        """
+        Termine le passage en cours et l'ajoute aux cibles à moins de self.CLUSTER_DISTANCE (ou à une nouvelle cible) :
+        si le passage en relie plusieurs, elles sont fusionnées. Renvoie 1 si le passage a été gardé, 0 sinon (trop court)
+        """
+        hit, self.__hit = self.__hit, None
+        if hit == None or hit["count"] < self.MIN_SAMPLES or hit["weight"] <= 0:
+            return 0
+        hit["x"], hit["y"] = hit["sumX"] / hit["weight"], hit["sumY"] / hit["weight"]
+        target = self.Target(self.__nextId, hit)
+        near = [other for other in self.targets if other.distance(target.bounds) < self.CLUSTER_DISTANCE]
+        if len(near) == 0:
+            self.__nextId += 1
+            self.targets.append(target)
+        else:
+            # La cible la plus ancienne garde son identifiant
+            for other in near[1:]:
+                near[0].merge(other)
+                self.targets.remove(other)
+            near[0].merge(target)
+        self.hits += 1
+        self.changed = True
+        return 1